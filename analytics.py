@@ -0,0 +1,177 @@
+# Analytics de risco mantido incrementalmente
+#
+# analytics_hist guarda, por dimensão (geral, sexo, faixa etária, comorbidade)
+# e faixa de probabilidade, a contagem e as somas de probabilidade e idade.
+# Triggers em consultas atualizam a tabela na mesma transação de cada INSERT e
+# DELETE, então GET /analytics só lê algumas centenas de linhas.
+#
+# Reconstrução completa: python analytics.py rebuild [--db consultas.db]
+# (--db padrão: DATACARE_DB_PATH; banco novo ou antigo recebe o schema atual)
+import argparse
+import os
+import sqlite3
+
+# Histograma de probabilidade em faixas de 5%
+N_BINS = 20
+
+DIMENSIONS = ("geral", "sexo", "faixa_etaria", "comorbidade")
+
+
+def _bin_expr(t):
+    return f"MIN(MAX(CAST(COALESCE({t}.probabilidade, 0) * {N_BINS} AS INTEGER), 0), {N_BINS - 1})"
+
+
+def _sexo_expr(t):
+    return f"CASE {t}.patient_sex WHEN 2 THEN 'F' ELSE 'M' END"
+
+
+def _faixa_expr(t):
+    decada = f"CAST(MAX({t}.patient_age, 0) / 10 AS INTEGER) * 10"
+    return (
+        f"CASE WHEN {t}.patient_age IS NULL THEN 'desconhecida'"
+        f" WHEN {t}.patient_age >= 90 THEN '90+'"
+        f" ELSE printf('%d-%d', {decada}, {decada} + 9) END"
+    )
+
+
+def _comorbidades_from(t):
+    return (
+        f"json_each(CASE WHEN json_valid({t}.comorbidades_json) THEN {t}.comorbidades_json ELSE '[]' END) j"
+        " JOIN features f ON f.nome = j.value"
+    )
+
+
+def _groups(t):
+    """(dimensao, grupo) de uma linha de consultas referenciada por t (NEW/OLD)"""
+    return (
+        "SELECT 'geral' AS dimensao, '' AS grupo"
+        f" UNION ALL SELECT 'sexo', {_sexo_expr(t)}"
+        f" UNION ALL SELECT 'faixa_etaria', {_faixa_expr(t)}"
+        f" UNION ALL SELECT DISTINCT 'comorbidade', f.nome FROM {_comorbidades_from(t)}"
+    )
+
+
+def init_tables(c):
+    """Cria tabela e triggers; retorna True se a tabela acabou de ser criada"""
+    novo = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analytics_hist'"
+    ).fetchone() is None
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS analytics_hist (
+        dimensao TEXT NOT NULL,
+        grupo TEXT NOT NULL,
+        bin INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        soma_prob REAL NOT NULL,
+        soma_idade REAL NOT NULL,
+        PRIMARY KEY (dimensao, grupo, bin)
+    ) WITHOUT ROWID
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_analytics_insert AFTER INSERT ON consultas
+    BEGIN
+        INSERT INTO analytics_hist (dimensao, grupo, bin, total, soma_prob, soma_idade)
+        SELECT g.dimensao, g.grupo, {_bin_expr("NEW")}, 1,
+               COALESCE(NEW.probabilidade, 0), COALESCE(NEW.patient_age, 0)
+        FROM ({_groups("NEW")}) g
+        WHERE 1
+        ON CONFLICT (dimensao, grupo, bin) DO UPDATE SET
+            total = total + 1,
+            soma_prob = soma_prob + excluded.soma_prob,
+            soma_idade = soma_idade + excluded.soma_idade;
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_analytics_delete AFTER DELETE ON consultas
+    BEGIN
+        UPDATE analytics_hist SET
+            total = total - 1,
+            soma_prob = soma_prob - COALESCE(OLD.probabilidade, 0),
+            soma_idade = soma_idade - COALESCE(OLD.patient_age, 0)
+        WHERE bin = {_bin_expr("OLD")} AND (dimensao, grupo) IN ({_groups("OLD")});
+        DELETE FROM analytics_hist WHERE total <= 0;
+    END
+    ''')
+    return novo
+
+
+def rebuild(c):
+    """Recalcula analytics_hist do zero a partir de consultas"""
+    c.execute("DELETE FROM analytics_hist")
+    c.execute(f'''
+    INSERT INTO analytics_hist (dimensao, grupo, bin, total, soma_prob, soma_idade)
+    SELECT dimensao, grupo, bin, COUNT(*), SUM(prob), SUM(idade) FROM (
+        SELECT 'geral' AS dimensao, '' AS grupo, {_bin_expr("c")} AS bin,
+               COALESCE(c.probabilidade, 0) AS prob, COALESCE(c.patient_age, 0) AS idade
+        FROM consultas c
+        UNION ALL
+        SELECT 'sexo', {_sexo_expr("c")}, {_bin_expr("c")},
+               COALESCE(c.probabilidade, 0), COALESCE(c.patient_age, 0)
+        FROM consultas c
+        UNION ALL
+        SELECT 'faixa_etaria', {_faixa_expr("c")}, {_bin_expr("c")},
+               COALESCE(c.probabilidade, 0), COALESCE(c.patient_age, 0)
+        FROM consultas c
+        UNION ALL
+        SELECT 'comorbidade', f.nome, {_bin_expr("c")},
+               COALESCE(c.probabilidade, 0), COALESCE(c.patient_age, 0)
+        FROM consultas c
+        JOIN consulta_comorbidades cc ON cc.consulta_id = c.id
+        JOIN features f ON f.feature_idx = cc.feature_idx
+    )
+    GROUP BY dimensao, grupo, bin
+    ''')
+
+
+def summarize(rows, labels=None) -> dict:
+    """Agrupa as linhas de analytics_hist no formato de GET /analytics"""
+    labels = labels or {}
+    out = {"bins": [round(100 * i / N_BINS, 2) for i in range(N_BINS + 1)]}
+    for dimensao, grupo, b, total, soma_prob, soma_idade in rows:
+        grupos = out.setdefault(dimensao, {})
+        g = grupos.get(grupo)
+        if g is None:
+            g = grupos[grupo] = {"total": 0, "soma_prob": 0.0, "soma_idade": 0.0, "histograma": [0] * N_BINS}
+            if dimensao == "comorbidade":
+                g["rotulo"] = labels.get(grupo, grupo)
+        g["total"] += total
+        g["soma_prob"] += soma_prob
+        g["soma_idade"] += soma_idade
+        g["histograma"][b] += total
+    for dimensao in DIMENSIONS:
+        for g in out.get(dimensao, {}).values():
+            n = g["total"]
+            g["media_probabilidade"] = round(100 * g.pop("soma_prob") / n, 4) if n else None
+            g["media_idade"] = round(g.pop("soma_idade") / n, 2) if n else None
+    if "geral" in out:
+        out["geral"] = out["geral"].get("", {})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção do analytics de risco")
+    parser.add_argument("comando", choices=["rebuild"])
+    app_root = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--db", default=os.getenv("DATACARE_DB_PATH", os.path.join(app_root, "consultas.db")))
+    args = parser.parse_args()
+
+    # Schema completo de consultas (banco novo ou de versão anterior), como no backend
+    from db import Database
+    from schema import FEATURE_NAMES, SCHEMA_VERSION
+
+    db = Database(args.db)
+    try:
+        db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    finally:
+        db.close()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    with conn:
+        rebuild(conn)
+    total = conn.execute("SELECT COALESCE(SUM(total), 0) FROM analytics_hist WHERE dimensao = 'geral'").fetchone()[0]
+    conn.close()
+    print(f"analytics_hist reconstruída: {total} consultas")
+
+
+if __name__ == "__main__":
+    main()
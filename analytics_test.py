@@ -0,0 +1,99 @@
+# analytics_hist mantida pelos triggers deve bater com rebuild() (analytics.py)
+import random
+import sqlite3
+import sys
+
+import pytest
+
+import analytics
+from db import INSERT_CONSULTA_SQL, Database
+from schema import COMORBIDITY_NAMES, FEATURE_NAMES, SCHEMA_VERSION
+
+
+def consultas_aleatorias(n, seed=0):
+    rng = random.Random(seed)
+    linhas = []
+    for _ in range(n):
+        comorbidades = rng.sample(COMORBIDITY_NAMES[:8], rng.randint(0, 3))
+        if rng.random() < 0.1:
+            comorbidades.append(comorbidades[0] if comorbidades else "inexistente")
+        json_ = "[" + ",".join(f'"{c}"' for c in comorbidades) + "]"
+        linhas.append((
+            "p", "2024-01-01",
+            rng.choice([None, 0.0, 9.9, 10.0, 45.5, 89.9, 90.0, 104.0]),
+            rng.choice([1, 2, None]),
+            1.7, 70.0, 24.2,
+            rng.choice([json_, json_, "inválido", None]),
+            rng.choice([None, 0.0, 0.05, 0.5, 0.999, 1.0, round(rng.random(), 4)]),
+            None, None, "2024-01-01T00:00:00", None,
+        ))
+    return linhas
+
+
+def histograma(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT dimensao, grupo, bin, total, soma_prob, soma_idade FROM analytics_hist").fetchall()
+    finally:
+        conn.close()
+    return {(d, g, b): (total, pytest.approx(sp), pytest.approx(si)) for d, g, b, total, sp, si in rows}
+
+
+def reconstruido(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        analytics.rebuild(conn)
+    conn.close()
+    return histograma(path)
+
+
+@pytest.fixture()
+def db(tmp_path):
+    db = Database(str(tmp_path / "consultas.db"))
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    yield db
+    db.close()
+
+
+def test_insert_incremental_igual_ao_rebuild(db):
+    db.insert_many(INSERT_CONSULTA_SQL, consultas_aleatorias(300)).result(10)
+    incremental = histograma(db.path)
+    assert incremental
+    assert reconstruido(db.path) == incremental
+
+
+def test_delete_incremental_igual_ao_rebuild(db):
+    ids = db.insert_many(INSERT_CONSULTA_SQL, consultas_aleatorias(300, seed=1)).result(10)
+    db.executemany("DELETE FROM consultas WHERE id = ?", [(i,) for i in ids[::3]]).result(10)
+    incremental = histograma(db.path)
+    assert reconstruido(db.path) == incremental
+    # Apagar tudo não deixa grupos zerados para trás
+    db.write("DELETE FROM consultas")
+    assert histograma(db.path) == {}
+
+
+def test_resumo(db):
+    db.insert_many(INSERT_CONSULTA_SQL, [
+        ("a", None, 35.0, 2, None, None, None, '["SAH"]', 0.2, None, None, None, None),
+        ("b", None, 95.0, 1, None, None, None, '["SAH", "obesity"]', 0.6, None, None, None, None),
+    ]).result(5)
+    conn = sqlite3.connect(db.path)
+    rows = conn.execute("SELECT dimensao, grupo, bin, total, soma_prob, soma_idade FROM analytics_hist").fetchall()
+    conn.close()
+    resumo = analytics.summarize(rows, {"SAH": "HAS"})
+    assert resumo["geral"]["total"] == 2
+    assert resumo["geral"]["media_probabilidade"] == 40.0 and resumo["geral"]["media_idade"] == 65.0
+    assert resumo["geral"]["histograma"][4] == 1 and resumo["geral"]["histograma"][12] == 1
+    assert set(resumo["sexo"]) == {"F", "M"}
+    assert set(resumo["faixa_etaria"]) == {"30-39", "90+"}
+    assert resumo["comorbidade"]["SAH"]["total"] == 2 and resumo["comorbidade"]["SAH"]["rotulo"] == "HAS"
+    assert resumo["comorbidade"]["obesity"]["total"] == 1
+
+
+def test_cli_rebuild_em_banco_novo(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "novo.db")
+    monkeypatch.setenv("DATACARE_DB_PATH", path)
+    monkeypatch.setattr(sys, "argv", ["analytics.py", "rebuild"])
+    analytics.main()
+    assert "0 consultas" in capsys.readouterr().out
+    assert histograma(path) == {}
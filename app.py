@@ -1,319 +1,1027 @@
+import io
 import os
-import sqlite3
 import json
+import re
+import tempfile
+import time
+import uuid
 from datetime import datetime
-from flask import Flask, render_template, request, send_from_directory, url_for, jsonify
-import joblib
-import pandas as pd
+from flask import Flask, render_template, request, send_from_directory, send_file, url_for, jsonify, abort, g, redirect
 import numpy as np
 import logging
+import threading
+from collections import OrderedDict
 from flask_cors import CORS  # para permitir acesso do popup
+from pdf_jobs import PdfJobQueue
+from pdf_cache import PdfDiskCache
+from pdf_http import ETagCache, row_etag, send_pdf_file, send_pdf_rendered
+import pdf_store
+from db import Database, INSERT_CONSULTA_OWNER_SQL, INSERT_CONSULTA_SQL
+from model_registry import ModelRegistry
+from analytics import DIMENSIONS, summarize
+import metrics
+from profiling import ProfileError, RequestProfiler, render as render_profile
+from search import SearchError, build_query, build_counts_query, next_cursor
+from schema import (
+    FEATURE_NAMES, EN_TO_PT, FEATURE_INDEX, COMORBIDITY_INDEX, COMORBIDITY_OFFSET,
+    N_FEATURES, SCHEMA_VERSION, array_to_mask,
+    parse_payload, build_X_batch,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 APP_ROOT = os.path.dirname(__file__)
 MODEL_PATH = os.path.join(APP_ROOT, "modelo_gradient_boosting.pkl")
-DB_PATH = os.path.join(APP_ROOT, "consultas.db")
-PDF_DIR = os.path.join(APP_ROOT, "consultas")
+DB_PATH = os.getenv("DATACARE_DB_PATH", os.path.join(APP_ROOT, "consultas.db"))
+PDF_DIR = os.getenv("DATACARE_PDF_DIR", os.path.join(APP_ROOT, "consultas"))
+IMPORT_DIR = os.getenv("DATACARE_IMPORT_DIR", os.path.join(APP_ROOT, "importacoes"))
 os.makedirs(PDF_DIR, exist_ok=True)
 
 app = Flask(__name__, template_folder=".")
 CORS(app)  # permite requisições cross-origin do popup
 
-# --- Feature names confirmadas
-FEATURE_NAMES = [
-    "patient_age","patient_sex","SAH","acute myocardium infarct","adrenal hypoplasia","albinism",
-    "alzheimer","anemia","aneurysm","ankylosing spondylitis","arrhythmia","arthrosis","asthma",
-    "behcet","brain tumor","breast cancer","cardiac insufficiency","cardiopathy","catheterism",
-    "cerebral palsy","chron disease","chronic kidney disease","cirrhosis","cone dystrophy","devic",
-    "dialysis","down syndrome","dyslipidemia","fibromyalgia","hashimoto disease","hepatic cancer",
-    "hepatic transplant","hepatitis c","herpetic encephalitis","hipocolesterolemia",
-    "human immunodeficiency virus","hydrocephalus","hypercholesterolemia","hypertriglyceridemia",
-    "hypophysis adenoma","intestinal cancer","intracranial hypertension","kidney transplant","leucemia",
-    "lung cancer","lymphoma","mccune albright","meningioma","migraine","muscular dystrophy",
-    "neurofibromatosis","obesity","osteoporosis","policitemia vera","prolactinoma","prostatic hyperplasia",
-    "psoriasis","pulmonary embolism","sarcoidosis","sickle cell anemia","sjogren","tabagism",
-    "valvulopathy","vasculitis","vitiligo","AVC","doenca_chagas","trombose_venosa_profunda",
-    "cloroquina","hipotireoidismo","hipertireoidismo","esclerose_multipla","artrite"
-]
-
-# EN->PT para labels PDF
-EN_TO_PT = {
-    "patient_age": "Idade",
-    "patient_sex": "Sexo",
-    "SAH": "Hipertensão Arterial Sistêmica (HAS)",
-    "acute myocardium infarct": "Infarto Agudo do Miocárdio",
-    "adrenal hypoplasia": "Hipoplasia Adrenal",
-    "albinism": "Albinismo",
-    "alzheimer": "Alzheimer",
-    "anemia": "Anemia",
-    "aneurysm": "Aneurisma",
-    "ankylosing spondylitis": "Espondilite Anquilosante",
-    "arrhythmia": "Arritmia",
-    "arthrosis": "Artrose",
-    "asthma": "Asma",
-    "behcet": "Doença de Behçet",
-    "brain tumor": "Tumor Cerebral",
-    "breast cancer": "Câncer de Mama",
-    "cardiac insufficiency": "Insuficiência Cardíaca",
-    "cardiopathy": "Cardiopatia",
-    "catheterism": "Cateterismo",
-    "cerebral palsy": "Paralisia Cerebral",
-    "chron disease": "Doença de Crohn",
-    "chronic kidney disease": "Doença Renal Crônica",
-    "cirrhosis": "Cirrose",
-    "cone dystrophy": "Distrofia de Cones",
-    "devic": "Síndrome de Devic",
-    "dialysis": "Diálise",
-    "down syndrome": "Síndrome de Down",
-    "dyslipidemia": "Dislipidemia",
-    "fibromyalgia": "Fibromialgia",
-    "hashimoto disease": "Doença de Hashimoto",
-    "hepatic cancer": "Câncer Hepático",
-    "hepatic transplant": "Transplante Hepático",
-    "hepatitis c": "Hepatite C",
-    "herpetic encephalitis": "Encefalite Herpética",
-    "hipocolesterolemia": "Hipocolesterolemia",
-    "human immunodeficiency virus": "HIV",
-    "hydrocephalus": "Hidrocefalia",
-    "hypercholesterolemia": "Hipercolesterolemia",
-    "hypertriglyceridemia": "Hipertrigliceridemia",
-    "hypophysis adenoma": "Adenoma de Hipófise",
-    "intestinal cancer": "Câncer Intestinal",
-    "intracranial hypertension": "Hipertensão Intracraniana",
-    "kidney transplant": "Transplante Renal",
-    "leucemia": "Leucemia",
-    "lung cancer": "Câncer de Pulmão",
-    "lymphoma": "Linfoma",
-    "mccune albright": "Síndrome de McCune-Albright",
-    "meningioma": "Meningioma",
-    "migraine": "Enxaqueca",
-    "muscular dystrophy": "Distrofia Muscular",
-    "neurofibromatosis": "Neurofibromatose",
-    "obesity": "Obesidade",
-    "osteoporosis": "Osteoporose",
-    "policitemia vera": "Policitemia Vera",
-    "prolactinoma": "Prolactinoma",
-    "prostatic hyperplasia": "Hiperplasia Prostática",
-    "psoriasis": "Psoríase",
-    "pulmonary embolism": "Embolia Pulmonar",
-    "sarcoidosis": "Sarcoidose",
-    "sickle cell anemia": "Anemia Falciforme",
-    "sjogren": "Síndrome de Sjögren",
-    "tabagism": "Tabagismo",
-    "valvulopathy": "Valvulopatia",
-    "vasculitis": "Vasculite",
-    "vitiligo": "Vitiligo",
-    "AVC": "Acidente Vascular Cerebral (AVC)",
-    "doenca_chagas": "Doença de Chagas",
-    "trombose_venosa_profunda": "Trombose Venosa Profunda",
-    "cloroquina": "Uso de Cloroquina",
-    "hipotireoidismo": "Hipotireoidismo",
-    "hipertireoidismo": "Hipertireoidismo",
-    "esclerose_multipla": "Esclerose Múltipla",
-    "artrite": "Artrite"
-}
-
-# Carrega modelo
+# Importações pesadas (pandas, ReportLab, pyarrow, sklearn via joblib) ficam
+# dentro das funções que as usam; o modelo é carregado em segundo plano por
+# startup() e GET / e /ready informam quando o backend está pronto
 if not os.path.exists(MODEL_PATH):
     raise FileNotFoundError(f"Modelo não encontrado: {MODEL_PATH}")
-model = joblib.load(MODEL_PATH)
 
-# DB init
+# Motor de inferência: "compiled" (árvores em arrays NumPy) ou "sklearn"
+INFERENCE_ENGINE = os.getenv("DATACARE_INFERENCE_ENGINE", "compiled").strip().lower()
+
+# Artefato mmap do motor compilado (python gb_engine.py export). Quando existe e
+# corresponde ao .pkl, o modelo abre sem desserializar nada e sem importar o
+# sklearn; senão o .pkl é carregado e o artefato regravado para a próxima vez.
+# DATACARE_MODEL_ARTIFACT="" desliga o artefato.
+MODEL_ARTIFACT_PATH = os.getenv("DATACARE_MODEL_ARTIFACT", os.path.splitext(MODEL_PATH)[0] + ".gbm")
+
+# Modelo em uso, versionado pelo sha256 do .pkl e trocado a quente (model_registry.py).
+# Cada processo verifica o arquivo a cada DATACARE_MODEL_WATCH_S segundos (0 desliga)
+# e carrega a nova versão em segundo plano; POST /admin/modelo/recarregar força a recarga.
+MODEL_WATCH_S = float(os.getenv("DATACARE_MODEL_WATCH_S", "5"))
+registry = ModelRegistry(MODEL_PATH, MODEL_ARTIFACT_PATH, compiled=INFERENCE_ENGINE == "compiled")
+
+def current_model():
+    """Versão do modelo para um request; leia uma vez e use até o fim do request"""
+    mv = registry.current
+    if mv is None:
+        raise NotReady("Modelo ainda não carregado")
+    return mv
+
+# Cache LRU de predições, chaveado pela linha de features canônica
+PREDICTION_CACHE_SIZE = int(os.getenv("DATACARE_PREDICTION_CACHE_SIZE", "4096"))
+
+class PredictionCache:
+    """LRU limitado; é esvaziado quando signature_fn (a versão do modelo) muda"""
+
+    def __init__(self, maxsize: int, signature_fn=None):
+        self.maxsize = maxsize
+        self._signature_fn = signature_fn
+        self._signature = signature_fn() if signature_fn else None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _check_signature(self):
+        if self._signature_fn is None:
+            return
+        sig = self._signature_fn()
+        if sig != self._signature:
+            if self._signature is not None:
+                logger.info("Versão do modelo mudou (%s), invalidando cache de predições", sig)
+                self.invalidations += 1
+            self._data.clear()
+            self._signature = sig
+
+    def get(self, key):
+        with self._lock:
+            self._check_signature()
+            prob = self._data.get(key)
+            if prob is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return prob
+
+    def put(self, key, prob: float):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = prob
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, signature_fn=lambda: registry.version)
+
+def cache_key(row, version: str) -> tuple:
+    """(versão, idade em float32, sexo, bitmask das comorbidades); o modelo compara em float32
+
+    A versão na chave impede que um request ainda na versão anterior grave
+    no cache uma probabilidade que seria lida depois da troca.
+    """
+    row = np.asarray(row)
+    return (version, float(np.float32(row[0])), int(row[1]), array_to_mask(row[COMORBIDITY_OFFSET:]))
+
+# DB: conexões por thread, WAL e thread escritora com group commit (db.py)
+DB_COMMIT_WINDOW_MS = float(os.getenv("DATACARE_DB_COMMIT_WINDOW_MS", "2"))
+db = Database(DB_PATH, commit_window_ms=DB_COMMIT_WINDOW_MS)
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS consultas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nome TEXT,
-        data_consulta TEXT,
-        patient_age REAL,
-        patient_sex INTEGER,
-        altura REAL,
-        peso REAL,
-        imc REAL,
-        comorbidades_json TEXT,
-        probabilidade REAL,
-        pdf_path TEXT,
-        created_at TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
-init_db()
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
 
-# PDF generator simples
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+# Métricas Prometheus (metrics.py) publicadas em GET /metrics: duração e erros
+# de cada etapa de /predict e da geração de PDFs, e bytes de PDF gravados
+metrics_registry = metrics.Registry()
+predict_stages = metrics.StageTimer(metrics_registry, "datacare_predict_stage", "cada etapa de /predict")
+pdf_render = metrics.StageTimer(metrics_registry, "datacare_pdf_render", "geração de PDF", label="tipo")
+pdf_bytes = metrics_registry.register(
+    metrics.Counter("datacare_pdf_bytes_total", "Bytes de PDF gravados", ("tipo",)))
 
+# PDF do relatório (layout e template em reports.py)
 def generate_pdf(consulta_info: dict, selected_names_pt: list, prob: float, filename: str):
-    c = canvas.Canvas(filename, pagesize=A4)
-    width, height = A4
-    margin = 40
-    y = height - margin
-    
-    # Título
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, y, "Relatório de Consulta - Avaliação de Risco de Diabetes")
-    y -= 30
-    
-    # Informações do paciente
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Dados do Paciente:")
-    y -= 20
-    
-    c.setFont("Helvetica", 10)
-    c.drawString(margin, y, f"Nome: {consulta_info.get('nome', '-')}")
-    c.drawString(width/2, y, f"Data da Consulta: {consulta_info.get('data_consulta', '-')}")
-    y -= 15
-    
-    c.drawString(margin, y, f"Idade: {consulta_info.get('patient_age', '-')} anos")
-    c.drawString(width/2, y, f"Sexo: {'Masculino' if consulta_info.get('patient_sex', 1) == 1 else 'Feminino'}")
-    y -= 15
-    
-    # Converter altura para cm para exibição
-    altura_m = consulta_info.get('altura', 0)
-    altura_cm = altura_m * 100 if altura_m else 0
-    c.drawString(margin, y, f"Altura: {altura_cm:.0f} cm ({altura_m:.2f} m)")
-    c.drawString(width/2, y, f"Peso: {consulta_info.get('peso', '-')} kg")
-    y -= 15
-    
-    c.drawString(margin, y, f"IMC: {consulta_info.get('imc', '-')}")
-    y -= 25
-    
-    # Resultado da predição
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(margin, y, "Resultado da Avaliação:")
-    y -= 20
-    
-    c.setFont("Helvetica", 12)
-    c.drawString(margin, y, f"Probabilidade de Diabetes Tipo 2: {prob:.2f}%")
-    y -= 25
-    
-    # Comorbidades
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Comorbidades Identificadas:")
-    y -= 20
-    
-    c.setFont("Helvetica", 10)
-    if selected_names_pt:
-        for name in selected_names_pt:
-            if y < margin + 50:  # Verifica se precisa de nova página
-                c.showPage()
-                y = height - margin
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(margin, y, "Comorbidades Identificadas (continuação):")
-                y -= 20
-                c.setFont("Helvetica", 10)
-            
-            # Usa o nome em português do mapeamento
-            nome_pt = EN_TO_PT.get(name, name)
-            c.drawString(margin + 10, y, f"• {nome_pt}")
-            y -= 14
-    else:
-        c.drawString(margin + 10, y, "Nenhuma comorbidade identificada")
-        y -= 14
-    
-    # Rodapé
-    y = margin + 30
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(margin, y, f"Documento gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}")
-    
-    c.save()
+    from reports import render_report
+    with pdf_render("consulta"):
+        render_report(consulta_info, selected_names_pt, prob, filename)
+    # filename pode ser um buffer em memória (DATACARE_PDF_MODE=memory)
+    tamanho = filename.getbuffer().nbytes if isinstance(filename, io.BytesIO) else os.path.getsize(filename)
+    pdf_bytes.inc("consulta", amount=tamanho)
+
+# Jobs de PDF: a linha de consultas é a fonte dos dados do relatório
+PDF_WORKERS = int(os.getenv("DATACARE_PDF_WORKERS", "2"))
+PDF_QUEUE_SIZE = int(os.getenv("DATACARE_PDF_QUEUE_SIZE", "256"))
+
+# "eager": gera o PDF de toda predição em segundo plano (padrão)
+# "lazy": o PDF só é gerado no primeiro download e fica num cache LRU em disco
+# "memory": o PDF é gerado a cada download num buffer em memória, sem gravar nada
+PDF_MODE = os.getenv("DATACARE_PDF_MODE", "eager").strip().lower()
+PDF_ON_DEMAND = PDF_MODE in ("lazy", "memory")
+# Cache-Control: max-age (s) dos PDFs baixados; o navegador revalida com o ETag depois
+PDF_MAX_AGE = int(os.getenv("DATACARE_PDF_MAX_AGE", "3600"))
+# "private" (padrão): só o navegador guarda o PDF, que tem dados do paciente.
+# "public" libera proxies/CDN, para quando a rota fica atrás de um cache próprio e autenticado
+PDF_CACHE_PUBLIC = os.getenv("DATACARE_PDF_CACHE_SCOPE", "private").strip().lower() == "public"
+pdf_etags = ETagCache()
+# PDFs em PDF_DIR/<id/10^6>/<id/10^3 % 1000>/consulta_<id>.pdf, gravados de forma atômica
+pdfs = pdf_store.PdfStore(PDF_DIR)
+# Fora de PDF_DIR: o índice (index.db) e os temporários do cache nunca ficam
+# ao alcance de GET /consultas/<arquivo>
+PDF_CACHE_DIR = os.getenv("DATACARE_PDF_CACHE_DIR", PDF_DIR.rstrip("/\\") + "_cache")
+PDF_CACHE_BYTES = int(os.getenv("DATACARE_PDF_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+def load_consulta(consulta_id: int):
+    row = db.query_one("SELECT * FROM consultas WHERE id = ?", (consulta_id,))
+    return dict(row) if row is not None else None
+
+def load_consultas(ids: list) -> list:
+    """Linhas de consultas na ordem de ids (ids inexistentes são ignorados)"""
+    rows = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        for row in db.query(f"SELECT * FROM consultas WHERE id IN ({marks})", chunk):
+            rows[row["id"]] = dict(row)
+    return [rows[i] for i in ids if i in rows]
+
+def find_consulta_by_pdf(filename: str):
+    # Nomes no layout de pdf_store.py trazem o id; os antigos usam o índice de pdf_path
+    consulta_id = pdf_store.consulta_id_of(filename)
+    if consulta_id is not None:
+        consulta = load_consulta(consulta_id)
+        return consulta if consulta is not None and consulta['pdf_path'] == filename else None
+    row = db.query_one("SELECT * FROM consultas WHERE pdf_path = ?", (filename,))
+    return dict(row) if row is not None else None
+
+def set_pdf_status(consulta_id: int, status: str):
+    db.write("UPDATE consultas SET pdf_status = ? WHERE id = ?", (status, consulta_id))
+
+def consulta_report_args(consulta: dict):
+    """(consulta_info, nomes PT, probabilidade %) de uma linha de consultas"""
+    selected_en = json.loads(consulta.get('comorbidades_json') or '[]')
+    selected_pt = [EN_TO_PT.get(name, name) for name in selected_en]
+    return consulta, selected_pt, (consulta.get('probabilidade') or 0) * 100
+
+def render_consulta_pdf(consulta: dict, filename: str):
+    """Gera o PDF a partir de uma linha de consultas"""
+    generate_pdf(*consulta_report_args(consulta), filename)
+
+def process_pdf_job(consulta_id: int):
+    consulta = load_consulta(consulta_id)
+    if consulta is None or not consulta.get('pdf_path'):
+        logger.warning("Job de PDF %s sem consulta correspondente", consulta_id)
+        return
+    try:
+        pdfs.write(consulta['pdf_path'], lambda tmp: render_consulta_pdf(consulta, tmp))
+    except Exception:
+        set_pdf_status(consulta_id, 'failed')
+        raise
+    set_pdf_status(consulta_id, 'done')
+
+# Com serve.py (DATACARE_PRELOAD=1) o mestre só carrega banco e modelo, sem
+# criar threads: um lock copiado travado no fork (logging, métricas, fila)
+# deixaria o worker preso para sempre. As threads começam em
+# start_background(), chamado por cada worker no post_fork.
+PRELOAD = os.getenv("DATACARE_PRELOAD") == "1"
+
+pdf_jobs = PdfJobQueue(process_pdf_job, workers=PDF_WORKERS, maxsize=PDF_QUEUE_SIZE)
+if not PRELOAD:
+    pdf_jobs.start()
+
+pdf_cache = PdfDiskCache(PDF_CACHE_DIR, PDF_CACHE_BYTES) if PDF_MODE == "lazy" else None
+
+# Retoma os PDFs pendentes de uma execução anterior ou de um worker que morreu.
+# Cada pendente tem dono (pdf_owner = pid de quem o enfileirou); o UPDATE só
+# assume os sem dono ou de pids mortos, então com N workers cada PDF é
+# retomado por um só, seja qual for a ordem em que eles sobem ou são reciclados.
+def claim_pdf_jobs(owner: int = None) -> list:
+    """Assume os PDFs pendentes sem dono vivo; ids dos que ficaram com owner"""
+    owner = owner or os.getpid()
+    donos = [r[0] for r in db.query(
+        "SELECT DISTINCT pdf_owner FROM consultas WHERE pdf_status = 'pending' AND pdf_owner IS NOT NULL")]
+    # O próprio pid também: se está na tabela é de um processo antigo (pid reusado)
+    mortos = [pid for pid in donos if pid == owner or not pid_alive(pid)]
+    sql = "UPDATE consultas SET pdf_owner = ? WHERE pdf_status = 'pending' AND (pdf_owner IS NULL"
+    if mortos:
+        sql += f" OR pdf_owner IN ({','.join('?' * len(mortos))})"
+    db.write(sql + ")", (owner, *mortos))
+    return [r[0] for r in db.query(
+        "SELECT id FROM consultas WHERE pdf_status = 'pending' AND pdf_owner = ? ORDER BY id", (owner,))]
+
+def release_pdf_jobs():
+    """Solta os donos dos pendentes; o mestre do serve.py chama antes de criar os workers"""
+    db.write("UPDATE consultas SET pdf_owner = NULL WHERE pdf_status = 'pending' AND pdf_owner IS NOT NULL")
+
+def resume_pdf_jobs():
+    return pdf_jobs.resume(claim_pdf_jobs())
+
+# Importação de arquivos (POST /consultas/importar) em segundo plano: o request
+# só grava o upload e enfileira; a pontuação roda numa thread do worker, fora
+# do timeout do gunicorn. O status fica em IMPORT_DIR/importacao_<id>.json,
+# visível para todos os workers, e os arquivos com mais de
+# DATACARE_IMPORT_RETENTION_S segundos são apagados a cada nova importação.
+IMPORT_WORKERS = int(os.getenv("DATACARE_IMPORT_WORKERS", "1"))
+IMPORT_QUEUE_SIZE = int(os.getenv("DATACARE_IMPORT_QUEUE_SIZE", "8"))
+IMPORT_RETENTION_S = float(os.getenv("DATACARE_IMPORT_RETENTION_S", str(7 * 24 * 3600)))
+IMPORT_ID_RE = re.compile(r"^\d{8}_\d{6}_[0-9a-f]{8}$")
+IMPORT_RESULT_RE = re.compile(r"^importacao_\d{8}_\d{6}_[0-9a-f]{8}\.parquet$")
+
+def import_paths(job_id: str) -> dict:
+    return {
+        "status": os.path.join(IMPORT_DIR, f"importacao_{job_id}.json"),
+        "saida": os.path.join(IMPORT_DIR, f"importacao_{job_id}.parquet"),
+    }
+
+def write_import_status(job_id: str, status: dict):
+    # Gravação atômica: outro worker lendo o status nunca vê o JSON pela metade
+    fd, tmp = tempfile.mkstemp(dir=IMPORT_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(status, f, ensure_ascii=False)
+    os.replace(tmp, import_paths(job_id)["status"])
+
+def read_import_status(job_id: str):
+    if not IMPORT_ID_RE.match(job_id):
+        return None
+    try:
+        with open(import_paths(job_id)["status"]) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def purge_imports(now: float = None) -> int:
+    """Apaga uploads, resultados e status com mais de IMPORT_RETENTION_S segundos"""
+    limite = (now or time.time()) - IMPORT_RETENTION_S
+    apagados = 0
+    for entry in os.scandir(IMPORT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < limite:
+                os.remove(entry.path)
+                apagados += 1
+        except FileNotFoundError:
+            pass
+    if apagados:
+        logger.info("Importações: %d arquivos antigos apagados", apagados)
+    return apagados
+
+def run_import_job(job_id: str):
+    import pyarrow as pa
+    from bulk_import import BulkImportError, score_file
+
+    status = read_import_status(job_id)
+    if status is None:
+        logger.warning("Importação %s sem status", job_id)
+        return
+    entrada = status.pop("entrada")
+    write_import_status(job_id, {**status, "status": "running", "pid": os.getpid()})
+    try:
+        mv = current_model()
+        resumo = score_file(
+            entrada, import_paths(job_id)["saida"], mv.predict_proba,
+            batch_size=status["batch_size"], formato=status["formato"],
+            db=db if status["salvar_db"] else None, insert_sql=INSERT_CONSULTA_SQL, model_version=mv.version,
+        )
+        write_import_status(job_id, {**status, "status": "done", "resumo": resumo})
+    except (BulkImportError, pa.ArrowInvalid) as e:
+        write_import_status(job_id, {**status, "status": "failed", "error": str(e)})
+    except Exception as e:
+        logger.exception("Erro na importação %s: %s", job_id, e)
+        write_import_status(job_id, {**status, "status": "failed", "error": str(e)})
+    finally:
+        if os.path.exists(entrada):
+            os.remove(entrada)
+
+import_jobs = PdfJobQueue(run_import_job, workers=IMPORT_WORKERS, maxsize=IMPORT_QUEUE_SIZE, name="import-worker")
+if not PRELOAD:
+    import_jobs.start()
+
+# Limite de pacientes por chamada em /predict/batch
+BATCH_MAX_ITEMS = int(os.getenv("DATACARE_BATCH_MAX_ITEMS", "10000"))
+
+# Opções liga/desliga dos requests: JSON true/false/0/1 ou texto (form, query)
+TRUE_VALUES = ("1", "true", "sim")
+FALSE_VALUES = ("", "0", "false", "nao", "não")
+
+def parse_flag(value, nome: str) -> bool:
+    """Valor da opção; ValueError (vira HTTP 400) se não for sim/não"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        texto = value.strip().lower()
+        if texto in TRUE_VALUES:
+            return True
+        if texto in FALSE_VALUES:
+            return False
+    raise ValueError(f"'{nome}' deve ser true ou false")
 
 # Constrói X do modelo
 def build_X_from_input(payload: dict):
-    selected_en, selected_pt = [], []
-    age = float(payload.get('idade') or 0)
-    sex_val = 2 if str(payload.get('sexo','M')).strip().lower() in ('f','feminino','female') else 1
-
-    raw_comorb = payload.get('comorbidades') or []
-    if isinstance(raw_comorb, str):
-        try: 
-            raw_comorb = json.loads(raw_comorb)
-        except: 
-            raw_comorb = []
-
-    for it in raw_comorb:
-        if it in FEATURE_NAMES:
-            selected_en.append(it)
-            # Agora usa o mapeamento completo para português
-            selected_pt.append(EN_TO_PT.get(it, it))
-
-    row = {'patient_age': age, 'patient_sex': sex_val}
-    for feat in FEATURE_NAMES:
-        if feat not in row: 
-            row[feat] = 1 if feat in selected_en else 0
-
-    altura = float(payload.get('altura') or 0)
-    peso = float(payload.get('peso') or 0)
-    imc_val = round(peso/(altura*altura), 1) if altura > 0 else None
-
-    df = pd.DataFrame([row], columns=FEATURE_NAMES)
-    meta = {
-        'nome': payload.get('nome',''), 
-        'data_consulta': payload.get('data',''), 
-        'altura': altura, 
-        'peso': peso, 
-        'imc': imc_val
-    }
-    return df, meta, selected_en, selected_pt
+    age, sex_val, meta, selected_en, selected_pt = parse_payload(payload)
+
+    row = np.zeros(N_FEATURES, dtype=np.float64)
+    row[0], row[1] = age, sex_val
+    row[[FEATURE_INDEX[it] for it in selected_en]] = 1
+
+    return row[np.newaxis, :], meta, selected_en, selected_pt
+
+def predict_proba_matrix(X: np.ndarray, mv=None) -> np.ndarray:
+    """Probabilidade da classe positiva para cada linha de X (versão atual se mv for None)"""
+    return (mv or current_model()).predict_proba(X)
+
+def predict_proba_cached(X: np.ndarray, mv) -> np.ndarray:
+    """Como predict_proba_matrix, mas só envia ao modelo as linhas fora do cache"""
+    if prediction_cache.maxsize <= 0:
+        return mv.predict_proba(X)
+    probs = np.empty(X.shape[0], dtype=np.float64)
+    keys = [cache_key(row, mv.version) for row in X]
+    pendentes = []
+    for i, key in enumerate(keys):
+        prob = prediction_cache.get(key)
+        if prob is None:
+            pendentes.append(i)
+        else:
+            probs[i] = prob
+    if pendentes:
+        probs[pendentes] = mv.predict_proba(X[pendentes])
+        for i in pendentes:
+            prediction_cache.put(keys[i], float(probs[i]))
+    return probs
+
+# Inicialização em segundo plano: banco, PDFs pendentes e o modelo (carregado e
+# aquecido pelo registry). Os requests (exceto / e /ready) esperam até ela terminar.
+STARTUP_TIMEOUT = float(os.getenv("DATACARE_STARTUP_TIMEOUT", "60"))
+startup_done = threading.Event()
+startup_error = None
+startup_timings = {}
+
+class NotReady(RuntimeError):
+    """Backend inicializando ou com falha na inicialização (vira HTTP 503)"""
+
+def startup():
+    global startup_error
+    inicio = time.perf_counter()
+    try:
+        init_db()
+        startup_timings["banco_s"] = round(time.perf_counter() - inicio, 3)
+
+        mv = registry.reload()
+        startup_timings["modelo_fonte"] = mv.source
+        startup_timings["modelo_versao"] = mv.version
+        startup_timings["modelo_s"] = round(time.perf_counter() - inicio, 3)
+        if not PRELOAD:
+            start_background()
+        startup_timings["total_s"] = round(time.perf_counter() - inicio, 3)
+        logger.info("Backend pronto em %.2fs", startup_timings["total_s"])
+    except Exception as e:
+        startup_error = f"{type(e).__name__}: {e}"
+        logger.exception("Falha na inicialização: %s", e)
+    finally:
+        startup_done.set()
+
+def start_background(resume: bool = True):
+    """Threads do processo que atende: jobs de PDF e de importação, retomada dos pendentes e watcher do modelo"""
+    pdf_jobs.start()
+    import_jobs.start()
+    if resume:
+        resume_pdf_jobs()
+    registry.start_watcher(MODEL_WATCH_S)
+
+def wait_ready(timeout: float = STARTUP_TIMEOUT):
+    """Bloqueia até a inicialização terminar; NotReady se falhou ou passou do timeout"""
+    if not startup_done.wait(timeout):
+        raise NotReady("Backend inicializando, tente novamente em instantes")
+    if startup_error is not None:
+        raise NotReady(f"Falha na inicialização: {startup_error}")
+
+# Com preload o serve.py chama startup() direto no mestre, sem thread
+if not PRELOAD:
+    threading.Thread(target=startup, name="startup", daemon=True).start()
+
+@app.before_request
+def require_ready():
+    if request.endpoint not in ("index", "ready", "metrics_endpoint", "static"):
+        wait_ready()
+
+@app.errorhandler(NotReady)
+def not_ready(e):
+    return jsonify({"error": str(e)}), 503
+
+# Profiling amostrado (profiling.py): DATACARE_PROFILE_RATE é a fração dos
+# requests de /predict perfilados (0 desliga); qualquer request com o header
+# X-Datacare-Profile e o X-Admin-Token também é perfilado. Os últimos
+# DATACARE_PROFILE_KEEP perfis ficam em /admin/perfis. Perfis expõem caminhos
+# e nomes internos: sem DATACARE_ADMIN_TOKEN o header é ignorado e
+# /admin/perfis responde 404.
+PROFILE_RATE = float(os.getenv("DATACARE_PROFILE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("DATACARE_PROFILE_KEEP", "20"))
+PROFILE_HEADER = "X-Datacare-Profile"
+profiler = RequestProfiler(PROFILE_RATE, PROFILE_KEEP)
+
+@app.before_request
+def start_profile():
+    if request.endpoint is None or request.endpoint.startswith("profile_"):
+        return
+    if request.headers.get(PROFILE_HEADER) and is_admin(required=True):
+        motivo = "header"
+    elif request.endpoint == "predict" and profiler.should_sample():
+        motivo = "amostra"
+    else:
+        return
+    prof = profiler.start()
+    if prof is not None:
+        g.profile = (prof, motivo, time.perf_counter())
+
+def finish_profile(status: int):
+    prof, motivo, inicio = g.pop("profile")
+    return profiler.stop(
+        prof, motivo=motivo, endpoint=request.endpoint, metodo=request.method, path=request.path,
+        status=status, duracao_ms=round((time.perf_counter() - inicio) * 1000, 3),
+    )
+
+@app.after_request
+def stop_profile(response):
+    if "profile" in g:
+        response.headers["X-Datacare-Profile-Id"] = str(finish_profile(response.status_code))
+    return response
+
+@app.teardown_request
+def discard_profile(exc):
+    # Exceção não tratada: after_request não roda, mas o cProfile precisa ser desligado
+    if "profile" in g:
+        finish_profile(500)
+
 # Routes
 @app.route("/", methods=["GET"])
 def index():
+    if not startup_done.is_set():
+        status = "inicializando"
+    else:
+        status = "erro" if startup_error else "online"
     return jsonify({
-        "status": "online",
+        "status": status,
+        "ready": status == "online",
+        "error": startup_error,
+        "startup": startup_timings,
         "message": "DataCare Backend API",
+        "schema_version": SCHEMA_VERSION,
         "endpoints": {
             "predict": "POST /predict - Calcular probabilidade de diabetes",
-            "download": "GET /consultas/<filename> - Download de PDF"
+            "predict_batch": "POST /predict/batch - Calcular probabilidade de vários pacientes",
+            "consultas": "GET /consultas - Buscar consultas (filtros e paginação por cursor)",
+            "comorbidades": "GET /consultas/comorbidades - Contagem de consultas por comorbidade",
+            "importar": "POST /consultas/importar - Pontuar arquivo CSV/Parquet de pacientes (em segundo plano)",
+            "importar_status": "GET /consultas/importar/<job_id> - Status e resultado da importação",
+            "analytics": "GET /analytics - Distribuição de risco por sexo, faixa etária e comorbidade",
+            "download": "GET /consultas/<filename> - Download de PDF",
+            "pdf_job": "GET /consultas/jobs/<id> - Status da geração do PDF",
+            "batch_report": "POST /consultas/relatorio - PDF único com várias consultas",
+            "cache": "GET /cache/stats - Estatísticas do cache de predições",
+            "db": "GET /db/stats - Latência de escrita e group commit do banco",
+            "ready": "GET /ready - Prontidão deste worker (modelo e banco)",
+            "metrics": "GET /metrics - Métricas Prometheus (latência por etapa, erros, bytes de PDF)",
+            "modelo": "GET /admin/modelo - Versão do modelo em uso e histórico de recargas",
+            "recarregar_modelo": "POST /admin/modelo/recarregar - Carrega a nova versão do modelo sem reinício",
+            "perfis": "GET /admin/perfis - Perfis cProfile dos requests amostrados (pstats, texto, collapsed)"
         }
     })
 
+# Prontidão para o balanceador/healthcheck: 503 enquanto o worker não pode atender
+@app.route("/ready", methods=["GET"])
+def ready():
+    checks = {
+        "inicializacao": startup_done.is_set() and startup_error is None,
+        "modelo": registry.current is not None,
+        "banco": False,
+    }
+    try:
+        checks["banco"] = db.query_one("SELECT 1")[0] == 1
+    except Exception as e:
+        logger.warning("Banco indisponível na verificação de prontidão: %s", e)
+    pronto = all(checks.values())
+    return jsonify({
+        "ready": pronto,
+        "pid": os.getpid(),
+        "checks": checks,
+        "error": startup_error,
+        "engine": INFERENCE_ENGINE if registry.current is None else registry.current.describe()["motor"],
+        "modelo_versao": registry.version,
+        "pdf_jobs_pendentes": pdf_jobs.pending(),
+    }), 200 if pronto else 503
+
 @app.route("/predict", methods=["POST"])
 def predict():
+    inicio = time.perf_counter()
     try:
-        payload = request.get_json()
-        X, meta, selected_en, selected_pt = build_X_from_input(payload)
+        with predict_stages("parse"):
+            payload = request.get_json()
+        with predict_stages("features"):
+            X, meta, selected_en, selected_pt = build_X_from_input(payload)
 
-        if hasattr(model, "predict_proba"):
-            prob = float(model.predict_proba(X)[:,1][0])
-        else:
-            prob = float(model.predict(X)[0])
-
-        # gerar PDF
-        pdf_basename = f"consulta_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = os.path.join(PDF_DIR, pdf_basename)
-        generate_pdf({**meta, **X.loc[0].to_dict()}, selected_pt, prob*100, pdf_path)
-
-        # salvar DB
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO consultas (nome,data_consulta,patient_age,patient_sex,altura,peso,imc,
-            comorbidades_json,probabilidade,pdf_path,created_at)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?)
-        ''', (
-            meta['nome'], meta['data_consulta'], float(X.loc[0,'patient_age']),
-            int(X.loc[0,'patient_sex']), meta['altura'], meta['peso'], meta['imc'],
-            json.dumps(selected_en, ensure_ascii=False), prob, pdf_basename,
-            datetime.now().isoformat()
-        ))
-        conn.commit()
-        conn.close()
-
-        pdf_url = url_for('download_pdf', filename=pdf_basename)
-        return jsonify({"probabilidade": round(prob*100, 4), "pdf_url": pdf_url})
+        with predict_stages("inference"):
+            mv = current_model()
+            row = X[0]
+            key = cache_key(row, mv.version)
+            prob = prediction_cache.get(key)
+            if prob is None:
+                prob = mv.predict_proba_one(row)
+                prediction_cache.put(key, prob)
+
+        # salvar DB; o PDF é gerado em segundo plano a partir desta linha
+        # (pdf_path vem do id, preenchido pelo trigger de pdf_store.py)
+        with predict_stages("db"):
+            consulta_id = db.write(INSERT_CONSULTA_OWNER_SQL, (
+                meta['nome'], meta['data_consulta'], float(X[0, 0]),
+                int(X[0, 1]), meta['altura'], meta['peso'], meta['imc'],
+                json.dumps(selected_en, ensure_ascii=False), prob, None,
+                'lazy' if PDF_ON_DEMAND else 'pending', datetime.now().isoformat(), mv.version, os.getpid()
+            ))
+
+        # Fila cheia: gera no próprio request (backpressure)
+        with predict_stages("pdf"):
+            pdf_status = 'lazy' if PDF_ON_DEMAND else 'pending'
+            if pdf_status == 'pending' and not pdf_jobs.submit(consulta_id):
+                try:
+                    process_pdf_job(consulta_id)
+                    pdf_status = 'done'
+                except Exception as e:
+                    logger.exception("Erro ao gerar PDF da consulta %s: %s", consulta_id, e)
+                    pdf_status = 'failed'
+
+        pdf_url = url_for('download_pdf', filename=pdf_store.relative_path(consulta_id))
+        resposta = jsonify({
+            "probabilidade": round(prob*100, 4),
+            "modelo_versao": mv.version,
+            "pdf_url": pdf_url,
+            "job_id": consulta_id,
+            "pdf_status": pdf_status,
+            "job_url": url_for('pdf_job_status', job_id=consulta_id)
+        })
+        predict_stages.seconds.observe(time.perf_counter() - inicio, "total")
+        return resposta
 
     except Exception as e:
+        predict_stages.errors.inc("total")
         logger.exception("Erro na rota /predict: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    try:
+        body = request.get_json()
+        if isinstance(body, list):
+            body = {"pacientes": body}
+        if not isinstance(body, dict) or not isinstance(body.get("pacientes"), list):
+            return jsonify({"error": "Envie uma lista em 'pacientes'"}), 400
+        payloads = body["pacientes"]
+        if len(payloads) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Máximo de {BATCH_MAX_ITEMS} pacientes por lote"}), 413
+        try:
+            gerar_pdf = parse_flag(body.get("gerar_pdf"), "gerar_pdf")
+            salvar_db = parse_flag(body.get("salvar_db"), "salvar_db")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        X, itens, erros = build_X_batch(payloads)
+        validos = [i for i, item in enumerate(itens) if item is not None]
+        mv = current_model()
+        probs = np.empty(len(payloads), dtype=np.float64)
+        if validos:
+            probs[validos] = predict_proba_cached(X[validos], mv)
+
+        resultados, rows, gravados = [], [], []
+        for i, item in enumerate(itens):
+            if item is None:
+                resultados.append({"indice": i, "error": erros[i]})
+                continue
+            meta, selected_en, selected_pt = item
+            prob = float(probs[i])
+            resultado = {"indice": i, "probabilidade": round(prob*100, 4)}
+            info = {**meta, 'patient_age': X[i, 0], 'patient_sex': int(X[i, 1])}
+
+            pdf_status = None
+            if gerar_pdf and salvar_db:
+                # O caminho vem do id: o PDF é gerado depois do INSERT
+                pdf_status = 'lazy' if PDF_ON_DEMAND else 'pending'
+            elif gerar_pdf:
+                # Sem consulta gravada: PDF avulso
+                try:
+                    relative = pdf_store.adhoc_path()
+                    pdfs.write(relative, lambda tmp: generate_pdf(info, selected_pt, prob*100, tmp))
+                    resultado["pdf_url"] = url_for('download_pdf', filename=relative)
+                except Exception as e:
+                    logger.exception("Erro ao gerar PDF do item %d: %s", i, e)
+                    resultado["error"] = f"Erro ao gerar PDF: {e}"
+
+            if salvar_db:
+                rows.append((
+                    meta['nome'], meta['data_consulta'], float(X[i, 0]), int(X[i, 1]),
+                    meta['altura'], meta['peso'], meta['imc'],
+                    json.dumps(selected_en, ensure_ascii=False), prob, None,
+                    pdf_status, datetime.now().isoformat(), mv.version, os.getpid()
+                ))
+                gravados.append((resultado, (info, selected_pt, prob*100) if pdf_status else None))
+            resultados.append(resultado)
+
+        # salvar DB numa única transação; depois os PDFs das consultas gravadas
+        if rows:
+            ids = db.insert_many(INSERT_CONSULTA_OWNER_SQL, rows).result()
+            status = []
+            for (resultado, pdf), consulta_id in zip(gravados, ids):
+                if pdf is None:
+                    continue
+                relative = pdf_store.relative_path(consulta_id)
+                if not PDF_ON_DEMAND:
+                    try:
+                        pdfs.write(relative, lambda tmp: generate_pdf(*pdf, tmp))
+                        status.append(('done', consulta_id))
+                    except Exception as e:
+                        logger.exception("Erro ao gerar PDF da consulta %s: %s", consulta_id, e)
+                        status.append(('failed', consulta_id))
+                        resultado["error"] = f"Erro ao gerar PDF: {e}"
+                        continue
+                resultado["pdf_url"] = url_for('download_pdf', filename=relative)
+            if status:
+                db.executemany("UPDATE consultas SET pdf_status = ? WHERE id = ?", status).result()
+
+        return jsonify({
+            "total": len(payloads),
+            "erros": len(erros),
+            "modelo_versao": mv.version,
+            "resultados": resultados
+        })
+
+    except Exception as e:
+        logger.exception("Erro na rota /predict/batch: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+# Administração do modelo. Com DATACARE_ADMIN_TOKEN definido, exige o header X-Admin-Token.
+# Com vários workers cada um tem seu registry: a chamada vale só para o worker que a atendeu
+# (os demais trocam de versão pelo watcher do arquivo).
+ADMIN_TOKEN = os.getenv("DATACARE_ADMIN_TOKEN", "")
+
+def is_admin(required: bool = False) -> bool:
+    """X-Admin-Token confere; sem token configurado libera só o que não é required"""
+    if not ADMIN_TOKEN:
+        return not required
+    return request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+def profiles_denied():
+    """Resposta de erro das rotas de perfis, ou None se o acesso é permitido"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Perfis desativados: defina DATACARE_ADMIN_TOKEN"}), 404
+    if not is_admin(required=True):
+        return jsonify({"error": "Token de administração inválido"}), 403
+    return None
+
+@app.route("/admin/modelo", methods=["GET"])
+def model_status():
+    if not is_admin():
+        return jsonify({"error": "Token de administração inválido"}), 403
+    return jsonify({**registry.status(), "pid": os.getpid(), "cache": prediction_cache.stats()})
+
+@app.route("/admin/modelo/recarregar", methods=["POST"])
+def model_reload():
+    if not is_admin():
+        return jsonify({"error": "Token de administração inválido"}), 403
+    if str(request.args.get("esperar", "")).lower() in TRUE_VALUES:
+        try:
+            registry.reload()
+        except Exception as e:
+            logger.exception("Falha ao recarregar o modelo: %s", e)
+            return jsonify({"error": f"Falha ao carregar o modelo, versão anterior mantida: {e}",
+                            **registry.status(), "pid": os.getpid()}), 422
+        return jsonify({**registry.status(), "pid": os.getpid()})
+    if not registry.reload_async():
+        return jsonify({"error": "Recarga do modelo já em andamento"}), 409
+    return jsonify({"status": "carregando", "atual": registry.version, "pid": os.getpid()}), 202
+
+@app.route("/admin/perfis", methods=["GET"])
+def profile_list():
+    negado = profiles_denied()
+    if negado is not None:
+        return negado
+    return jsonify({
+        "taxa": profiler.sample_rate,
+        "max": profiler.keep,
+        "ignorados": profiler.skipped,
+        "pid": os.getpid(),
+        "perfis": profiler.list(),
+    })
+
+@app.route("/admin/perfis/<perfil>", methods=["GET"])
+def profile_download(perfil):
+    """?formato=pstats|texto|collapsed (&ordem=&limite= no texto); "agregado" soma todos (?endpoint=)"""
+    negado = profiles_denied()
+    if negado is not None:
+        return negado
+    if perfil == "agregado":
+        stats = profiler.merged(request.args.get("endpoint"))
+    elif perfil.isdigit():
+        encontrado = profiler.get(int(perfil))
+        stats = encontrado["stats"] if encontrado else None
+    else:
+        stats = None
+    if stats is None:
+        return jsonify({"error": "Perfil não encontrado"}), 404
+    formato = request.args.get("formato", "texto")
+    try:
+        conteudo, mimetype = render_profile(stats, formato, request.args.get("ordem", "cumulative"),
+                                            int(request.args.get("limite", 50)))
+    except (ProfileError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    resposta = app.response_class(conteudo, mimetype=mimetype)
+    if formato == "pstats":
+        resposta.headers["Content-Disposition"] = f'attachment; filename="perfil_{perfil}.prof"'
+    return resposta
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+# Valores mantidos em outros objetos, lidos a cada coleta de GET /metrics
+for _metric in (
+    metrics.Gauge("datacare_prediction_cache_hits_total", "Acertos do cache de predições",
+                  lambda: prediction_cache.hits, kind="counter"),
+    metrics.Gauge("datacare_prediction_cache_misses_total", "Faltas do cache de predições",
+                  lambda: prediction_cache.misses, kind="counter"),
+    metrics.Gauge("datacare_pdf_jobs_pending", "Jobs de PDF na fila", lambda: pdf_jobs.pending()),
+    metrics.Gauge("datacare_model_info", "Versão do modelo em uso",
+                  lambda: {(registry.version,): 1} if registry.version else {}, ("version",)),
+):
+    metrics_registry.register(_metric)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return app.response_class(metrics_registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/db/stats", methods=["GET"])
+def db_stats():
+    return jsonify(db.stats())
+
+def consulta_to_json(consulta: dict) -> dict:
+    """Linha de consultas no formato da API (probabilidade em %)"""
+    return {
+        "id": consulta["id"],
+        "nome": consulta["nome"],
+        "data_consulta": consulta["data_consulta"],
+        "idade": consulta["patient_age"],
+        "sexo": "F" if consulta["patient_sex"] == 2 else "M",
+        "altura": consulta["altura"],
+        "peso": consulta["peso"],
+        "imc": consulta["imc"],
+        "comorbidades": json.loads(consulta["comorbidades_json"] or "[]"),
+        "probabilidade": round((consulta["probabilidade"] or 0) * 100, 4),
+        "pdf_status": consulta.get("pdf_status"),
+        "modelo_versao": consulta.get("model_version"),
+        "pdf_url": url_for('download_pdf', filename=consulta["pdf_path"]) if consulta["pdf_path"] else None,
+        "created_at": consulta["created_at"],
+    }
+
+@app.route("/consultas", methods=["GET"])
+def list_consultas():
+    try:
+        sql, params, limite, ordem = build_query(request.args)
+    except SearchError as e:
+        return jsonify({"error": str(e)}), 400
+    rows = db.query(sql, params)
+    mais = len(rows) > limite
+    rows = rows[:limite]
+    return jsonify({
+        "consultas": [consulta_to_json(dict(r)) for r in rows],
+        "proximo": next_cursor(rows[-1], ordem) if mais else None,
+        "limite": limite,
+    })
+
+@app.route("/consultas/comorbidades", methods=["GET"])
+def count_comorbidades():
+    try:
+        sql, params = build_counts_query(request.args)
+    except SearchError as e:
+        return jsonify({"error": str(e)}), 400
+    totais = dict(db.query(sql, params))
+    return jsonify({"comorbidades": [
+        {"comorbidade": name, "rotulo": EN_TO_PT.get(name, name), "total": totais[idx]}
+        for idx, name in enumerate(FEATURE_NAMES) if totais.get(idx)
+    ]})
+
+@app.route("/consultas/importar", methods=["POST"])
+def import_file():
+    from bulk_import import DEFAULT_BATCH_SIZE, BulkImportError, detect_format
+
+    arquivo = request.files.get("arquivo")
+    if arquivo is None or not arquivo.filename:
+        return jsonify({"error": "Envie o arquivo no campo 'arquivo' (multipart)"}), 400
+    try:
+        formato = detect_format(arquivo.filename, request.form.get("formato"))
+        batch_size = int(request.form.get("batch_size") or DEFAULT_BATCH_SIZE)
+        salvar_db = parse_flag(request.form.get("salvar_db"), "salvar_db")
+    except (BulkImportError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # O upload vai para disco e é lido em lotes; nada do arquivo fica inteiro na memória
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    purge_imports()
+    job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    entrada = os.path.join(IMPORT_DIR, f"upload_{job_id}.{formato}")
+    arquivo.save(entrada)
+    write_import_status(job_id, {
+        "job_id": job_id, "status": "pending", "arquivo": arquivo.filename, "entrada": entrada,
+        "formato": formato, "batch_size": batch_size, "salvar_db": salvar_db,
+        "criado_em": datetime.now().isoformat(),
+    })
+    if not import_jobs.submit(job_id):
+        os.remove(entrada)
+        os.remove(import_paths(job_id)["status"])
+        return jsonify({"error": "Fila de importações cheia, tente novamente em instantes"}), 503
+    return jsonify({"job_id": job_id, "status": "pending",
+                    "status_url": url_for('import_status', job_id=job_id)}), 202
+
+@app.route("/consultas/importar/<job_id>", methods=["GET"])
+def import_status(job_id):
+    status = read_import_status(job_id)
+    if status is None:
+        return jsonify({"error": "Importação não encontrada"}), 404
+    status.pop("entrada", None)
+    pid = status.pop("pid", None)
+    if status["status"] == "running" and pid is not None and not pid_alive(pid):
+        # O worker que rodava a importação morreu (restart, OOM, timeout)
+        status.update(status="failed", error="Importação interrompida; envie o arquivo de novo")
+    if status["status"] == "done":
+        status["resultado_url"] = url_for('download_import', filename=os.path.basename(import_paths(job_id)["saida"]))
+    return jsonify(status)
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@app.route("/importacoes/<filename>", methods=["GET"])
+def download_import(filename):
+    # Só os Parquets de resultado; uploads e status ficam de fora
+    if not IMPORT_RESULT_RE.match(filename):
+        abort(404)
+    return send_from_directory(IMPORT_DIR, filename, as_attachment=True)
+
+@app.route("/analytics", methods=["GET"])
+def risk_analytics():
+    dimensao = request.args.get("dimensao")
+    if dimensao and dimensao not in DIMENSIONS:
+        return jsonify({"error": f"'dimensao' deve ser um de: {', '.join(DIMENSIONS)}"}), 400
+    sql = "SELECT dimensao, grupo, bin, total, soma_prob, soma_idade FROM analytics_hist"
+    params = ()
+    if dimensao:
+        sql += " WHERE dimensao = ?"
+        params = (dimensao,)
+    return jsonify(summarize(db.query(sql, params), EN_TO_PT))
+
+@app.route("/consultas/jobs/<int:job_id>", methods=["GET"])
+def pdf_job_status(job_id):
+    consulta = load_consulta(job_id)
+    if consulta is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    status = consulta.get('pdf_status')
+    resposta = {"job_id": job_id, "pdf_status": status}
+    if status in ('done', 'lazy') and consulta.get('pdf_path'):
+        resposta["pdf_url"] = url_for('download_pdf', filename=consulta['pdf_path'])
+    return jsonify(resposta)
+
+@app.route("/consultas/relatorio", methods=["POST"])
+def batch_report():
+    body = request.get_json(silent=True) or {}
+    ids = body.get("ids")
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        return jsonify({"error": "Envie uma lista de ids de consultas em 'ids'"}), 400
+    if len(ids) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Máximo de {BATCH_MAX_ITEMS} consultas por relatório"}), 413
+    consultas = load_consultas(ids)
+    if not consultas:
+        return jsonify({"error": "Nenhuma consulta encontrada"}), 404
+
+    from reports import render_batch
+    buf = io.BytesIO()
+    with pdf_render("lote"):
+        render_batch((consulta_report_args(c) for c in consultas), buf)
+    pdf_bytes.inc("lote", amount=buf.getbuffer().nbytes)
+    buf.seek(0)
+    nome = f"relatorio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return send_file(buf, mimetype="application/pdf", download_name=nome)
+
+def send_stored_pdf(filename: str):
+    """PDF já gravado (diretório de PDFs ou cache sob demanda), ou None"""
+    path = pdfs.path(filename)
+    if path is not None and os.path.isfile(path):
+        return send_pdf_file(path, pdf_etags, PDF_MAX_AGE, PDF_CACHE_PUBLIC)
+    if pdf_cache is not None:
+        path = pdf_cache.get(filename)
+        if path is not None:
+            return send_pdf_file(path, pdf_etags, PDF_MAX_AGE, PDF_CACHE_PUBLIC)
+    return None
+
 @app.route("/consultas/<path:filename>")
 def download_pdf(filename):
-    return send_from_directory(PDF_DIR, filename, as_attachment=False)
+    # O caminho sai direto do nome (pdf_store.py), sem listar diretórios.
+    # PDFs já gravados: ETag forte, 304 e Range (pdf_http.py). Só nomes do
+    # layout de pdf_store.py vão direto ao disco; os demais precisam estar
+    # gravados em consultas.pdf_path (nome antigo ainda não migrado)
+    nome_valido = pdf_store.is_pdf_name(filename)
+    if nome_valido:
+        resposta = send_stored_pdf(filename)
+        if resposta is not None:
+            return resposta
+
+    consulta = find_consulta_by_pdf(filename)
+    if consulta is None:
+        # Link anterior à migração (python pdf_store.py migrar)
+        row = db.query_one("SELECT consulta_id FROM pdf_legado WHERE pdf_path = ?", (filename,))
+        consulta = load_consulta(row[0]) if row is not None else None
+        if consulta is not None and consulta.get('pdf_path'):
+            return redirect(url_for('download_pdf', filename=consulta['pdf_path']), 301)
+        abort(404)
+    if not nome_valido:
+        resposta = send_stored_pdf(filename)
+        if resposta is not None:
+            return resposta
+
+    if PDF_MODE == "memory":
+        return send_pdf_rendered(lambda buf: render_consulta_pdf(consulta, buf), row_etag(consulta), PDF_MAX_AGE, PDF_CACHE_PUBLIC)
+    if pdf_cache is None:  # eager: PDF ainda na fila ou com falha
+        abort(404)
+
+    # Modo lazy: renderiza a partir da linha de consultas no primeiro acesso
+    path = pdf_cache.put(filename, lambda tmp: render_consulta_pdf(consulta, tmp))
+    return send_pdf_file(path, pdf_etags, PDF_MAX_AGE, PDF_CACHE_PUBLIC)
+
+@app.route("/cache/pdf/stats", methods=["GET"])
+def pdf_cache_stats():
+    etags = pdf_etags.stats()
+    if pdf_cache is None:
+        return jsonify({"mode": PDF_MODE, "etags": etags})
+    return jsonify({"mode": PDF_MODE, **pdf_cache.stats(), "etags": etags})
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,531 @@
+# app.py: cache de predições e rotas do backend sobre banco e PDFs temporários
+import importlib
+import io
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from schema import N_FEATURES
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # Banco e PDFs temporários; DATACARE_PRELOAD só importa, sem threads nem modelo
+    tmp = tmp_path_factory.mktemp("app")
+    mp = pytest.MonkeyPatch()
+    mp.setenv("DATACARE_DB_PATH", str(tmp / "consultas.db"))
+    mp.setenv("DATACARE_PDF_DIR", str(tmp / "consultas"))
+    mp.setenv("DATACARE_IMPORT_DIR", str(tmp / "importacoes"))
+    mp.setenv("DATACARE_MODEL_ARTIFACT", "")
+    mp.setenv("DATACARE_MODEL_WATCH_S", "0")
+    mp.setenv("DATACARE_PRELOAD", "1")
+    yield importlib.import_module("app")
+    mp.undo()
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    # Inicialização síncrona (como no mestre do serve.py) e as filas do worker
+    app.startup()
+    assert app.startup_error is None
+    app.start_background(resume=False)
+    return app.app.test_client()
+
+
+def gravar_consulta(app, pdf_path=None, pdf_status=None, comorbidades='["SAH"]'):
+    return app.db.write(app.INSERT_CONSULTA_SQL, (
+        "Ana", "2024-01-10", 50.0, 2, 1.6, 60.0, 23.4, comorbidades, 0.42,
+        pdf_path, pdf_status, "2024-01-10T10:00:00", "v-teste"))
+
+
+def gravar_arquivo(path, conteudo=b"%PDF-1.4 teste"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(conteudo)
+
+
+class Versao:
+    """signature_fn cujo valor o teste troca"""
+
+    def __init__(self, valor):
+        self.valor = valor
+
+    def __call__(self):
+        return self.valor
+
+
+class ModeloFalso:
+    def __init__(self, version):
+        self.version = version
+        self.linhas = 0
+
+    def predict_proba(self, X):
+        self.linhas += X.shape[0]
+        return X[:, 0] / 100.0
+
+
+def paciente(idade, sexo=1, comorbidades=()):
+    row = np.zeros(N_FEATURES)
+    row[0], row[1] = idade, sexo
+    for i in comorbidades:
+        row[2 + i] = 1
+    return row
+
+
+def test_despejo_lru(app):
+    cache = app.PredictionCache(2)
+    cache.put("a", 0.1)
+    cache.put("b", 0.2)
+    assert cache.get("a") == 0.1  # b passa a ser o menos usado
+    cache.put("c", 0.3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 0.1 and cache.get("c") == 0.3
+    stats = cache.stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_tamanho_zero_nao_guarda(app):
+    cache = app.PredictionCache(0)
+    cache.put("a", 0.1)
+    assert cache.get("a") is None and cache.stats()["size"] == 0
+
+
+def test_troca_de_versao_invalida(app):
+    versao = Versao("v1")
+    cache = app.PredictionCache(10, signature_fn=versao)
+    cache.put("a", 0.1)
+    assert cache.get("a") == 0.1
+    versao.valor = "v2"
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["size"] == 0
+    cache.put("a", 0.5)
+    assert cache.get("a") == 0.5
+
+
+def test_primeira_versao_nao_conta_como_invalidacao(app):
+    versao = Versao(None)  # modelo ainda não carregado
+    cache = app.PredictionCache(10, signature_fn=versao)
+    versao.valor = "v1"
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 0
+
+
+def test_chave_inclui_versao_e_usa_float32(app):
+    row = paciente(52.1, 2, [0, 3])
+    assert app.cache_key(row, "v1") != app.cache_key(row, "v2")
+    assert app.cache_key(row, "v1") == app.cache_key(paciente(np.float32(52.1), 2, [3, 0]), "v1")
+    assert app.cache_key(row, "v1") != app.cache_key(paciente(52.1, 2, [0]), "v1")
+
+
+def test_predicao_so_envia_linhas_fora_do_cache(app, monkeypatch):
+    versao = Versao("v1")
+    monkeypatch.setattr(app, "prediction_cache", app.PredictionCache(100, signature_fn=versao))
+    X = np.array([paciente(10), paciente(20), paciente(10)])
+
+    mv = ModeloFalso("v1")
+    assert list(app.predict_proba_cached(X, mv)) == [0.1, 0.2, 0.1]
+    assert mv.linhas == 3
+    assert list(app.predict_proba_cached(X[:2], mv)) == [0.1, 0.2]
+    assert mv.linhas == 3
+
+    # Modelo novo: nada do cache anterior é reaproveitado
+    versao.valor = "v2"
+    mv2 = ModeloFalso("v2")
+    app.predict_proba_cached(X[:2], mv2)
+    assert mv2.linhas == 2
+
+
+# --- GET /consultas/<arquivo>: só nomes do layout de pdf_store.py (ou registrados)
+
+def test_download_de_pdf_gravado(app, client):
+    consulta_id = gravar_consulta(app, pdf_status="done")
+    relative = app.pdf_store.relative_path(consulta_id)
+    gravar_arquivo(app.pdfs.path(relative))
+    r = client.get(f"/consultas/{relative}")
+    assert r.status_code == 200 and r.data == b"%PDF-1.4 teste"
+
+
+def test_download_de_avulso(app, client):
+    relative = app.pdf_store.adhoc_path()
+    gravar_arquivo(app.pdfs.path(relative))
+    assert client.get(f"/consultas/{relative}").status_code == 200
+
+
+@pytest.mark.parametrize("nome", [
+    "000/000/tmpab12cd.tmp", "index.db", "cache/index.db", "000/000/consulta_7.pdf.tmp",
+    "avulsos/20240101/nao-hex.pdf", "consulta_20990101_000000.pdf",
+])
+def test_outros_arquivos_do_diretorio_sao_404(app, client, nome):
+    gravar_arquivo(os.path.join(app.PDF_DIR, nome))
+    assert client.get(f"/consultas/{nome}").status_code == 404
+
+
+def test_cache_fora_do_diretorio_de_pdfs(app):
+    pdf_dir = os.path.abspath(app.PDF_DIR) + os.sep
+    assert not os.path.abspath(app.PDF_CACHE_DIR).startswith(pdf_dir)
+
+
+def test_nome_antigo_registrado_e_servido(app, client):
+    nome = "consulta_20240110_100000.pdf"
+    gravar_consulta(app, pdf_path=nome, pdf_status="done")
+    gravar_arquivo(os.path.join(app.PDF_DIR, nome), b"%PDF-1.4 antigo")
+    r = client.get(f"/consultas/{nome}")
+    assert r.status_code == 200 and r.data == b"%PDF-1.4 antigo"
+
+
+def test_download_no_modo_memory(app, client, monkeypatch):
+    # Sem arquivo: renderiza a partir da linha, com ETag fraco e sem Range
+    monkeypatch.setattr(app, "PDF_MODE", "memory")
+    consulta_id = gravar_consulta(app, pdf_status="lazy")
+    relative = app.pdf_store.relative_path(consulta_id)
+    r = client.get(f"/consultas/{relative}", headers={"Range": "bytes=0-9"})
+    assert r.status_code == 200 and r.data.startswith(b"%PDF")
+    assert r.get_etag()[1] and r.headers["Accept-Ranges"] == "none"
+    assert client.get(f"/consultas/{relative}",
+                      headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+
+
+# --- POST /consultas/importar em segundo plano
+
+def importar(client, conteudo: bytes, nome="pacientes.csv", **form):
+    r = client.post("/consultas/importar", data={"arquivo": (io.BytesIO(conteudo), nome), **form})
+    assert r.status_code == 202, r.get_json()
+    return r.get_json()
+
+
+def aguardar_importacao(client, status_url, timeout=20):
+    fim = time.monotonic() + timeout
+    while time.monotonic() < fim:
+        status = client.get(status_url).get_json()
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"importação não terminou: {status}")
+
+
+def test_importacao_em_segundo_plano(app, client):
+    antes = app.db.query_one("SELECT COUNT(*) FROM consultas")[0]
+    job = importar(client, b"nome,idade,sexo,comorbidades\nA,50,F,SAH\nB,60,2,obesity;SAH\n", salvar_db="1")
+    status = aguardar_importacao(client, job["status_url"])
+    assert status["status"] == "done" and status["arquivo"] == "pacientes.csv"
+    assert status["resumo"]["linhas"] == 2 and status["resumo"]["salvas_db"] == 2
+    assert app.db.query_one("SELECT COUNT(*) FROM consultas")[0] == antes + 2
+    r = client.get(status["resultado_url"])
+    assert r.status_code == 200 and r.data[:4] == b"PAR1"
+    # O upload não fica em disco depois do job
+    assert not [n for n in os.listdir(app.IMPORT_DIR) if n.startswith("upload_")]
+
+
+def test_importacao_com_arquivo_invalido_falha_no_status(client):
+    job = importar(client, b"nome,sexo\nA,F\n")
+    status = aguardar_importacao(client, job["status_url"])
+    assert status["status"] == "failed" and "idade" in status["error"]
+    assert "resultado_url" not in status
+
+
+@pytest.mark.parametrize("data", [{}, {"salvar_db": "talvez"}, {"formato": "xlsx"}])
+def test_importacao_recusa_parametros(client, data):
+    arquivo = {"arquivo": (io.BytesIO(b"idade\n1\n"), "p.csv")} if data else {}
+    assert client.post("/consultas/importar", data={**arquivo, **data}).status_code == 400
+
+
+def test_status_e_arquivos_de_importacao_desconhecidos(app, client):
+    assert client.get("/consultas/importar/20240101_000000_deadbeef").status_code == 404
+    assert client.get("/consultas/importar/..%2F..%2Fetc").status_code == 404
+    job = importar(client, b"idade\n40\n")
+    aguardar_importacao(client, job["status_url"])
+    # Só os Parquets de resultado são baixáveis, nunca o status ou uploads
+    assert client.get(f"/importacoes/importacao_{job['job_id']}.json").status_code == 404
+
+
+def test_importacao_interrompida(app, client):
+    job_id = "20240101_000000_0badc0de"
+    app.write_import_status(job_id, {"job_id": job_id, "status": "running", "pid": 2 ** 22 + 1})
+    status = client.get(f"/consultas/importar/{job_id}").get_json()
+    assert status["status"] == "failed" and "interrompida" in status["error"]
+
+
+def test_retencao_apaga_arquivos_antigos(app, client):
+    antigo = os.path.join(app.IMPORT_DIR, "importacao_20200101_000000_00000000.parquet")
+    gravar_arquivo(antigo)
+    os.utime(antigo, (0, 0))
+    importar(client, b"idade\n40\n")
+    assert not os.path.exists(antigo)
+
+
+# --- Troca do modelo sem reinício (/admin/modelo/recarregar)
+
+def test_recarga_grava_a_nova_versao_nas_consultas(app, client, tmp_path, monkeypatch):
+    import shutil
+
+    import joblib
+
+    from model_registry import version_of
+
+    pkl = str(tmp_path / "modelo.pkl")
+    shutil.copyfile(app.MODEL_PATH, pkl)
+    joblib.dump(joblib.load(pkl), pkl, compress=3)  # mesmo modelo, outros bytes
+    nova = version_of(pkl)
+    anterior = app.registry.version
+    monkeypatch.setattr(app.registry, "model_path", pkl)
+    monkeypatch.setattr(app.registry, "artifact_path", str(tmp_path / "modelo.gbm"))
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "segredo")
+    try:
+        assert client.post("/admin/modelo/recarregar?esperar=1").status_code == 403
+        r = client.post("/admin/modelo/recarregar?esperar=1", headers={"X-Admin-Token": "segredo"})
+        assert r.status_code == 200 and r.get_json()["atual"]["versao"] == nova != anterior
+
+        r = client.post("/predict", json={"idade": 50, "sexo": "F", "comorbidades": ["SAH"]})
+        assert r.status_code == 200 and r.get_json()["modelo_versao"] == nova
+        ultima = app.db.query_one("SELECT model_version FROM consultas ORDER BY id DESC LIMIT 1")[0]
+        assert ultima == nova
+
+        # Arquivo corrompido: 422, a versão nova continua em uso e o erro aparece no status
+        with open(pkl, "wb") as f:
+            f.write(b"corrompido")
+        r = client.post("/admin/modelo/recarregar?esperar=1", headers={"X-Admin-Token": "segredo"})
+        assert r.status_code == 422 and r.get_json()["atual"]["versao"] == nova
+        status = client.get("/admin/modelo", headers={"X-Admin-Token": "segredo"}).get_json()
+        assert status["ultimo_erro"] and status["atual"]["versao"] == nova
+    finally:
+        monkeypatch.undo()
+        app.registry.reload()
+    assert app.registry.version == anterior
+
+
+# --- POST /predict/batch
+
+PACIENTE = {"nome": "Lote", "idade": 61, "sexo": "M", "comorbidades": ["SAH", "obesity"], "altura": 1.8, "peso": 90}
+
+
+def contar_consultas(app):
+    return app.db.query_one("SELECT COUNT(*) FROM consultas")[0]
+
+
+def test_lote_com_itens_invalidos(app, client):
+    r = client.post("/predict/batch", json=[PACIENTE, "texto", {"idade": "abc"}, {**PACIENTE, "idade": 30}])
+    body = r.get_json()
+    assert r.status_code == 200 and body["total"] == 4 and body["erros"] == 2
+    assert [("error" in it, "probabilidade" in it) for it in body["resultados"]] == [
+        (False, True), (True, False), (True, False), (False, True)]
+    assert [it["indice"] for it in body["resultados"]] == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("gerar_pdf,salvar_db", [(False, False), (True, False), (False, True), (True, True)])
+def test_lote_gerar_pdf_e_salvar_db(app, client, gerar_pdf, salvar_db):
+    antes = contar_consultas(app)
+    r = client.post("/predict/batch", json={"pacientes": [PACIENTE, PACIENTE],
+                                            "gerar_pdf": gerar_pdf, "salvar_db": str(salvar_db).lower()})
+    assert r.status_code == 200
+    resultados = r.get_json()["resultados"]
+    assert contar_consultas(app) == antes + (2 if salvar_db else 0)
+    if not gerar_pdf:
+        assert all("pdf_url" not in it for it in resultados)
+        return
+    urls = [it["pdf_url"] for it in resultados]
+    nomes = [u.split("/consultas/", 1)[1] for u in urls]
+    if salvar_db:
+        linhas = app.db.query("SELECT id, pdf_path, pdf_status FROM consultas ORDER BY id DESC LIMIT 2")
+        assert sorted(nomes) == sorted(r["pdf_path"] for r in linhas)
+        assert all(r["pdf_status"] == "done" and r["pdf_path"] == app.pdf_store.relative_path(r["id"])
+                   for r in linhas)
+    else:
+        # Sem consulta gravada o PDF é avulso
+        assert all(n.startswith("avulsos/") and app.pdf_store.is_pdf_name(n) for n in nomes)
+    for url in urls:
+        pdf = client.get(url)
+        assert pdf.status_code == 200 and pdf.data.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("campo,valor", [("gerar_pdf", "talvez"), ("salvar_db", "false "), ("salvar_db", [1]),
+                                         ("gerar_pdf", 2)])
+def test_lote_opcao_invalida(app, client, campo, valor):
+    antes = contar_consultas(app)
+    r = client.post("/predict/batch", json={"pacientes": [PACIENTE], campo: valor})
+    if valor == "false ":
+        assert r.status_code == 200  # espaços em volta são aceitos
+        return
+    assert r.status_code == 400 and campo in r.get_json()["error"]
+    assert contar_consultas(app) == antes
+
+
+def test_lote_acima_do_limite(app, client, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_MAX_ITEMS", 2)
+    assert client.post("/predict/batch", json={"pacientes": [PACIENTE] * 3}).status_code == 413
+    assert client.post("/predict/batch", json={"pacientes": [PACIENTE] * 2}).status_code == 200
+    assert client.post("/predict/batch", json={"pacientes": "x"}).status_code == 400
+
+
+@pytest.mark.parametrize("valor,esperado", [
+    (True, True), (False, False), (None, False), (1, True), (0, False),
+    ("SIM", True), (" true ", True), ("não", False), ("", False),
+])
+def test_parse_flag(app, valor, esperado):
+    assert app.parse_flag(valor, "x") is esperado
+
+
+# --- Jobs de PDF (/predict, process_pdf_job, resume_pdf_jobs e /consultas/jobs/<id>)
+
+def status_do_job(client, job_id):
+    r = client.get(f"/consultas/jobs/{job_id}")
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def test_job_pendente_depois_concluido(app, client, monkeypatch):
+    enfileirados = []
+    monkeypatch.setattr(app.pdf_jobs, "submit", lambda i: enfileirados.append(i) or True)
+    body = client.post("/predict", json=PACIENTE).get_json()
+    job_id = body["job_id"]
+    assert body["pdf_status"] == "pending" and enfileirados == [job_id]
+    assert status_do_job(client, job_id) == {"job_id": job_id, "pdf_status": "pending"}
+
+    app.process_pdf_job(job_id)
+    status = status_do_job(client, job_id)
+    assert status["pdf_status"] == "done" and status["pdf_url"] == body["pdf_url"]
+    assert client.get(body["pdf_url"]).data.startswith(b"%PDF")
+
+
+def test_job_com_erro_fica_failed(app, client, monkeypatch):
+    monkeypatch.setattr(app.pdf_jobs, "submit", lambda i: True)
+    job_id = client.post("/predict", json=PACIENTE).get_json()["job_id"]
+
+    def falha(consulta, filename):
+        raise RuntimeError("render")
+
+    monkeypatch.setattr(app, "render_consulta_pdf", falha)
+    with pytest.raises(RuntimeError):
+        app.process_pdf_job(job_id)
+    assert status_do_job(client, job_id) == {"job_id": job_id, "pdf_status": "failed"}
+    assert not os.path.exists(app.pdfs.path(app.pdf_store.relative_path(job_id)))
+
+
+def test_fila_cheia_gera_no_request(app, client, monkeypatch):
+    monkeypatch.setattr(app.pdf_jobs, "submit", lambda i: False)
+    body = client.post("/predict", json=PACIENTE).get_json()
+    assert body["pdf_status"] == "done"
+    assert status_do_job(client, body["job_id"])["pdf_status"] == "done"
+    assert os.path.exists(app.pdfs.path(app.pdf_store.relative_path(body["job_id"])))
+
+    monkeypatch.setattr(app, "render_consulta_pdf", lambda consulta, filename: 1 / 0)
+    body = client.post("/predict", json=PACIENTE).get_json()
+    assert body["pdf_status"] == "failed"
+    assert status_do_job(client, body["job_id"])["pdf_status"] == "failed"
+
+
+def test_pendentes_sao_retomados(app, client):
+    pendentes = [gravar_consulta(app, pdf_status="pending") for _ in range(3)]
+    pronta = gravar_consulta(app, pdf_path="pronta.pdf", pdf_status="done")
+    t = app.resume_pdf_jobs()
+    t.join(10)
+    app.pdf_jobs.join()
+    for job_id in pendentes:
+        assert status_do_job(client, job_id)["pdf_status"] == "done"
+        assert os.path.exists(app.pdfs.path(app.pdf_store.relative_path(job_id)))
+    assert status_do_job(client, pronta)["pdf_status"] == "done"
+    assert not os.path.exists(app.pdfs.path("pronta.pdf"))
+    assert app.resume_pdf_jobs() is None
+
+
+def test_job_desconhecido(client):
+    assert client.get("/consultas/jobs/999999").status_code == 404
+
+
+def test_retomada_assume_so_pendentes_sem_dono_vivo(app, client):
+    app.db.write("UPDATE consultas SET pdf_status = 'failed' WHERE pdf_status = 'pending'")  # sobras de outros testes
+    sem_dono = gravar_consulta(app, pdf_status="pending")
+    morto, vivo = [gravar_consulta(app, pdf_status="pending") for _ in range(2)]
+    app.db.write("UPDATE consultas SET pdf_owner = ? WHERE id = ?", (2 ** 22 + 12345, morto))  # acima do pid_max
+    app.db.write("UPDATE consultas SET pdf_owner = ? WHERE id = ?", (os.getppid(), vivo))
+
+    # Dois workers subindo: o primeiro fica com os órfãos, o segundo com nada
+    worker = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        assert app.claim_pdf_jobs(owner=worker.pid) == [sem_dono, morto]
+        assert app.claim_pdf_jobs(owner=os.getpid()) == []
+        donos = dict(app.db.query("SELECT id, pdf_owner FROM consultas WHERE id IN (?, ?, ?)", (sem_dono, morto, vivo)))
+        assert donos == {sem_dono: worker.pid, morto: worker.pid, vivo: os.getppid()}
+    finally:
+        worker.kill()
+        worker.wait()
+    # O primeiro worker caiu: o próximo que sobe assume os PDFs dele
+    assert app.claim_pdf_jobs(owner=os.getpid()) == [sem_dono, morto]
+    # O mestre solta todos ao reiniciar
+    app.release_pdf_jobs()
+    assert app.claim_pdf_jobs(owner=os.getpid()) == [sem_dono, morto, vivo]
+    app.db.write("UPDATE consultas SET pdf_status = 'done' WHERE id IN (?, ?, ?)", (sem_dono, morto, vivo))
+
+
+def test_predict_grava_o_dono_do_pdf(app, client, monkeypatch):
+    monkeypatch.setattr(app.pdf_jobs, "submit", lambda i: True)
+    job_id = client.post("/predict", json=PACIENTE).get_json()["job_id"]
+    assert app.db.query_one("SELECT pdf_owner FROM consultas WHERE id = ?", (job_id,))[0] == os.getpid()
+    # Enfileirado por este processo, que está vivo: nenhum outro worker assume
+    assert job_id not in app.claim_pdf_jobs(owner=os.getppid())
+    app.process_pdf_job(job_id)
+
+
+# --- GET /metrics
+
+def valor_metrica(client, linha):
+    for l in client.get("/metrics").get_data(as_text=True).splitlines():
+        if l.startswith(linha + " "):
+            return float(l.split()[-1])
+    return 0.0
+
+
+def test_metricas_contam_erro_por_etapa(app, client, monkeypatch):
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.content_type.startswith("text/plain; version=0.0.4")
+    inferencia = 'datacare_predict_stage_errors_total{stage="inference"}'
+    total = 'datacare_predict_stage_errors_total{stage="total"}'
+    antes = valor_metrica(client, inferencia), valor_metrica(client, total)
+    contagem = 'datacare_predict_stage_seconds_count{stage="inference"}'
+    medidas = valor_metrica(client, contagem)
+
+    def falha():
+        raise RuntimeError("modelo indisponível")
+
+    monkeypatch.setattr(app, "current_model", falha)
+    assert client.post("/predict", json=PACIENTE).status_code == 500
+    assert (valor_metrica(client, inferencia), valor_metrica(client, total)) == (antes[0] + 1, antes[1] + 1)
+    # A duração da etapa que falhou também é registrada
+    assert valor_metrica(client, contagem) == medidas + 1
+    assert valor_metrica(client, 'datacare_predict_stage_errors_total{stage="db"}') == 0
+
+
+# --- Profiling (/admin/perfis e header X-Datacare-Profile)
+
+def test_perfis_fechados_sem_token(app, client, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    assert client.get("/admin/perfis").status_code == 404
+    assert client.get("/admin/perfis/agregado").status_code == 404
+    # Sem token configurado o header não liga o perfil
+    r = client.get("/cache/stats", headers={"X-Datacare-Profile": "1"})
+    assert "X-Datacare-Profile-Id" not in r.headers
+
+
+def test_perfil_pelo_header(app, client, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "segredo")
+    admin = {"X-Admin-Token": "segredo"}
+    assert client.get("/admin/perfis").status_code == 403
+    assert client.get("/admin/perfis", headers={"X-Admin-Token": "errado"}).status_code == 403
+    r = client.get("/cache/stats", headers={"X-Datacare-Profile": "1", "X-Admin-Token": "errado"})
+    assert "X-Datacare-Profile-Id" not in r.headers
+
+    r = client.post("/predict", json=PACIENTE, headers={"X-Datacare-Profile": "1", **admin})
+    perfil = r.headers["X-Datacare-Profile-Id"]
+    lista = client.get("/admin/perfis", headers=admin).get_json()
+    assert lista["perfis"][0]["id"] == int(perfil)
+    assert lista["perfis"][0]["endpoint"] == "predict" and lista["perfis"][0]["motivo"] == "header"
+
+    collapsed = client.get(f"/admin/perfis/{perfil}?formato=collapsed", headers=admin)
+    assert collapsed.status_code == 200 and "predict (app.py:" in collapsed.get_data(as_text=True)
+    assert client.get("/admin/perfis/agregado?endpoint=predict", headers=admin).status_code == 200
+    assert client.get(f"/admin/perfis/{perfil}?formato=svg", headers=admin).status_code == 400
+    assert client.get("/admin/perfis/999999", headers=admin).status_code == 404
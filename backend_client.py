@@ -0,0 +1,107 @@
+# Cliente HTTP do front (Streamlit) para o backend
+#
+# front.py guarda uma instância por processo com st.cache_resource: a
+# requests.Session mantém um pool de conexões keep-alive, então os reruns não
+# abrem uma conexão TCP nova a cada chamada. Falhas de conexão são repetidas
+# com backoff (o request nem chegou ao backend, então repetir o POST de
+# /predict é seguro); GETs também são repetidos em 502/503/504, respeitando o
+# Retry-After. Uma thread consulta GET /ready em segundo plano e a página só
+# lê o último resultado, sem esperar por um backend lento.
+#
+# A Session é compartilhada entre as sessões do Streamlit (threads): o pool do
+# urllib3 é thread-safe e o backend não usa cookies.
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (conexão, leitura) em segundos
+DEFAULT_TIMEOUT = (3.05, 30)
+RETRIES = 3
+BACKOFF_FACTOR = 0.3
+POOL_SIZE = 10
+HEALTH_INTERVAL = 10
+HEALTH_TIMEOUT = 2
+
+
+class BackendClient:
+    def __init__(self, base_url: str, timeout=DEFAULT_TIMEOUT, retries: int = RETRIES,
+                 pool_size: int = POOL_SIZE, health_interval: float = HEALTH_INTERVAL):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.health_interval = health_interval
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=BACKOFF_FACTOR, status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}), raise_on_status=False,
+        )
+        self.session = self._session(retry, pool_size)
+        # A verificação de saúde não repete: o próximo ciclo já é a nova tentativa
+        self._probe_session = self._session(0, 1)
+        self._health = {"ok": None, "status": None, "latencia_ms": None, "erro": None, "verificado_em": None}
+        self._health_lock = threading.Lock()
+        self._probe_thread = None
+
+    @staticmethod
+    def _session(retry, pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def get(self, path: str, params=None, timeout=None) -> requests.Response:
+        return self.session.get(self.url(path), params=params, timeout=timeout or self.timeout)
+
+    def post(self, path: str, json=None, timeout=None, **kwargs) -> requests.Response:
+        return self.session.post(self.url(path), json=json, timeout=timeout or self.timeout, **kwargs)
+
+    # --- Saúde do backend
+
+    def probe(self, timeout: float = HEALTH_TIMEOUT) -> dict:
+        """Consulta GET /ready agora e atualiza o último resultado"""
+        inicio = time.perf_counter()
+        resultado = {"ok": False, "status": None, "erro": None}
+        try:
+            r = self._probe_session.get(self.url("/ready"), timeout=timeout)
+            resultado["status"] = r.status_code
+            resultado["ok"] = r.status_code == 200
+            if not resultado["ok"]:
+                try:
+                    resultado["erro"] = r.json().get("error")
+                except ValueError:
+                    resultado["erro"] = r.text[:200]
+        except requests.Timeout:
+            resultado["erro"] = f"sem resposta em {timeout}s"
+        except requests.ConnectionError:
+            resultado["erro"] = "sem conexão"
+        except requests.RequestException as e:
+            resultado["erro"] = str(e)
+        resultado["latencia_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        resultado["verificado_em"] = datetime.now().isoformat(timespec="seconds")
+        with self._health_lock:
+            self._health = resultado
+        return dict(resultado)
+
+    def health(self) -> dict:
+        """Último resultado da verificação em segundo plano (não bloqueia)"""
+        with self._health_lock:
+            return dict(self._health)
+
+    def start_health_probe(self):
+        if self._probe_thread is not None:
+            return
+
+        def run():
+            while True:
+                self.probe()
+                time.sleep(self.health_interval)
+
+        self._probe_thread = threading.Thread(target=run, name="backend-health", daemon=True)
+        self._probe_thread.start()
@@ -0,0 +1,149 @@
+# Cliente do front (backend_client.py): repetições, POST sem repetição e /ready
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend_client import BackendClient
+
+
+class Servidor:
+    """Backend falso: responde uma lista de status por rota e conta os requests"""
+
+    def __init__(self):
+        self.respostas = {}
+        self.requests = []
+        self.portas = set()  # uma por conexão TCP do cliente
+        self.atraso = 0
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def responder(self):
+                servidor.requests.append((self.command, self.path))
+                servidor.portas.add(self.client_address[1])
+                if self.command == "POST":
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(servidor.atraso)
+                fila = servidor.respostas.get(self.path.split("?")[0], [200])
+                status = fila.pop(0) if len(fila) > 1 else fila[0]
+                corpo = json.dumps({"error": f"status {status}"} if status >= 400 else {"ok": True}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            do_GET = do_POST = responder
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def contar(self, metodo, path):
+        return sum(1 for m, p in self.requests if m == metodo and p.split("?")[0] == path)
+
+
+@pytest.fixture()
+def servidor():
+    s = Servidor()
+    yield s
+    s.httpd.shutdown()
+    s.httpd.server_close()
+
+
+def porta_fechada() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_configuracao_das_repeticoes():
+    client = BackendClient("http://backend:5000/", retries=4)
+    assert client.url("/predict") == "http://backend:5000/predict"
+    retry = client.session.get_adapter("http://backend").max_retries
+    assert (retry.total, retry.connect, retry.read, retry.status) == (4, 4, 4, 4)
+    assert set(retry.status_forcelist) == {502, 503, 504}
+    assert retry.allowed_methods == {"GET", "HEAD"} and not retry.raise_on_status
+    assert retry.respect_retry_after_header
+    assert client._probe_session.get_adapter("http://backend").max_retries.total == 0
+
+
+def test_get_repetido_em_503(servidor):
+    servidor.respostas["/consultas"] = [503, 502, 200]
+    r = BackendClient(servidor.url).get("/consultas", params={"limite": 5})
+    assert r.status_code == 200 and servidor.contar("GET", "/consultas") == 3
+
+
+def test_get_desiste_depois_das_repeticoes(servidor):
+    servidor.respostas["/consultas"] = [503]
+    r = BackendClient(servidor.url, retries=2).get("/consultas")
+    assert r.status_code == 503 and servidor.contar("GET", "/consultas") == 3
+
+
+def test_get_nao_repete_outros_erros(servidor):
+    servidor.respostas["/consultas"] = [500, 200]
+    assert BackendClient(servidor.url).get("/consultas").status_code == 500
+    assert servidor.contar("GET", "/consultas") == 1
+
+
+def test_post_predict_nao_e_repetido(servidor):
+    servidor.respostas["/predict"] = [503, 200]
+    r = BackendClient(servidor.url).post("/predict", json={"idade": 50})
+    assert r.status_code == 503 and servidor.contar("POST", "/predict") == 1
+
+
+def test_keep_alive_reaproveita_a_conexao(servidor):
+    client = BackendClient(servidor.url)
+    for _ in range(3):
+        client.get("/consultas")
+    assert len(servidor.requests) == 3 and len(servidor.portas) == 1
+
+
+def test_probe_pronto(servidor):
+    client = BackendClient(servidor.url)
+    assert client.health()["ok"] is None  # ainda não verificado
+    resultado = client.probe()
+    assert resultado["ok"] and resultado["status"] == 200 and resultado["erro"] is None
+    assert resultado["latencia_ms"] >= 0 and resultado["verificado_em"]
+    assert client.health() == resultado
+
+
+def test_probe_inicializando_nao_repete(servidor):
+    servidor.respostas["/ready"] = [503, 200]
+    resultado = BackendClient(servidor.url).probe()
+    assert not resultado["ok"] and resultado["status"] == 503 and resultado["erro"] == "status 503"
+    assert servidor.contar("GET", "/ready") == 1
+
+
+def test_probe_sem_conexao_e_lento(servidor):
+    assert BackendClient(porta_fechada()).probe()["erro"] == "sem conexão"
+    servidor.atraso = 0.5
+    resultado = BackendClient(servidor.url).probe(timeout=0.1)
+    assert not resultado["ok"] and resultado["erro"] == "sem resposta em 0.1s"
+
+
+def test_probe_em_segundo_plano(servidor):
+    client = BackendClient(servidor.url, health_interval=0.05)
+    client.start_health_probe()
+    thread = client._probe_thread
+    client.start_health_probe()  # uma thread por cliente
+    assert client._probe_thread is thread
+    fim = time.monotonic() + 5
+    while client.health()["ok"] is None and time.monotonic() < fim:
+        time.sleep(0.01)
+    assert client.health()["ok"]
+    servidor.respostas["/ready"] = [503]
+    fim = time.monotonic() + 5
+    while client.health()["ok"] and time.monotonic() < fim:
+        time.sleep(0.01)
+    assert client.health()["status"] == 503
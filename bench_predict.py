@@ -0,0 +1,208 @@
+# Benchmark de cada etapa do caminho de predição
+#
+# Uso: python bench_predict.py [-n 200] [--json atual.json] [--baseline base.json] [--tolerancia 0.2]
+#
+# Etapas (latência por chamada em p50/p95/p99 e itens por segundo):
+#   build_X             build_X_from_input de um payload de /predict
+#   predict_proba[N]    modelo em uso no backend para lotes de N linhas
+#   sklearn[N]          predict_proba do sklearn nos mesmos lotes (referência)
+#   generate_pdf        relatório de uma consulta gravado em memória
+#   db_insert           INSERT_CONSULTA_SQL pela thread escritora (group commit)
+#   predict_e2e         POST /predict pelo test client do Flask
+#
+# O backend roda com banco e PDFs num diretório temporário (DATACARE_DB_PATH e
+# DATACARE_PDF_DIR): nada é gravado no consultas.db do projeto. Com --baseline
+# o p50 e o p95 de cada etapa são comparados com um JSON salvo antes por --json
+# e o processo termina com código 1 se alguma etapa passou da tolerância.
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from bench_startup import ambiente
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+# p99 oscila demais entre rodadas para servir de critério de regressão
+METRICAS_COMPARADAS = ("p50_ms", "p95_ms")
+
+
+def payloads_sinteticos(n: int, seed: int = 0) -> list:
+    from schema import COMORBIDITY_NAMES
+
+    rng = random.Random(seed)
+    return [
+        {
+            "nome": f"Paciente {i}", "data": "2024-01-15",
+            "idade": round(rng.uniform(18, 90), 1), "sexo": rng.choice("MF"),
+            "altura": round(rng.uniform(1.5, 1.95), 2), "peso": round(rng.uniform(50, 120), 1),
+            "comorbidades": rng.sample(COMORBIDITY_NAMES, rng.randint(0, 6)),
+        }
+        for i in range(n)
+    ]
+
+
+def medir(fn, chamadas: int, itens: int = 1, aquecimento: int = 3) -> dict:
+    """Chama fn(i) e devolve os percentis de latência e a vazão"""
+    for i in range(aquecimento):
+        fn(i)
+    latencias = np.empty(chamadas)
+    inicio = time.perf_counter()
+    for i in range(chamadas):
+        t0 = time.perf_counter()
+        fn(i)
+        latencias[i] = time.perf_counter() - t0
+    total = time.perf_counter() - inicio
+    p50, p95, p99 = np.percentile(latencias, (50, 95, 99)) * 1000
+    return {
+        "chamadas": chamadas,
+        "itens_por_chamada": itens,
+        "media_ms": round(float(latencias.mean() * 1000), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "itens_por_s": round(chamadas * itens / total, 1),
+    }
+
+
+def chamadas_para(n: int, lote: int) -> int:
+    # Lotes grandes repetem menos: ~100 mil linhas por etapa, no mínimo 10 chamadas
+    return max(10, min(n, 100_000 // lote))
+
+
+def rodar(n: int, sklearn: bool, pdf_mode: str) -> dict:
+    # Banco, PDFs e artefato compilado do modelo no diretório temporário,
+    # como no bench_startup.py: nada é gravado na árvore do projeto
+    tmp = tempfile.mkdtemp(prefix="bench_predict_")
+    os.environ.update(ambiente(tmp))
+    os.environ["DATACARE_PDF_MODE"] = pdf_mode
+
+    import app
+    from db import INSERT_CONSULTA_SQL
+    from schema import build_X_batch
+
+    app.wait_ready()
+    mv = app.registry.current
+    payloads = payloads_sinteticos(max(n, max(BATCH_SIZES)))
+    X_total, _, _ = build_X_batch(payloads)
+    etapas = {}
+
+    def registrar(nome, resultado):
+        etapas[nome] = resultado
+        print(f"{nome:>22}: p50 {resultado['p50_ms']:9.3f} ms  p95 {resultado['p95_ms']:9.3f} ms  "
+              f"p99 {resultado['p99_ms']:9.3f} ms  {resultado['itens_por_s']:>12.1f} itens/s", file=sys.stderr)
+
+    registrar("build_X", medir(lambda i: app.build_X_from_input(payloads[i % len(payloads)]), n))
+
+    for lote in BATCH_SIZES:
+        X = X_total[:lote]
+        registrar(f"predict_proba[{lote}]", medir(lambda i: mv.predict_proba(X), chamadas_para(n, lote), lote))
+
+    if sklearn:
+        import joblib
+        import pandas as pd
+
+        from schema import FEATURE_NAMES
+
+        model = mv.model if mv.model is not None else joblib.load(app.MODEL_PATH)
+        for lote in BATCH_SIZES:
+            df = pd.DataFrame(X_total[:lote], columns=FEATURE_NAMES)
+            registrar(f"sklearn[{lote}]", medir(lambda i: model.predict_proba(df), chamadas_para(n, lote), lote))
+
+    from bench_reports import consultas_sinteticas
+    from reports import render_report
+
+    dados = list(consultas_sinteticas(n, 5))
+    registrar("generate_pdf", medir(lambda i: render_report(*dados[i % len(dados)], io.BytesIO()), n))
+
+    linha = lambda i: (f"Paciente {i}", "2024-01-15", 50.0, 1, 1.7, 80.0, 27.7, "[]", 0.5,
+                       None, None, datetime.now().isoformat(), mv.version)
+    registrar("db_insert", medir(lambda i: app.db.write(INSERT_CONSULTA_SQL, linha(i)), n))
+
+    client = app.app.test_client()
+
+    def predict(i):
+        r = client.post("/predict", json=payloads[i % len(payloads)])
+        assert r.status_code == 200, r.get_data(as_text=True)
+
+    registrar("predict_e2e", medir(predict, n))
+    # Os PDFs em segundo plano não entram na medida, mas terminam antes de sair
+    app.pdf_jobs.join()
+    app.db.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    import sklearn as sk
+
+    return {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sk.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "modelo_versao": mv.version,
+            "motor": mv.describe()["motor"],
+            "pdf_mode": pdf_mode,
+            "n": n,
+        },
+        "etapas": etapas,
+    }
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float) -> list:
+    """Imprime a diferença por etapa e devolve as etapas que regrediram"""
+    regressoes = []
+    print(f"\nComparação com a baseline de {baseline['meta'].get('data')} "
+          f"(tolerância {tolerancia:.0%}):", file=sys.stderr)
+    for nome, r in atual["etapas"].items():
+        b = baseline["etapas"].get(nome)
+        if b is None:
+            print(f"{nome:>22}: sem baseline", file=sys.stderr)
+            continue
+        deltas = {m: r[m] / b[m] - 1 for m in METRICAS_COMPARADAS if b[m] > 0}
+        pior = max(deltas.values(), default=0.0)
+        status = "REGRESSÃO" if pior > tolerancia else ("melhora" if pior < -tolerancia else "ok")
+        if status == "REGRESSÃO":
+            regressoes.append(nome)
+        detalhes = "  ".join(f"{m[:3]} {b[m]:.3f} → {r[m]:.3f} ms ({deltas[m]:+.0%})" for m in deltas)
+        print(f"{nome:>22}: {detalhes}  {status}", file=sys.stderr)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do caminho de predição")
+    parser.add_argument("-n", type=int, default=200, help="chamadas por etapa")
+    parser.add_argument("--json", help="grava os resultados neste arquivo (use como baseline depois)")
+    parser.add_argument("--baseline", help="JSON de uma rodada anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora aceita no p50/p95 (0.2 = 20%%)")
+    parser.add_argument("--sem-sklearn", action="store_true", help="não mede o predict_proba do sklearn")
+    parser.add_argument("--pdf-mode", choices=["eager", "lazy", "memory"], default="eager",
+                        help="DATACARE_PDF_MODE do /predict medido")
+    args = parser.parse_args()
+
+    resultado = rodar(max(1, args.n), not args.sem_sklearn, args.pdf_mode)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultado, f, indent=2)
+    else:
+        print(json.dumps(resultado, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print(f"\nRegressão em: {', '.join(regressoes)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Benchmark de geração de relatórios PDF (relatórios por segundo)
+#
+# Uso: python bench_reports.py [-n 500] [--comorbidades 5] [--json saida.json]
+#
+# "individual" gera um PDF por consulta (como /predict); "lote" gera todas as
+# consultas num único PDF multipágina (como POST /consultas/relatorio).
+# "legado" é o generate_pdf anterior ao template (página inteira redesenhada,
+# streams em ASCII85), a referência de "antes".
+import argparse
+import io
+import json
+import time
+from datetime import datetime
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+import reports
+from schema import COMORBIDITY_NAMES, EN_TO_PT
+
+
+def consultas_sinteticas(n, n_comorb):
+    nomes = [EN_TO_PT[name] for name in COMORBIDITY_NAMES]
+    for i in range(n):
+        info = {
+            'nome': f"Paciente {i}", 'data_consulta': "2024-01-15",
+            'patient_age': float(20 + i % 70), 'patient_sex': 1 + i % 2,
+            'altura': 1.70, 'peso': 80.0, 'imc': 27.7,
+        }
+        yield info, nomes[i % 7:i % 7 + n_comorb], (i % 100) + 0.5
+
+
+def generate_pdf_original(consulta_info: dict, selected_names_pt: list, prob: float, filename):
+    """generate_pdf anterior ao template, mantido como referência"""
+    c = canvas.Canvas(filename, pagesize=A4)
+    width, height = A4
+    margin = 40
+    y = height - margin
+    
+    # Título
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(margin, y, "Relatório de Consulta - Avaliação de Risco de Diabetes")
+    y -= 30
+    
+    # Informações do paciente
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(margin, y, "Dados do Paciente:")
+    y -= 20
+    
+    c.setFont("Helvetica", 10)
+    c.drawString(margin, y, f"Nome: {consulta_info.get('nome', '-')}")
+    c.drawString(width/2, y, f"Data da Consulta: {consulta_info.get('data_consulta', '-')}")
+    y -= 15
+    
+    c.drawString(margin, y, f"Idade: {consulta_info.get('patient_age', '-')} anos")
+    c.drawString(width/2, y, f"Sexo: {'Masculino' if consulta_info.get('patient_sex', 1) == 1 else 'Feminino'}")
+    y -= 15
+    
+    # Converter altura para cm para exibição
+    altura_m = consulta_info.get('altura', 0)
+    altura_cm = altura_m * 100 if altura_m else 0
+    c.drawString(margin, y, f"Altura: {altura_cm:.0f} cm ({altura_m:.2f} m)")
+    c.drawString(width/2, y, f"Peso: {consulta_info.get('peso', '-')} kg")
+    y -= 15
+    
+    c.drawString(margin, y, f"IMC: {consulta_info.get('imc', '-')}")
+    y -= 25
+    
+    # Resultado da predição
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(margin, y, "Resultado da Avaliação:")
+    y -= 20
+    
+    c.setFont("Helvetica", 12)
+    c.drawString(margin, y, f"Probabilidade de Diabetes Tipo 2: {prob:.2f}%")
+    y -= 25
+    
+    # Comorbidades
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(margin, y, "Comorbidades Identificadas:")
+    y -= 20
+    
+    c.setFont("Helvetica", 10)
+    if selected_names_pt:
+        for name in selected_names_pt:
+            if y < margin + 50:  # Verifica se precisa de nova página
+                c.showPage()
+                y = height - margin
+                c.setFont("Helvetica-Bold", 12)
+                c.drawString(margin, y, "Comorbidades Identificadas (continuação):")
+                y -= 20
+                c.setFont("Helvetica", 10)
+            
+            # Usa o nome em português do mapeamento
+            nome_pt = EN_TO_PT.get(name, name)
+            c.drawString(margin + 10, y, f"• {nome_pt}")
+            y -= 14
+    else:
+        c.drawString(margin + 10, y, "Nenhuma comorbidade identificada")
+        y -= 14
+    
+    # Rodapé
+    y = margin + 30
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(margin, y, f"Documento gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}")
+    
+    c.save()
+
+
+def render_legado(*args):
+    # O ASCII85 era o padrão do ReportLab antes de reports.py desligá-lo
+    anterior = rl_config.useA85
+    rl_config.useA85 = 1
+    try:
+        generate_pdf_original(*args)
+    finally:
+        rl_config.useA85 = anterior
+
+
+def medir(nome, fn, n):
+    inicio = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - inicio
+    r = {"modo": nome, "relatorios": n, "segundos": round(dt, 4), "relatorios_por_s": round(n / dt, 1)}
+    print(f"{nome:>12}: {r['relatorios_por_s']:>9.1f} relatórios/s ({dt:.3f}s para {n})")
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=500, help="número de relatórios")
+    parser.add_argument("--comorbidades", type=int, default=5, help="comorbidades por paciente")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    dados = list(consultas_sinteticas(args.n, args.comorbidades))
+    resultados = [
+        medir("legado", lambda: [render_legado(*d, io.BytesIO()) for d in dados], args.n),
+        medir("individual", lambda: [reports.render_report(*d, io.BytesIO()) for d in dados], args.n),
+        medir("lote", lambda: reports.render_batch(dados, io.BytesIO()), args.n),
+    ]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Benchmark de inicialização do backend (import até a primeira predição)
+#
+# Uso: python bench_startup.py [-n 5] [--json saida.json]
+#
+# Cada rodada é um processo Python novo, então os tempos incluem a subida do
+# interpretador e os imports sem cache de módulos em memória:
+#   import_s          import do app.py (o que bloqueia healthcheck e gunicorn)
+#   pronto_s          até a inicialização em segundo plano terminar
+#   primeira_pred_s   até a resposta da primeira chamada a /predict/batch
+#   processo_s        do início do processo filho até ele terminar
+#
+# Banco, PDFs e o artefato compilado do modelo ficam num diretório temporário
+# (DATACARE_DB_PATH, DATACARE_PDF_DIR, DATACARE_MODEL_ARTIFACT), compartilhado
+# pelas rodadas: nada é gravado no projeto. A primeira rodada gera o artefato;
+# as seguintes o reaproveitam, como num servidor já implantado.
+import argparse
+import json
+import os
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter()
+app.wait_ready()
+t_pronto = time.perf_counter()
+r = app.app.test_client().post("/predict/batch", json={"pacientes": [
+    {"idade": 52, "sexo": "F", "comorbidades": ["obesity", "SAH"]}
+]})
+t_pred = time.perf_counter()
+assert r.status_code == 200, r.get_data(as_text=True)
+print(json.dumps({
+    "import_s": t_import - t0,
+    "pronto_s": t_pronto - t0,
+    "primeira_pred_s": t_pred - t0,
+}))
+"""
+
+METRICAS = ("import_s", "pronto_s", "primeira_pred_s", "processo_s")
+
+
+def ambiente(tmp: str) -> dict:
+    env = dict(os.environ)
+    env["DATACARE_DB_PATH"] = os.path.join(tmp, "consultas.db")
+    env["DATACARE_PDF_DIR"] = os.path.join(tmp, "consultas")
+    env["DATACARE_MODEL_ARTIFACT"] = os.path.join(tmp, "modelo.gbm")
+    env["DATACARE_IMPORT_DIR"] = os.path.join(tmp, "importacoes")
+    env.setdefault("DATACARE_MODEL_WATCH_S", "0")
+    return env
+
+
+def rodada(env: dict) -> dict:
+    inicio = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    r = json.loads(out.strip().splitlines()[-1])
+    r["processo_s"] = time.perf_counter() - inicio
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=5, help="número de rodadas")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        env = ambiente(tmp)
+        rodadas = [rodada(env) for _ in range(args.n)]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    resultado = {}
+    for m in METRICAS:
+        valores = [r[m] for r in rodadas]
+        resultado[m] = {
+            "mediana": round(statistics.median(valores), 4),
+            "min": round(min(valores), 4),
+            "max": round(max(valores), 4),
+        }
+        print(f"{m:>16}: mediana {resultado[m]['mediana']:.3f}s "
+              f"(min {resultado[m]['min']:.3f}s, max {resultado[m]['max']:.3f}s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rodadas": args.n, **resultado}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# Importação e pontuação em massa de arquivos CSV/Parquet
+#
+# O arquivo é lido em record batches de tamanho fixo (pyarrow). As colunas são
+# mapeadas para FEATURE_NAMES uma vez por arquivo, cada lote vira uma matriz
+# NumPy pontuada numa única chamada ao modelo e o resultado é gravado lote a
+# lote num Parquet de saída (e, opcionalmente, em consultas). A memória usada
+# depende do tamanho do lote, não do tamanho do arquivo.
+#
+# Uso: python bulk_import.py pacientes.csv saida.parquet [--batch-size 50000] [--salvar-db]
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from schema import COMORBIDITY_NAMES, COMORBIDITY_OFFSET, FEATURE_INDEX, FEMALE_VALUES, N_FEATURES
+
+DEFAULT_BATCH_SIZE = 50_000
+
+# Colunas reconhecidas: as mesmas chaves do payload de /predict ou os nomes de
+# FEATURE_NAMES (uma coluna 0/1 por comorbidade)
+AGE_COLUMNS = ("patient_age", "idade")
+SEX_COLUMNS = ("patient_sex", "sexo")
+DATE_COLUMNS = ("data_consulta", "data")
+LIST_COLUMN = "comorbidades"
+
+# Mesma regra de schema.parse_sex, aplicada à coluna inteira
+FEMALE_SET = pa.array(FEMALE_VALUES)
+COMORBIDITY_VALUES = pa.array(COMORBIDITY_NAMES)
+
+# Tipos fixos no CSV: sem isso o pyarrow infere pelo primeiro bloco e falha
+# quando um bloco seguinte traz um valor de outro tipo
+CSV_COLUMN_TYPES = {
+    **{name: pa.float64() for name in COMORBIDITY_NAMES},
+    "patient_age": pa.float64(), "idade": pa.float64(),
+    "altura": pa.float64(), "peso": pa.float64(),
+    "patient_sex": pa.string(), "sexo": pa.string(),
+    "nome": pa.string(), "data": pa.string(), "data_consulta": pa.string(),
+    LIST_COLUMN: pa.string(),
+}
+
+OUTPUT_SCHEMA = pa.schema([
+    ("linha", pa.int64()),
+    ("nome", pa.string()),
+    ("data_consulta", pa.string()),
+    ("patient_age", pa.float64()),
+    ("patient_sex", pa.int8()),
+    ("n_comorbidades", pa.int16()),
+    ("probabilidade", pa.float64()),
+    ("modelo_versao", pa.string()),
+])
+
+
+class BulkImportError(ValueError):
+    """Arquivo de importação inválido (vira HTTP 400)"""
+
+
+def _first(names, candidates):
+    return next((c for c in candidates if c in names), None)
+
+
+class ColumnMapping:
+    """Colunas do arquivo usadas para cada feature; resolvido uma vez por arquivo"""
+
+    def __init__(self, schema: pa.Schema):
+        names = set(schema.names)
+        self.age = _first(names, AGE_COLUMNS)
+        if self.age is None:
+            raise BulkImportError(f"coluna de idade ausente (uma de: {', '.join(AGE_COLUMNS)})")
+        self.sex = _first(names, SEX_COLUMNS)
+        self.date = _first(names, DATE_COLUMNS)
+        self.nome = "nome" if "nome" in names else None
+        self.altura = "altura" if "altura" in names else None
+        self.peso = "peso" if "peso" in names else None
+        self.wide = [(name, FEATURE_INDEX[name]) for name in COMORBIDITY_NAMES if name in names]
+        self.lista = LIST_COLUMN if LIST_COLUMN in names else None
+
+        usadas = {self.age, self.sex, self.date, self.nome, self.altura, self.peso, self.lista}
+        usadas.update(name for name, _ in self.wide)
+        self.ignoradas = sorted(names - usadas)
+
+    def describe(self) -> dict:
+        return {
+            "idade": self.age, "sexo": self.sex, "data": self.date, "nome": self.nome,
+            "comorbidades_lista": self.lista, "comorbidades_colunas": len(self.wide),
+            "ignoradas": self.ignoradas,
+        }
+
+
+def _numeric(column) -> np.ndarray:
+    return pc.fill_null(pc.cast(column, pa.float64()), 0.0).to_numpy()
+
+
+def _female(column) -> np.ndarray:
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        valores = pc.utf8_lower(pc.utf8_trim_whitespace(column))
+        fem = pc.is_in(valores, value_set=FEMALE_SET)
+    else:
+        fem = pc.equal(pc.cast(column, pa.float64()), 2.0)
+    return pc.fill_null(fem, False).to_numpy(zero_copy_only=False)
+
+
+def _comorbidity_lists(column):
+    """(linha, posição em COMORBIDITY_NAMES) de cada comorbidade conhecida da coluna"""
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+        listas = column
+    else:
+        # "obesity;SAH", "obesity,SAH" ou a lista JSON gravada pela API
+        texto = pc.replace_substring_regex(pc.fill_null(column, ""), r'[\[\]"]', "")
+        listas = pc.split_pattern_regex(texto, r"[;,|]")
+    listas = listas.combine_chunks() if isinstance(listas, pa.ChunkedArray) else listas
+    nomes = pc.utf8_trim_whitespace(pc.list_flatten(listas))
+    linhas = pc.list_parent_indices(listas).to_numpy()
+    pos = pc.index_in(nomes, value_set=COMORBIDITY_VALUES)
+    validos = pc.is_valid(pos).to_numpy(zero_copy_only=False)
+    return linhas[validos], pos.to_numpy(zero_copy_only=False)[validos].astype(np.intp)
+
+
+def build_X(table: pa.Table, mapping: ColumnMapping) -> np.ndarray:
+    """Matriz de features (n, N_FEATURES) de um lote, sem laço por linha"""
+    X = np.zeros((table.num_rows, N_FEATURES), dtype=np.float64)
+    X[:, 0] = _numeric(table.column(mapping.age))
+    X[:, 1] = 1.0
+    if mapping.sex is not None:
+        X[_female(table.column(mapping.sex)), 1] = 2.0
+    for name, idx in mapping.wide:
+        X[:, idx] = _numeric(table.column(name)) != 0
+    if mapping.lista is not None:
+        linhas, pos = _comorbidity_lists(table.column(mapping.lista))
+        X[linhas, COMORBIDITY_OFFSET + pos] = 1.0
+    return X
+
+
+def _rebatch(batches, batch_size: int):
+    """Reagrupa record batches em tabelas de exatamente batch_size linhas (a última pode ser menor)"""
+    pendentes, n = [], 0
+    for batch in batches:
+        while batch.num_rows:
+            take = min(batch_size - n, batch.num_rows)
+            pendentes.append(batch.slice(0, take))
+            n += take
+            batch = batch.slice(take)
+            if n == batch_size:
+                yield pa.Table.from_batches(pendentes)
+                pendentes, n = [], 0
+    if n:
+        yield pa.Table.from_batches(pendentes)
+
+
+def detect_format(path: str, formato: str = None) -> str:
+    formato = (formato or os.path.splitext(path)[1].lstrip(".")).lower()
+    if formato in ("parquet", "pq"):
+        return "parquet"
+    if formato in ("csv", "txt"):
+        return "csv"
+    raise BulkImportError("formato deve ser csv ou parquet")
+
+
+def _csv_batches(path: str):
+    # Com um caminho o leitor do pyarrow lê o arquivo inteiro adiantado para a
+    # memória; com um objeto de arquivo Python ele lê um bloco por vez
+    with open(path, "rb") as f:
+        yield from pv.open_csv(
+            f,
+            read_options=pv.ReadOptions(block_size=4 << 20),
+            convert_options=pv.ConvertOptions(column_types=CSV_COLUMN_TYPES),
+        )
+
+
+def iter_batches(path: str, batch_size: int = DEFAULT_BATCH_SIZE, formato: str = None):
+    """Tabelas pyarrow de batch_size linhas lidas sob demanda do arquivo"""
+    if detect_format(path, formato) == "parquet":
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    else:
+        batches = _csv_batches(path)
+    return _rebatch(batches, batch_size)
+
+
+def _strings(table, column, n):
+    return table.column(column).cast(pa.string()).to_pylist() if column else [None] * n
+
+
+def _db_rows(table, mapping, X, probs, model_version):
+    """Linhas de INSERT_CONSULTA_SQL para um lote (sem PDF)"""
+    n = table.num_rows
+    nomes = _strings(table, mapping.nome, n)
+    datas = _strings(table, mapping.date, n)
+    altura = _numeric(table.column(mapping.altura)) if mapping.altura else np.zeros(n)
+    peso = _numeric(table.column(mapping.peso)) if mapping.peso else np.zeros(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        imc = np.where(altura > 0, np.round(peso / (altura * altura), 1), np.nan)
+
+    linhas, cols = np.nonzero(X[:, COMORBIDITY_OFFSET:])
+    por_linha = np.split(cols, np.searchsorted(linhas, np.arange(1, n)))
+    agora = datetime.now().isoformat()
+    return [
+        (
+            nomes[i] or '', datas[i] or '', float(X[i, 0]), int(X[i, 1]),
+            float(altura[i]), float(peso[i]), None if np.isnan(imc[i]) else float(imc[i]),
+            json.dumps([COMORBIDITY_NAMES[j] for j in por_linha[i]], ensure_ascii=False),
+            float(probs[i]), None, None, agora, model_version,
+        )
+        for i in range(n)
+    ]
+
+
+def score_file(path: str, output_path: str, predict, batch_size: int = DEFAULT_BATCH_SIZE,
+               formato: str = None, db=None, insert_sql: str = None, model_version: str = None) -> dict:
+    """Pontua o arquivo lote a lote e grava o Parquet de saída
+
+    predict recebe X (n, N_FEATURES) e devolve a probabilidade (0-1) de cada
+    linha; model_version identifica o modelo na saída e no banco. Com db
+    (db.Database) e insert_sql as linhas também vão para consultas; no máximo
+    um lote fica pendente na thread escritora.
+    """
+    batch_size = max(1, int(batch_size))
+    inicio = time.perf_counter()
+    mapping, pendente = None, None
+    linhas = lotes = salvas = 0
+    writer = pq.ParquetWriter(output_path, OUTPUT_SCHEMA)
+    try:
+        for table in iter_batches(path, batch_size, formato):
+            if mapping is None:
+                mapping = ColumnMapping(table.schema)
+            n = table.num_rows
+            X = build_X(table, mapping)
+            probs = np.asarray(predict(X), dtype=np.float64)
+
+            writer.write_table(pa.table({
+                "linha": pa.array(np.arange(linhas, linhas + n, dtype=np.int64)),
+                "nome": pa.array(_strings(table, mapping.nome, n), pa.string()),
+                "data_consulta": pa.array(_strings(table, mapping.date, n), pa.string()),
+                "patient_age": pa.array(X[:, 0]),
+                "patient_sex": pa.array(X[:, 1].astype(np.int8)),
+                "n_comorbidades": pa.array(X[:, COMORBIDITY_OFFSET:].sum(axis=1).astype(np.int16)),
+                "probabilidade": pa.array(probs * 100),
+                "modelo_versao": pa.repeat(pa.scalar(model_version, pa.string()), n),
+            }, schema=OUTPUT_SCHEMA))
+
+            if db is not None:
+                # Espera o lote anterior antes de enfileirar o próximo (memória constante)
+                if pendente is not None:
+                    salvas += pendente.result()
+                pendente = db.executemany(insert_sql, _db_rows(table, mapping, X, probs, model_version))
+
+            linhas += n
+            lotes += 1
+        if pendente is not None:
+            salvas += pendente.result()
+        if mapping is None:
+            raise BulkImportError("arquivo sem linhas")
+    except BaseException:
+        writer.close()
+        os.remove(output_path)
+        raise
+    writer.close()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "linhas": linhas,
+        "lotes": lotes,
+        "salvas_db": salvas,
+        "segundos": round(segundos, 3),
+        "linhas_por_s": round(linhas / segundos, 1) if segundos > 0 else None,
+        "modelo_versao": model_version,
+        "colunas": mapping.describe(),
+    }
+
+
+def load_predictor(model_path: str):
+    """predict(X) do modelo em disco, com o mesmo motor compilado do backend
+
+    Usa o artefato mmap (.gbm ao lado do .pkl) quando ele corresponde ao .pkl:
+    os processos que o abrem compartilham as páginas pelo sistema operacional.
+    """
+    import joblib
+
+    from gb_engine import CompiledGradientBoosting, file_sha256
+    from schema import check_model_features
+
+    artifact = os.path.splitext(model_path)[0] + ".gbm"
+    if os.path.exists(artifact):
+        try:
+            if CompiledGradientBoosting.read_header(artifact).get("fonte_sha256") == file_sha256(model_path):
+                engine = CompiledGradientBoosting.load(artifact)
+                check_model_features(engine)
+                return lambda X: engine.predict_proba(X)[:, 1]
+        except (ValueError, KeyError):
+            pass
+
+    model = joblib.load(model_path)
+    check_model_features(model)
+    try:
+        engine = CompiledGradientBoosting.from_sklearn(model)
+        return lambda X: engine.predict_proba(X)[:, 1]
+    except (ValueError, AttributeError):
+        import pandas as pd
+
+        from schema import FEATURE_NAMES
+        return lambda X: model.predict_proba(pd.DataFrame(X, columns=FEATURE_NAMES))[:, 1]
+
+
+def main():
+    root = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Pontua um arquivo CSV/Parquet de pacientes")
+    parser.add_argument("entrada", help="arquivo .csv ou .parquet")
+    parser.add_argument("saida", help="Parquet de saída")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--formato", choices=["csv", "parquet"])
+    parser.add_argument("--modelo", default=os.path.join(root, "modelo_gradient_boosting.pkl"))
+    parser.add_argument("--salvar-db", action="store_true", help="insere as linhas em consultas")
+    parser.add_argument("--db", default=os.getenv("DATACARE_DB_PATH", os.path.join(root, "consultas.db")))
+    args = parser.parse_args()
+
+    db = None
+    insert_sql = None
+    if args.salvar_db:
+        from db import Database, INSERT_CONSULTA_SQL
+        from schema import FEATURE_NAMES, SCHEMA_VERSION
+
+        db = Database(args.db)
+        db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+        insert_sql = INSERT_CONSULTA_SQL
+
+    from model_registry import version_of
+
+    try:
+        resumo = score_file(args.entrada, args.saida, load_predictor(args.modelo),
+                            args.batch_size, args.formato, db, insert_sql, version_of(args.modelo))
+    finally:
+        if db is not None:
+            db.close()
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Mapeamento de colunas do bulk_import.py: mesma matriz X que o payload de /predict
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from bulk_import import BulkImportError, ColumnMapping, build_X, detect_format, score_file
+from db import INSERT_CONSULTA_SQL, Database
+from schema import FEATURE_INDEX, FEATURE_NAMES, SCHEMA_VERSION, build_X_batch
+
+SEXOS = ["F", " feminino ", "Female", "2", "2.0", "M", "masculino", "1", "x", None]
+
+
+def test_mapeamento_de_colunas():
+    mapping = ColumnMapping(pa.schema([
+        ("idade", pa.float64()), ("patient_age", pa.float64()), ("sexo", pa.string()),
+        ("data", pa.string()), ("SAH", pa.float64()), ("obesity", pa.float64()),
+        ("comorbidades", pa.string()), ("cidade", pa.string()),
+    ]))
+    assert mapping.age == "patient_age"  # nome do schema tem prioridade
+    assert mapping.sex == "sexo" and mapping.date == "data" and mapping.lista == "comorbidades"
+    assert mapping.wide == [("SAH", FEATURE_INDEX["SAH"]), ("obesity", FEATURE_INDEX["obesity"])]
+    assert mapping.ignoradas == ["cidade", "idade"]
+
+
+def test_sem_coluna_de_idade():
+    with pytest.raises(BulkImportError, match="idade"):
+        ColumnMapping(pa.schema([("sexo", pa.string())]))
+
+
+@pytest.mark.parametrize("arquivo,formato,esperado", [
+    ("a.csv", None, "csv"), ("a.TXT", None, "csv"), ("a.parquet", None, "parquet"),
+    ("a.pq", None, "parquet"), ("upload", "CSV", "csv"),
+])
+def test_formato(arquivo, formato, esperado):
+    assert detect_format(arquivo, formato) == esperado
+
+
+def test_formato_desconhecido():
+    with pytest.raises(BulkImportError):
+        detect_format("a.xlsx")
+
+
+def test_mesma_matriz_que_o_payload():
+    # Lista de comorbidades em texto, colunas 0/1 e sexo em todas as grafias
+    n = len(SEXOS)
+    listas = ['obesity;SAH', '["asthma", "SAH"]', 'obesity, inexistente', '', None,
+              'SAH|asthma', 'obesity', '[]', 'asthma', 'SAH']
+    wide = [1, 0, 0, 1, 0, 0, 1, 0, None, 0]
+    table = pa.table({
+        "idade": pa.array([float(20 + i) for i in range(n - 1)] + [None]),
+        "sexo": pa.array(SEXOS, pa.string()),
+        "comorbidades": pa.array(listas, pa.string()),
+        "tabagism": pa.array(wide, pa.float64()),
+    })
+    X = build_X(table, ColumnMapping(table.schema))
+
+    payloads = []
+    for i in range(n):
+        comorbidades = [c.strip(' "[]') for c in (listas[i] or "").replace("|", ";").replace(",", ";").split(";")]
+        if wide[i]:
+            comorbidades.append("tabagism")
+        payload = {"idade": table.column("idade")[i].as_py(), "comorbidades": comorbidades}
+        if SEXOS[i] is not None:
+            payload["sexo"] = SEXOS[i]
+        payloads.append(payload)
+    X_api, _, erros = build_X_batch(payloads)
+    assert not erros
+    np.testing.assert_array_equal(X, X_api)
+    assert list(X[:, 1]) == [2, 2, 2, 2, 2, 1, 1, 1, 1, 1]
+
+
+def test_sexo_numerico():
+    table = pa.table({"patient_age": [30.0, 40.0, 50.0], "patient_sex": pa.array([1, 2, None], pa.int64())})
+    assert list(build_X(table, ColumnMapping(table.schema))[:, 1]) == [1, 2, 1]
+
+
+def test_score_file_csv_em_lotes(tmp_path):
+    entrada = tmp_path / "pacientes.csv"
+    linhas = ["nome,idade,sexo,comorbidades,altura,peso"]
+    linhas += [f"p{i},{30 + i},{'F' if i % 2 else '2'},obesity;SAH,1.6,64" for i in range(7)]
+    entrada.write_text("\n".join(linhas) + "\n")
+    saida = tmp_path / "saida.parquet"
+
+    db = Database(str(tmp_path / "consultas.db"))
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    try:
+        resumo = score_file(str(entrada), str(saida), lambda X: X[:, 0] / 100, batch_size=3,
+                            db=db, insert_sql=INSERT_CONSULTA_SQL, model_version="v1")
+        rows = db.query("SELECT nome, patient_sex, imc, comorbidades_json, model_version FROM consultas ORDER BY id")
+    finally:
+        db.close()
+
+    assert resumo["linhas"] == 7 and resumo["lotes"] == 3 and resumo["salvas_db"] == 7
+    out = pq.read_table(saida).to_pydict()
+    assert out["linha"] == list(range(7))
+    assert out["patient_sex"] == [2] * 7
+    assert out["n_comorbidades"] == [2] * 7
+    assert out["probabilidade"] == pytest.approx([30.0 + i for i in range(7)])
+    assert [tuple(r) for r in rows][0] == ("p0", 2, 25.0, '["SAH", "obesity"]', "v1")
+
+
+def test_arquivo_sem_linhas(tmp_path):
+    entrada = tmp_path / "vazio.csv"
+    entrada.write_text("idade,sexo\n")
+    saida = tmp_path / "saida.parquet"
+    with pytest.raises(BulkImportError):
+        score_file(str(entrada), str(saida), lambda X: X[:, 0])
+    assert not saida.exists()
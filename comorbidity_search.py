@@ -0,0 +1,91 @@
+# Busca de comorbidades do front (rótulos PT e chaves EN de CATEGORIES)
+#
+# O índice é montado uma vez por processo e a busca não percorre os textos:
+# a consulta é normalizada (minúsculas, sem acentos) e cada termo é cruzado
+# com os prefixos das palavras indexadas. Termos com 3 letras ou mais também
+# casam por trigramas, o que cobre trechos no meio da palavra ("tensao" em
+# "hipertensão") e erros de digitação ("obesidde").
+import re
+import unicodedata
+from collections import defaultdict
+
+# Fração mínima dos trigramas do termo presentes na palavra (erros de digitação)
+MIN_SIMILARITY = 0.6
+# Pontuação por tipo de casamento; a similaridade dos trigramas fica abaixo de 1
+SCORE_PREFIX = 3.0
+SCORE_SUBSTRING = 2.0
+
+
+def normalize(text) -> str:
+    """Minúsculas, sem acentos e só letras/dígitos separados por espaço"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def trigrams(word: str, padded: bool = True) -> set:
+    # Palavras indexadas ganham bordas (" ab", "bc "); os termos da consulta não,
+    # para casarem também no meio da palavra
+    if padded:
+        word = f" {word} "
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class ComorbidityIndex:
+    """Índice de prefixos e trigramas sobre {categoria: {chave EN: rótulo PT}}"""
+
+    def __init__(self, categories: dict):
+        self.items = []  # (categoria, chave, rótulo)
+        self._word_items = defaultdict(set)
+        self._prefixes = defaultdict(set)
+        self._trigrams = defaultdict(set)
+        for categoria, comorbidades in categories.items():
+            for key, label in comorbidades.items():
+                item = len(self.items)
+                self.items.append((categoria, key, label))
+                for word in set(normalize(label).split() + normalize(key).split()):
+                    self._word_items[word].add(item)
+        for word in self._word_items:
+            for i in range(1, len(word) + 1):
+                self._prefixes[word[:i]].add(word)
+            for gram in trigrams(word):
+                self._trigrams[gram].add(word)
+
+    def _match_term(self, term: str) -> dict:
+        """{palavra: pontuação} das palavras que casam com um termo"""
+        scores = dict.fromkeys(self._prefixes.get(term, ()), SCORE_PREFIX)
+        grams = trigrams(term, padded=False)
+        if len(term) < 3 or not grams:
+            return scores
+        counts = defaultdict(int)
+        for gram in grams:
+            for word in self._trigrams.get(gram, ()):
+                counts[word] += 1
+        for word, n in counts.items():
+            if word in scores:
+                continue
+            if n == len(grams) and term in word:
+                scores[word] = SCORE_SUBSTRING
+            elif n / len(grams) >= MIN_SIMILARITY:
+                scores[word] = n / len(grams)
+        return scores
+
+    def search(self, query: str) -> list:
+        """Itens (categoria, chave, rótulo) que casam com todos os termos, do melhor para o pior"""
+        terms = normalize(query).split()
+        if not terms:
+            return list(self.items)
+        total = None
+        for term in terms:
+            por_item = defaultdict(float)
+            for word, score in self._match_term(term).items():
+                for item in self._word_items[word]:
+                    por_item[item] = max(por_item[item], score)
+            if total is None:
+                total = dict(por_item)
+            else:
+                total = {item: total[item] + s for item, s in por_item.items() if item in total}
+            if not total:
+                return []
+        ordem = sorted(total, key=lambda item: (-total[item], item))
+        return [self.items[item] for item in ordem]
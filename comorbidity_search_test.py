@@ -0,0 +1,70 @@
+# Busca de comorbidades do front (comorbidity_search.py): ordem, acentos e rótulo PT x chave EN
+import pytest
+
+from comorbidity_search import ComorbidityIndex, normalize
+from schema import CATEGORIES
+
+CATEGORIAS = {
+    "Cardiovasculares": {"SAH": "Hipertensão arterial sistêmica", "heart failure": "Insuficiência cardíaca"},
+    "Respiratórias": {"asthma": "Asma", "tension pneumothorax": "Pneumotórax hipertensivo"},
+    "Endócrinas": {"obesity": "Obesidade", "hipertireoidismo": "Hipertireoidismo"},
+    "Neurológicas": {"intracranial hypertension": "Hipertensão intracraniana"},
+}
+
+
+@pytest.fixture(scope="module")
+def indice():
+    return ComorbidityIndex(CATEGORIAS)
+
+
+def chaves(indice, consulta):
+    return [chave for _, chave, _ in indice.search(consulta)]
+
+
+def test_normalizacao():
+    assert normalize("  Insuficiência  CARDÍACA (IC) ") == "insuficiencia cardiaca ic"
+    assert normalize("Pneumotórax/hipertensivo") == "pneumotorax hipertensivo"
+
+
+def test_prefixo_antes_de_trigrama(indice):
+    # "tens" é prefixo de "tension" e só trecho de "hipertensão"/"hipertensivo"
+    resultado = chaves(indice, "tens")
+    assert resultado[0] == "tension pneumothorax"
+    assert set(resultado[1:]) == {"SAH", "intracranial hypertension"}
+    # Prefixo (3) > trecho no meio (2) > parecido por trigramas (< 1)
+    assert chaves(indice, "obes") == ["obesity"]
+    assert chaves(indice, "besidade") == ["obesity"]
+    assert chaves(indice, "obesidde") == ["obesity"]
+
+
+def test_empate_segue_a_ordem_das_categorias(indice):
+    assert chaves(indice, "hiper") == ["SAH", "tension pneumothorax", "hipertireoidismo", "intracranial hypertension"]
+
+
+def test_acentos_e_maiusculas(indice):
+    for consulta in ("hipertensão", "HIPERTENSAO", "Hipertensao", " hipertensão! "):
+        # "hipertensivo" só é parecido (trigramas): fica depois das palavras exatas
+        assert chaves(indice, consulta) == ["SAH", "intracranial hypertension", "tension pneumothorax"]
+    assert chaves(indice, "CARDIACA") == chaves(indice, "cardíaca") == ["heart failure"]
+
+
+def test_rotulo_pt_e_chave_en(indice):
+    assert chaves(indice, "obesidade") == chaves(indice, "obesity") == ["obesity"]
+    assert chaves(indice, "heart") == chaves(indice, "insuficiencia") == ["heart failure"]
+    assert chaves(indice, "sah") == ["SAH"]
+    # Termos misturados de PT e EN na mesma consulta
+    assert chaves(indice, "hipertensao intracranial") == ["intracranial hypertension"]
+
+
+def test_todos_os_termos_precisam_casar(indice):
+    assert chaves(indice, "hipertensao intra") == ["intracranial hypertension"]
+    assert chaves(indice, "asma cardiaca") == []
+    assert chaves(indice, "xyz") == []
+    assert indice.search("  ") == indice.items and len(indice.items) == 7
+
+
+def test_categorias_do_schema():
+    indice = ComorbidityIndex(CATEGORIES)
+    assert len(indice.items) == sum(len(c) for c in CATEGORIES.values())
+    assert indice.search("obesidde")[0][1] == "obesity"
+    assert {"SAH", "intracranial hypertension"} <= {chave for _, chave, _ in indice.search("hipertensão")}
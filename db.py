@@ -0,0 +1,342 @@
+# Camada de acesso ao SQLite (consultas.db)
+#
+# - Leituras usam uma conexão por thread, reaproveitada entre requests.
+# - O banco roda em modo WAL: leitores não bloqueiam o escritor.
+# - Todas as escritas passam por uma única thread escritora que agrupa as
+#   operações que chegam dentro de uma janela curta num só commit (group
+#   commit), trocando um fsync por escrita por um fsync por lote.
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import analytics
+import pdf_store
+
+logger = logging.getLogger(__name__)
+
+INSERT_CONSULTA_SQL = '''
+    INSERT INTO consultas (nome,data_consulta,patient_age,patient_sex,altura,peso,imc,
+    comorbidades_json,probabilidade,pdf_path,pdf_status,created_at,model_version)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+'''
+
+# Mesmo INSERT com o pid do processo que vai gerar o PDF pendente (pdf_owner)
+INSERT_CONSULTA_OWNER_SQL = '''
+    INSERT INTO consultas (nome,data_consulta,patient_age,patient_sex,altura,peso,imc,
+    comorbidades_json,probabilidade,pdf_path,pdf_status,created_at,model_version,pdf_owner)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+'''
+
+# Amostras de latência de escrita guardadas para os percentis de stats()
+LATENCY_SAMPLES = 2048
+
+
+class Database:
+    """Conexões por thread para leitura e thread escritora com group commit"""
+
+    def __init__(self, path: str, commit_window_ms: float = 2.0, max_batch: int = 256,
+                 busy_timeout_ms: int = 5000):
+        self.path = path
+        self.commit_window = commit_window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._stats_lock = threading.Lock()
+        self.writes = self.commits = self.errors = 0
+
+    # --- Conexões
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL só faz fsync no checkpoint: seguro contra queda do processo
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Conexão de leitura da thread atual (criada no primeiro uso)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def query(self, sql: str, params=()) -> list:
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    # --- Escritas
+
+    def _ensure_writer(self):
+        # Reinicia a thread escritora depois de um fork (ela não sobrevive ao fork)
+        if self._writer is not None and self._writer_pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer_pid == os.getpid() and self._writer.is_alive():
+                return
+            if self._writer_pid != os.getpid():
+                self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._run_writer, name="db-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def execute(self, sql: str, params=()) -> Future:
+        """Enfileira uma escrita; o Future resolve com o lastrowid após o commit"""
+        self._ensure_writer()
+        fut = Future()
+        self._queue.put((sql, params, False, fut, time.perf_counter()))
+        return fut
+
+    def executemany(self, sql: str, rows) -> Future:
+        """Enfileira várias linhas; o Future resolve com o rowcount após o commit"""
+        self._ensure_writer()
+        fut = Future()
+        self._queue.put((sql, list(rows), True, fut, time.perf_counter()))
+        return fut
+
+    def insert_many(self, sql: str, rows) -> Future:
+        """Como executemany, mas o Future resolve com o lastrowid de cada linha"""
+        self._ensure_writer()
+        fut = Future()
+        self._queue.put((sql, list(rows), "ids", fut, time.perf_counter()))
+        return fut
+
+    def write(self, sql: str, params=()):
+        """execute() e aguarda o commit"""
+        return self.execute(sql, params).result()
+
+    def _apply(self, conn, item):
+        sql, params, many, _, _ = item
+        if many == "ids":
+            return [conn.execute(sql, p).lastrowid for p in params]
+        cur = conn.executemany(sql, params) if many else conn.execute(sql, params)
+        return cur.rowcount if many else cur.lastrowid
+
+    def _run_writer(self):
+        conn = self._open()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                conn.close()
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.commit_window
+            stop = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    nxt = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._commit_batch(conn, batch)
+            if stop:
+                conn.close()
+                return
+
+    def _commit_batch(self, conn, batch):
+        try:
+            with conn:
+                results = [self._apply(conn, item) for item in batch]
+        except Exception:
+            # Isola a escrita com erro refazendo o lote item a item
+            results = None
+        done = time.perf_counter()
+        if results is not None:
+            self.commits += 1
+            for item, result in zip(batch, results):
+                self._finish(item, result, None, done)
+            return
+        for item in batch:
+            try:
+                with conn:
+                    result = self._apply(conn, item)
+                self.commits += 1
+                self._finish(item, result, None, time.perf_counter())
+            except Exception as e:
+                self.errors += 1
+                logger.exception("Erro na escrita no banco: %s", e)
+                self._finish(item, None, e, time.perf_counter())
+
+    def _finish(self, item, result, error, done):
+        fut, enqueued = item[3], item[4]
+        with self._stats_lock:
+            self.writes += 1
+            self._latencies.append(done - enqueued)
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def close(self):
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def stats(self) -> dict:
+        """Latência de escrita (enfileiramento até o commit) e tamanho dos lotes"""
+        with self._stats_lock:
+            lat = sorted(self._latencies)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3) if lat else 0.0
+
+        return {
+            "writes": self.writes,
+            "commits": self.commits,
+            "errors": self.errors,
+            "writes_per_commit": round(self.writes / self.commits, 2) if self.commits else 0.0,
+            "queue": self._queue.qsize(),
+            "commit_window_ms": self.commit_window * 1000,
+            "write_latency_ms": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": pct(1.0)},
+        }
+
+    # --- Schema
+
+    def init_db(self, schema_version: str, feature_names: list):
+        """Cria/migra as tabelas e confere a versão do schema de features"""
+        conn = self._open()
+        c = conn.cursor()
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS consultas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT,
+            data_consulta TEXT,
+            patient_age REAL,
+            patient_sex INTEGER,
+            altura REAL,
+            peso REAL,
+            imc REAL,
+            comorbidades_json TEXT,
+            probabilidade REAL,
+            pdf_path TEXT,
+            created_at TEXT
+        )
+        ''')
+        # Colunas adicionadas depois da criação da tabela
+        cols = {r[1] for r in c.execute("PRAGMA table_info(consultas)")}
+        if "pdf_status" not in cols:
+            c.execute("ALTER TABLE consultas ADD COLUMN pdf_status TEXT")
+            c.execute("UPDATE consultas SET pdf_status = 'done' WHERE pdf_path IS NOT NULL")
+        # Versão do modelo (model_registry.py) que calculou a probabilidade
+        if "model_version" not in cols:
+            c.execute("ALTER TABLE consultas ADD COLUMN model_version TEXT")
+        # pid do worker dono de um PDF pendente: na retomada cada worker só
+        # assume os pendentes sem dono ou de um processo que já morreu
+        if "pdf_owner" not in cols:
+            c.execute("ALTER TABLE consultas ADD COLUMN pdf_owner INTEGER")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_pdf_pendente ON consultas(pdf_owner) WHERE pdf_status = 'pending'")
+        # download_pdf localiza a consulta pelo nome do arquivo
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_pdf_path ON consultas(pdf_path)")
+        # pdf_path derivado do id no INSERT (pdf_store.py)
+        pdf_store.init_tables(c)
+        # Índices da busca em GET /consultas (o id/rowid entra em todos implicitamente)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_data ON consultas(data_consulta)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_probabilidade ON consultas(probabilidade)")
+        # Ordenações com NULL trocado por um padrão (mesmas expressões de search.ORDER_COLUMNS)
+        c.execute("DROP INDEX IF EXISTS idx_consultas_nome_nocase")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_nome_ord ON consultas(COALESCE(nome, '') COLLATE NOCASE)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_data_ord ON consultas(COALESCE(data_consulta, ''))")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_probabilidade_ord ON consultas(COALESCE(probabilidade, -1.0))")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consultas_sexo ON consultas(patient_sex)")
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_meta (
+            chave TEXT PRIMARY KEY,
+            valor TEXT
+        )
+        ''')
+        # Versão do schema de features com que as consultas foram gravadas
+        c.execute("SELECT valor FROM schema_meta WHERE chave = 'feature_schema'")
+        stored = c.fetchone()
+        if stored is not None and stored[0] != schema_version:
+            conn.close()
+            raise RuntimeError(
+                f"Banco gravado com schema de features {stored[0]}, aplicação usa {schema_version}"
+            )
+        if stored is None:
+            c.execute("INSERT INTO schema_meta (chave, valor) VALUES ('feature_schema', ?)", (schema_version,))
+        self._init_comorbidades(c, feature_names)
+        if analytics.init_tables(c):
+            # Migração: resumo das consultas já gravadas
+            analytics.rebuild(c)
+        conn.commit()
+        conn.close()
+
+    def _init_comorbidades(self, c, feature_names: list):
+        # Comorbidades normalizadas: uma linha por (feature, consulta), mantida por
+        # trigger a partir de comorbidades_json, para filtros e contagens indexados
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS features (
+            feature_idx INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL UNIQUE
+        )
+        ''')
+        c.execute("DELETE FROM features")
+        c.executemany("INSERT INTO features (feature_idx, nome) VALUES (?, ?)", list(enumerate(feature_names)))
+
+        novo = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'consulta_comorbidades'"
+        ).fetchone() is None
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS consulta_comorbidades (
+            feature_idx INTEGER NOT NULL,
+            consulta_id INTEGER NOT NULL,
+            PRIMARY KEY (feature_idx, consulta_id)
+        ) WITHOUT ROWID
+        ''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_consulta_comorbidades_consulta ON consulta_comorbidades(consulta_id)")
+        c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_consultas_comorbidades_insert AFTER INSERT ON consultas
+        BEGIN
+            INSERT OR IGNORE INTO consulta_comorbidades (feature_idx, consulta_id)
+            SELECT f.feature_idx, NEW.id
+            FROM json_each(CASE WHEN json_valid(NEW.comorbidades_json) THEN NEW.comorbidades_json ELSE '[]' END) j
+            JOIN features f ON f.nome = j.value;
+        END
+        ''')
+        # Correção das comorbidades de uma consulta já gravada: troca as linhas
+        c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_consultas_comorbidades_update AFTER UPDATE OF comorbidades_json ON consultas
+        BEGIN
+            DELETE FROM consulta_comorbidades WHERE consulta_id = OLD.id;
+            INSERT OR IGNORE INTO consulta_comorbidades (feature_idx, consulta_id)
+            SELECT f.feature_idx, NEW.id
+            FROM json_each(CASE WHEN json_valid(NEW.comorbidades_json) THEN NEW.comorbidades_json ELSE '[]' END) j
+            JOIN features f ON f.nome = j.value;
+        END
+        ''')
+        c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_consultas_comorbidades_delete AFTER DELETE ON consultas
+        BEGIN
+            DELETE FROM consulta_comorbidades WHERE consulta_id = OLD.id;
+        END
+        ''')
+        if novo:
+            # Migração: preenche a tabela com as consultas já gravadas
+            c.execute('''
+            INSERT OR IGNORE INTO consulta_comorbidades (feature_idx, consulta_id)
+            SELECT f.feature_idx, c.id
+            FROM consultas c,
+                 json_each(CASE WHEN json_valid(c.comorbidades_json) THEN c.comorbidades_json ELSE '[]' END) j
+            JOIN features f ON f.nome = j.value
+            ''')
+            logger.info("consulta_comorbidades preenchida com %d linhas", c.rowcount)
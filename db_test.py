@@ -0,0 +1,149 @@
+# db.py: group commit, isolamento de erros por escrita e consulta_comorbidades
+import sqlite3
+
+import pytest
+
+from db import INSERT_CONSULTA_SQL, Database
+from schema import FEATURE_NAMES, SCHEMA_VERSION
+
+
+@pytest.fixture()
+def db(tmp_path):
+    # Janela longa: as escritas enfileiradas em sequência caem no mesmo lote
+    db = Database(str(tmp_path / "teste.db"), commit_window_ms=200)
+    db.write("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT NOT NULL)")
+    db.commits = db.writes = 0
+    yield db
+    db.close()
+
+
+def valores(db):
+    return [tuple(r) for r in db.query("SELECT id, v FROM t ORDER BY id")]
+
+
+def test_escritas_da_janela_num_so_commit(db):
+    futuros = [db.execute("INSERT INTO t (id, v) VALUES (?, ?)", (i, f"v{i}")) for i in range(1, 21)]
+    assert [f.result(5) for f in futuros] == list(range(1, 21))  # lastrowid de cada uma
+    assert db.commits == 1 and db.writes == 20
+    assert len(valores(db)) == 20
+    assert db.stats()["writes_per_commit"] == 20
+
+
+def test_lote_respeita_max_batch(tmp_path):
+    db = Database(str(tmp_path / "teste.db"), commit_window_ms=200, max_batch=5)
+    try:
+        db.write("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT NOT NULL)")
+        db.commits = 0
+        futuros = [db.execute("INSERT INTO t (v) VALUES (?)", ("x",)) for _ in range(12)]
+        for f in futuros:
+            f.result(5)
+        assert db.commits == 3
+    finally:
+        db.close()
+
+
+def test_erro_so_falha_a_propria_escrita(db):
+    ok1 = db.execute("INSERT INTO t (id, v) VALUES (1, 'a')")
+    ruim = db.execute("INSERT INTO t (id, v) VALUES (2, NULL)")
+    ok2 = db.executemany("INSERT INTO t (id, v) VALUES (?, ?)", [(3, "c"), (4, "d")])
+    assert ok1.result(5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        ruim.result(5)
+    assert ok2.result(5) == 2
+    assert valores(db) == [(1, "a"), (3, "c"), (4, "d")]
+    assert db.errors == 1 and db.writes == 3
+
+
+def test_executemany_com_erro_nao_grava_pela_metade(db):
+    # Na nova tentativa item a item, o executemany inteiro volta atrás
+    antes = db.execute("INSERT INTO t (id, v) VALUES (1, 'a')")
+    ruim = db.executemany("INSERT INTO t (id, v) VALUES (?, ?)", [(2, "b"), (1, "duplicada"), (3, "c")])
+    depois = db.insert_many("INSERT INTO t (id, v) VALUES (?, ?)", [(10, "x"), (11, "y")])
+    antes.result(5)
+    with pytest.raises(sqlite3.IntegrityError):
+        ruim.result(5)
+    assert depois.result(5) == [10, 11]
+    assert valores(db) == [(1, "a"), (10, "x"), (11, "y")]
+
+
+def test_escritor_volta_depois_de_close(db):
+    db.write("INSERT INTO t (v) VALUES ('a')")
+    db.close()
+    assert db.write("INSERT INTO t (v) VALUES ('b')") == 2
+    assert [v for _, v in valores(db)] == ["a", "b"]
+
+
+# --- consulta_comorbidades (trigger no INSERT/UPDATE/DELETE e migração)
+
+def consulta(comorbidades_json, nome="p"):
+    return (nome, "2024-01-01", 50.0, 1, 1.7, 70.0, 24.2, comorbidades_json,
+            0.5, None, None, "2024-01-01T00:00:00", None)
+
+
+def comorbidades_por_consulta(db):
+    pares = {}
+    for consulta_id, nome in db.query(
+            "SELECT cc.consulta_id, f.nome FROM consulta_comorbidades cc "
+            "JOIN features f ON f.feature_idx = cc.feature_idx ORDER BY cc.consulta_id, f.feature_idx"):
+        pares.setdefault(consulta_id, []).append(nome)
+    return pares
+
+
+JSONS = ['["SAH", "obesity"]', '[]', 'não é json', '["obesity", "obesity", "inexistente"]', None, '["asthma"]']
+
+
+@pytest.fixture()
+def banco(tmp_path):
+    db = Database(str(tmp_path / "consultas.db"))
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    yield db
+    db.close()
+
+
+def test_trigger_preenche_no_insert(banco):
+    ids = banco.insert_many(INSERT_CONSULTA_SQL, [consulta(j) for j in JSONS]).result(5)
+    assert comorbidades_por_consulta(banco) == {
+        ids[0]: ["SAH", "obesity"], ids[3]: ["obesity"], ids[5]: ["asthma"],
+    }
+
+
+def test_trigger_limpa_no_delete(banco):
+    ids = banco.insert_many(INSERT_CONSULTA_SQL, [consulta(JSONS[0]), consulta(JSONS[5])]).result(5)
+    banco.write("DELETE FROM consultas WHERE id = ?", (ids[0],))
+    assert comorbidades_por_consulta(banco) == {ids[1]: ["asthma"]}
+
+
+def test_trigger_atualiza_no_update(banco):
+    ids = banco.insert_many(INSERT_CONSULTA_SQL, [consulta(JSONS[0]), consulta(JSONS[5])]).result(5)
+    banco.write("UPDATE consultas SET comorbidades_json = ? WHERE id = ?", ('["asthma", "obesity"]', ids[0]))
+    assert comorbidades_por_consulta(banco) == {ids[0]: ["asthma", "obesity"], ids[1]: ["asthma"]}
+    banco.write("UPDATE consultas SET comorbidades_json = 'não é json' WHERE id = ?", (ids[1],))
+    assert comorbidades_por_consulta(banco) == {ids[0]: ["asthma", "obesity"]}
+    # Outras colunas não mexem na tabela normalizada
+    banco.write("UPDATE consultas SET nome = 'outro', comorbidades_json = comorbidades_json WHERE id = ?", (ids[0],))
+    banco.write("UPDATE consultas SET probabilidade = 0.9")
+    assert comorbidades_por_consulta(banco) == {ids[0]: ["asthma", "obesity"]}
+
+
+def test_migracao_preenche_consultas_antigas(tmp_path):
+    # Banco de antes da tabela normalizada: só consultas, com o schema original
+    path = str(tmp_path / "antigo.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE consultas (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT,
+        data_consulta TEXT, patient_age REAL, patient_sex INTEGER, altura REAL, peso REAL, imc REAL,
+        comorbidades_json TEXT, probabilidade REAL, pdf_path TEXT, created_at TEXT)''')
+    conn.executemany("INSERT INTO consultas (nome, comorbidades_json) VALUES ('p', ?)", [(j,) for j in JSONS])
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    try:
+        db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+        migrado = comorbidades_por_consulta(db)
+        assert migrado == {1: ["SAH", "obesity"], 4: ["obesity"], 6: ["asthma"]}
+        # Reabrir não duplica nem refaz; consultas novas seguem pelo trigger
+        db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+        novo = db.write(INSERT_CONSULTA_SQL, consulta('["SAH"]'))
+        assert comorbidades_por_consulta(db) == {**migrado, novo: ["SAH"]}
+    finally:
+        db.close()
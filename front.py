@@ -5,6 +5,16 @@ import pandas as pd
 from datetime import datetime
 import sqlite3
 import os
+from schema import CATEGORIES, CATEGORY_LABELS, SCHEMA_VERSION
+from backend_client import BackendClient
+from comorbidity_search import ComorbidityIndex
+from history_pages import HistoryPages, HistoryError
+
+BACKEND_URL = os.getenv('BACKEND_URL', 'http://modelo-back:5000')
+# Endereço do backend visto pelo navegador (links dos PDFs)
+BACKEND_PUBLIC_URL = os.getenv('BACKEND_PUBLIC_URL', 'http://localhost:5000').rstrip('/')
+# Validade (s) das páginas do histórico em cache
+HISTORICO_TTL = float(os.getenv('HISTORICO_TTL', '60'))
 
 # Configuração da página
 st.set_page_config(
@@ -53,93 +63,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Categorias de comorbidades
-CATEGORIES = {
-    "Cardiovasculares": {
-        "SAH": "Hipertensão arterial sistêmica (HAS)",
-        "acute myocardium infarct": "Infarto agudo do miocárdio",
-        "cardiac insufficiency": "Insuficiência cardíaca",
-        "cardiopathy": "Cardiopatia",
-        "arrhythmia": "Arritmia",
-        "pulmonary embolism": "Embolia pulmonar",
-        "valvulopathy": "Valvulopatia",
-        "aneurysm": "Aneurisma",
-        "catheterism": "Cateterismo"
-    },
-    "Neurológicas": {
-        "AVC": "Acidente cerebrovascular (AVC)",
-        "brain tumor": "Tumor cerebral",
-        "migraine": "Enxaqueca",
-        "intracranial hypertension": "Hipertensão intracraniana",
-        "meningioma": "Meningioma",
-        "hydrocephalus": "Hidrocefalia",
-        "devic": "Síndrome de Devic",
-        "cerebral palsy": "Paralisia cerebral",
-        "esclerose_multipla": "Esclerose múltipla"
-    },
-    "Respiratórias / Pulmonares": {
-        "asthma": "Asma"
-    },
-    "Endócrinas / Metabólicas": {
-        "hipotireoidismo": "Hipotireoidismo",
-        "hipertireoidismo": "Hipertireoidismo",
-        "hypercholesterolemia": "Hipercolesterolemia",
-        "hypertriglyceridemia": "Hipertrigliceridemia",
-        "hipocolesterolemia": "Hipocolesterolemia",
-        "hypophysis adenoma": "Adenoma da hipófise",
-        "obesity": "Obesidade"
-    },
-    "Renais / Hepáticas": {
-        "chronic kidney disease": "Doença renal crônica",
-        "kidney transplant": "Transplante renal",
-        "dialysis": "Diálise",
-        "cirrhosis": "Cirrose",
-        "hepatic transplant": "Transplante hepático",
-        "hepatic_cancer": "Câncer hepático"
-    },
-    "Hematológicas / Imunológicas": {
-        "anemia": "Anemia",
-        "sickle cell anemia": "Anemia falciforme",
-        "leucemia": "Leucemia",
-        "lymphoma": "Linfoma",
-        "sjogren": "Síndrome de Sjögren",
-        "sarcoidosis": "Sarcoidose",
-        "dyslipidemia": "Dislipidemia"
-    },
-    "Autoimunes / Inflamatórias": {
-        "behcet": "Doença de Behçet",
-        "fibromyalgia": "Fibromialgia",
-        "psoriasis": "Psoríase",
-        "vasculitis": "Vasculite",
-        "artrite": "Artrite",
-        "arthrosis": "Artrose"
-    },
-    "Oncológicas": {
-        "breast cancer": "Câncer de mama",
-        "lung cancer": "Câncer de pulmão",
-        "intestinal cancer": "Câncer intestinal"
-    },
-    "Genéticas / Congênitas": {
-        "down syndrome": "Síndrome de Down",
-        "albinism": "Albinismo",
-        "mccune albright": "Síndrome de McCune-Albright",
-        "neurofibromatosis": "Neurofibromatose",
-        "policitemia vera": "Policitemia vera"
-    },
-    "Outras": {
-        "osteoporosis": "Osteoporose",
-        "prolactinoma": "Prolactinoma",
-        "prostatic hyperplasia": "Hiperplasia prostática",
-        "vitiligo": "Vitiligo",
-        "tabagism": "Tabagismo",
-        "human immunodeficiency virus": "Vírus da imunodeficiência humana (HIV)",
-        "hepatitis c": "Hepatite C",
-        "trombose_venosa_profunda": "Trombose venosa profunda",
-        "doenca_chagas": "Doença de Chagas",
-        "cloroquina": "Cloroquina"
-    }
-}
-
 # Função para converter cm para m
 def cm_para_metros(cm):
     return cm / 100
@@ -167,18 +90,25 @@ def classificar_imc(imc):
     else:
         return "Obesidade III"
 
-# Função para fazer predição - CORRIGIDA
+# Cliente do backend (backend_client.py): um por processo do Streamlit, com
+# pool de conexões keep-alive, retries com backoff e verificação de saúde em
+# segundo plano
+@st.cache_resource(show_spinner=False)
+def get_backend():
+    backend = BackendClient(BACKEND_URL)
+    backend.start_health_probe()
+    return backend
+
+# Páginas do histórico (history_pages.py): cache com TTL compartilhado entre as
+# sessões e busca da próxima página em segundo plano
+@st.cache_resource(show_spinner=False)
+def get_historico():
+    return HistoryPages(get_backend(), ttl=HISTORICO_TTL)
+
+# Função para fazer predição
 def fazer_predicao(payload):
     try:
-        # ⬇️ CORREÇÃO: Usa variável de ambiente do Docker Compose
-        BACKEND_URL = os.getenv('BACKEND_URL', 'http://modelo-back:5000')
-        
-        response = requests.post(
-            f"{BACKEND_URL}/predict",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=30
-        )
+        response = get_backend().post("/predict", json=payload)
         
         if response.status_code == 200:
             return response.json()
@@ -193,9 +123,64 @@ def fazer_predicao(payload):
             
     except requests.exceptions.ConnectionError:
         return {"error": f"Não foi possível conectar ao servidor em {BACKEND_URL}. Verifique se o Flask está rodando."}
+    except requests.exceptions.Timeout:
+        return {"error": f"O servidor em {BACKEND_URL} não respondeu a tempo."}
     except Exception as e:
         return {"error": f"Erro na conexão: {str(e)}"}
 
+# Verifica uma vez (cache de 5 min) se o backend usa o mesmo schema de features
+@st.cache_data(ttl=300, show_spinner=False)
+def verificar_schema_backend():
+    try:
+        response = get_backend().get("/", timeout=(3.05, 5))
+        return response.json().get("schema_version")
+    except Exception:
+        return None
+
+# Busca de comorbidades (comorbidity_search.py): o índice é montado uma vez por
+# processo e o resultado de cada termo buscado fica em cache
+@st.cache_resource(show_spinner=False)
+def indice_comorbidades():
+    return ComorbidityIndex(CATEGORIES)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def buscar_comorbidades(busca):
+    """{categoria: [(chave, rótulo), ...]} só com os itens que casam com a busca"""
+    resultado = {}
+    for categoria, key, value in indice_comorbidades().search(busca):
+        resultado.setdefault(categoria, []).append((key, value))
+    # Mantém a ordem das categorias de CATEGORIES
+    return {categoria: resultado[categoria] for categoria in CATEGORIES if categoria in resultado}
+
+def alternar_comorbidade(key, widget_key):
+    selecionadas = st.session_state.comorbidades_selecionadas
+    if st.session_state[widget_key] and key not in selecionadas:
+        selecionadas.append(key)
+    elif not st.session_state[widget_key] and key in selecionadas:
+        selecionadas.remove(key)
+
+# Fragmento: digitar na busca ou marcar uma comorbidade reexecuta só esta seção
+@st.fragment
+def secao_comorbidades():
+    busca = st.text_input("🔍 Pesquisar comorbidade...", placeholder="Digite para filtrar...", key="busca_comorb")
+    filtradas = buscar_comorbidades(busca)
+    selecionadas = st.session_state.comorbidades_selecionadas
+    
+    if busca and not filtradas:
+        st.info("Nenhuma comorbidade encontrada.")
+    
+    for categoria, items in filtradas.items():
+        with st.expander(f"{categoria} ({len(items)})", expanded=bool(busca)):
+            for i in range(0, len(items), 2):
+                cols = st.columns(2)
+                for col, (key, value) in zip(cols, items[i:i + 2]):
+                    unique_key = f"comorb_{categoria}_{key}"
+                    with col:
+                        st.checkbox(value, key=unique_key, value=key in selecionadas,
+                                    on_change=alternar_comorbidade, args=(key, unique_key))
+    
+    st.caption(f"{len(selecionadas)} comorbidade(s) selecionada(s)")
+
 # Função para formatar nome do arquivo
 def formatar_nome_arquivo(nome, data):
     # Remove caracteres especiais e espaços
@@ -280,6 +265,10 @@ def menu_page():
         st.session_state.current_page = "datacare"
         st.rerun()
     
+    if st.sidebar.button("📚 Histórico", use_container_width=True):
+        st.session_state.current_page = "historico"
+        st.rerun()
+    
     if st.sidebar.button("🚪 Sair", use_container_width=True):
         st.session_state.logged_in = False
         st.session_state.current_page = "login"
@@ -301,6 +290,14 @@ def datacare_page():
     </div>
     """, unsafe_allow_html=True)
     
+    saude = get_backend().health()
+    if saude["ok"] is False:
+        st.warning(f"⚠️ Backend indisponível ({saude['erro'] or saude['status']}); verificado às {saude['verificado_em'][11:]}.")
+    
+    schema_backend = verificar_schema_backend()
+    if schema_backend and schema_backend != SCHEMA_VERSION:
+        st.error(f"⚠️ Schema de features do backend ({schema_backend}) difere do front ({SCHEMA_VERSION}). Atualize os dois serviços.")
+    
     # Inicializar session state
     if 'comorbidades_selecionadas' not in st.session_state:
         st.session_state.comorbidades_selecionadas = []
@@ -376,33 +373,10 @@ def datacare_page():
     st.subheader("Comorbidades")
     st.markdown("<p style='color: #94a3b8;'>Ative as que se aplicam ao paciente.</p>", unsafe_allow_html=True)
     
-    # Busca
-    busca = st.text_input("🔍 Pesquisar comorbidade...", placeholder="Digite para filtrar...", key="busca_comorb")
-    
-    # Comorbidades por categoria
+    # Busca e comorbidades por categoria
+    secao_comorbidades()
     comorbidades_temp = st.session_state.comorbidades_selecionadas.copy()
     
-    for categoria, comorbidades in CATEGORIES.items():
-        comorbidades_filtradas = {
-            key: value for key, value in comorbidades.items() 
-            if not busca or busca.lower() in value.lower() or busca.lower() in key.lower()
-        }
-        
-        if comorbidades_filtradas:
-            with st.expander(f"{categoria} ({len(comorbidades_filtradas)})"):
-                items = list(comorbidades_filtradas.items())
-                for i in range(0, len(items), 2):
-                    cols = st.columns(2)
-                    for j in range(2):
-                        if i + j < len(items):
-                            key, value = items[i + j]
-                            unique_key = f"comorb_{categoria}_{key}"
-                            checked = st.checkbox(value, key=unique_key, value=key in comorbidades_temp)
-                            if checked and key not in comorbidades_temp:
-                                comorbidades_temp.append(key)
-                            elif not checked and key in comorbidades_temp:
-                                comorbidades_temp.remove(key)
-    
     # Comorbidade personalizada
     st.markdown("---")
     st.subheader("Comorbidade Personalizada")
@@ -473,11 +447,7 @@ def datacare_page():
                     st.write("**Comorbidades selecionadas:**")
                     comorb_html = ""
                     for comorb in st.session_state.comorbidades_selecionadas:
-                        label_pt = comorb
-                        for cat_comorbidades in CATEGORIES.values():
-                            if comorb in cat_comorbidades:
-                                label_pt = cat_comorbidades[comorb]
-                                break
+                        label_pt = CATEGORY_LABELS.get(comorb, comorb)
                         comorb_html += f'<span class="pill">{label_pt}</span> '
                     st.markdown(comorb_html, unsafe_allow_html=True)
                 
@@ -495,14 +465,13 @@ def datacare_page():
                         st.write("**Resposta do servidor:**")
                         st.write(resultado)
                         
-                        # Verificação de conexão
-                        BACKEND_URL = os.getenv('BACKEND_URL', 'http://modelo-back:5000')
+                        # Verificação de conexão (GET /ready com timeout curto)
                         st.write("**Verificação de conexão:**")
-                        try:
-                            test_response = requests.get("http://localhost:5000/", timeout=5)
-                            st.write(f"Status do servidor: {test_response.status_code}")
-                        except Exception as e:
-                            st.write(f"Servidor não alcançável: {e}")
+                        saude = get_backend().probe()
+                        if saude["status"] is not None:
+                            st.write(f"Status do servidor: {saude['status']} ({saude['latencia_ms']} ms)")
+                        else:
+                            st.write(f"Servidor não alcançável: {saude['erro']}")
                             
                 else:
                     probabilidade = resultado["probabilidade"]
@@ -521,13 +490,16 @@ def datacare_page():
                     """, unsafe_allow_html=True)
                     
                     if pdf_url:
-                        st.success(f"📄 PDF gerado: [Baixar PDF](http://localhost:5000{pdf_url})")
+                        st.success(f"📄 PDF gerado: [Baixar PDF]({BACKEND_PUBLIC_URL}{pdf_url})")
     
     with col2:
         if st.button("🧹 Limpar Tudo", use_container_width=True):
             for key in ['dados_paciente', 'comorbidades_selecionadas', 'nova_comorbidade']:
                 if key in st.session_state:
                     del st.session_state[key]
+            # Estado dos checkboxes da busca de comorbidades
+            for key in [k for k in st.session_state if str(k).startswith("comorb_")]:
+                del st.session_state[key]
             st.rerun()
     
     # Botão para voltar ao menu
@@ -535,6 +507,115 @@ def datacare_page():
         st.session_state.current_page = "menu"
         st.rerun()
 
+# Página do Histórico de Consultas
+def historico_page():
+    st.markdown("""
+    <div class='card'>
+        <h1>Histórico de Consultas</h1>
+        <p style='color: #94a3b8; margin-bottom: 30px;'>Consultas já registradas, carregadas página por página.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Filtros aplicados e pilha de cursores das páginas visitadas (None = primeira)
+    if 'historico_filtros' not in st.session_state:
+        st.session_state.historico_filtros = {"ordem": "id"}
+    if 'historico_cursores' not in st.session_state:
+        st.session_state.historico_cursores = [None]
+    
+    ordens = {"id": "Mais recentes", "data": "Data da consulta", "nome": "Nome", "probabilidade": "Probabilidade"}
+    with st.form("historico_filtros_form"):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            nome = st.text_input("Nome (início)", placeholder="Ex.: Maria")
+        with col2:
+            data_inicio = st.date_input("Data inicial", value=None, format="DD/MM/YYYY")
+        with col3:
+            data_fim = st.date_input("Data final", value=None, format="DD/MM/YYYY")
+        with col4:
+            sexo = st.selectbox("Sexo", ["Todos", "Masculino", "Feminino"])
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            ordem = st.selectbox("Ordenar por", list(ordens), format_func=ordens.get)
+        with col2:
+            limite = st.selectbox("Consultas por página", [25, 50, 100, 200], index=1)
+        with col3:
+            prob_min = st.number_input("Probabilidade mínima (%)", min_value=0.0, max_value=100.0, value=0.0)
+        
+        if st.form_submit_button("🔍 Buscar", use_container_width=True):
+            st.session_state.historico_filtros = {
+                "nome": nome.strip(),
+                "data_inicio": data_inicio.isoformat() if data_inicio else None,
+                "data_fim": data_fim.isoformat() if data_fim else None,
+                "sexo": {"Masculino": "M", "Feminino": "F"}.get(sexo),
+                "prob_min": prob_min or None,
+                "ordem": ordem,
+            }
+            st.session_state.historico_limite = limite
+            st.session_state.historico_cursores = [None]
+    
+    filtros = st.session_state.historico_filtros
+    limite = st.session_state.get('historico_limite', 50)
+    cursores = st.session_state.historico_cursores
+    historico = get_historico()
+    
+    try:
+        pagina = historico.page(filtros, cursores[-1], limite)
+    except HistoryError as e:
+        st.error(f"❌ Filtro inválido: {e}")
+        return
+    except requests.exceptions.RequestException:
+        st.error(f"❌ Não foi possível carregar o histórico de {BACKEND_URL}.")
+        return
+    
+    # A próxima página já começa a ser buscada enquanto esta é exibida
+    historico.prefetch(filtros, pagina["proximo"], limite)
+    
+    consultas = pagina["consultas"]
+    if not consultas:
+        st.info("Nenhuma consulta encontrada.")
+    else:
+        tabela = pd.DataFrame([{
+            "ID": c["id"],
+            "Paciente": c["nome"],
+            "Data": c["data_consulta"],
+            "Idade": c["idade"],
+            "Sexo": c["sexo"],
+            "IMC": c["imc"],
+            "Comorbidades": len(c["comorbidades"]),
+            "Probabilidade (%)": c["probabilidade"],
+            "PDF": f"{BACKEND_PUBLIC_URL}{c['pdf_url']}" if c["pdf_url"] else None,
+        } for c in consultas])
+        st.dataframe(
+            tabela,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Probabilidade (%)": st.column_config.NumberColumn(format="%.2f"),
+                "PDF": st.column_config.LinkColumn(display_text="📄 Abrir"),
+            },
+        )
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("⬅️ Anterior", use_container_width=True, disabled=len(cursores) == 1):
+            cursores.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Página {len(cursores)} · {len(consultas)} consulta(s)")
+    with col3:
+        if st.button("Próxima ➡️", use_container_width=True, disabled=not pagina["proximo"]):
+            cursores.append(pagina["proximo"])
+            st.rerun()
+    
+    if st.button("🔄 Atualizar", key="historico_atualizar"):
+        historico.clear()
+        st.rerun()
+    
+    # Botão para voltar ao menu
+    if st.button("↩️ Voltar ao Menu", key="historico_voltar_menu"):
+        st.session_state.current_page = "menu"
+        st.rerun()
+
 # Gerenciamento de estado da sessão
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -550,4 +631,6 @@ else:
     if st.session_state.current_page == "menu":
         menu_page()
     elif st.session_state.current_page == "datacare":
-        datacare_page()
\ No newline at end of file
+        datacare_page()
+    elif st.session_state.current_page == "historico":
+        historico_page()
\ No newline at end of file
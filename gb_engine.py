@@ -0,0 +1,244 @@
+# Motor de inferência compilado para o GradientBoostingClassifier
+#
+# As árvores ajustadas pelo sklearn são achatadas em arrays NumPy contíguos
+# (feature, threshold, filhos e valor da folha) e avaliadas diretamente, sem a
+# validação de entrada e o despacho por estimador do predict_proba do sklearn.
+#
+# save()/load() gravam esses arrays num artefato binário plano (cabeçalho JSON
+# + arrays alinhados) que é aberto com mmap somente leitura: carregar não
+# desserializa nada e os processos que abrem o mesmo arquivo compartilham as
+# páginas pelo cache do sistema operacional.
+#
+# Exportação: python gb_engine.py export [modelo.pkl] [modelo.gbm]
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+# Linhas avaliadas por vez em lotes grandes (limita a matriz de nós em memória)
+CHUNK_ROWS = 4096
+
+# Artefato: MAGIC, tamanho do cabeçalho (uint64 LE), cabeçalho JSON e os arrays,
+# cada um começando num múltiplo de ARTIFACT_ALIGN
+ARTIFACT_MAGIC = b"DCGBM001"
+ARTIFACT_ALIGN = 64
+ARTIFACT_ARRAYS = (
+    ("feature", "<i8"), ("threshold", "<f8"), ("left", "<i8"),
+    ("right", "<i8"), ("value", "<f8"), ("roots", "<i8"),
+)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _align(n: int) -> int:
+    return -n % ARTIFACT_ALIGN
+
+
+class CompiledGradientBoosting:
+    """Ensemble de árvores de regressão em arrays planos (classificação binária)"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, baseline,
+                 max_depth, n_features, feature_names=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.baseline = float(baseline)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.header = None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Achata um GradientBoostingClassifier binário já ajustado"""
+        if getattr(model, "n_classes_", None) != 2:
+            raise ValueError("Apenas GradientBoostingClassifier binário é suportado")
+
+        # Valor inicial (log-odds da classe positiva no treino)
+        if isinstance(model.init_, str) and model.init_ == "zero":
+            baseline = 0.0
+        elif hasattr(model.init_, "class_prior_"):
+            p = float(model.init_.class_prior_[1])
+            eps = np.finfo(np.float64).eps
+            p = min(max(p, eps), 1 - eps)
+            baseline = np.log(p / (1 - p))
+        else:
+            raise ValueError(f"Estimador inicial não suportado: {model.init_!r}")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in model.estimators_[:, 0]:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            idx = np.arange(n)
+
+            # Folhas apontam para si mesmas: a descida tem sempre max_depth passos
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, idx, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, tree.children_right) + offset)
+            values.append(np.where(is_leaf, tree.value[:, 0, 0] * model.learning_rate, 0.0))
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights), np.concatenate(values),
+            np.asarray(roots), baseline, max_depth, model.n_features_in_,
+            getattr(model, "feature_names_in_", None),
+        )
+
+    def save(self, path: str, **meta):
+        """Grava o artefato mmap; meta extra vai para o cabeçalho (ex.: fonte_sha256)"""
+        arrays, offset = {}, 0
+        for name, dtype in ARTIFACT_ARRAYS:
+            arr = np.ascontiguousarray(getattr(self, name), dtype=dtype)
+            arrays[name] = (arr, {"dtype": dtype, "shape": list(arr.shape), "offset": offset})
+            offset += arr.nbytes + _align(arr.nbytes)
+        header = {
+            "baseline": self.baseline,
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "feature_names": self.feature_names,
+            "arrays": {name: info for name, (_, info) in arrays.items()},
+            **meta,
+        }
+        raw = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        raw += b" " * _align(len(ARTIFACT_MAGIC) + 8 + len(raw))
+
+        # Arquivo temporário + os.replace: quem está lendo nunca vê um artefato pela metade
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(ARTIFACT_MAGIC + struct.pack("<Q", len(raw)) + raw)
+            for arr, _ in arrays.values():
+                f.write(arr.tobytes())
+                f.write(b"\0" * _align(arr.nbytes))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def read_header(path: str) -> dict:
+        """Só o cabeçalho do artefato (sem mapear os arrays)"""
+        with open(path, "rb") as f:
+            if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+                raise ValueError(f"{path} não é um artefato de modelo")
+            (size,) = struct.unpack("<Q", f.read(8))
+            return json.loads(f.read(size))
+
+    @classmethod
+    def load(cls, path: str):
+        """Abre o artefato com mmap somente leitura; os arrays apontam para o mapeamento"""
+        header = cls.read_header(path)
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = len(ARTIFACT_MAGIC) + 8 + struct.unpack_from("<Q", buf, len(ARTIFACT_MAGIC))[0]
+        arrays = {}
+        for name, dtype in ARTIFACT_ARRAYS:
+            info = header["arrays"][name]
+            count = int(np.prod(info["shape"]))
+            arrays[name] = np.frombuffer(buf, dtype=info["dtype"], count=count,
+                                         offset=start + info["offset"]).reshape(info["shape"])
+        engine = cls(
+            arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+            arrays["value"], arrays["roots"], header["baseline"], header["max_depth"],
+            header["n_features"], header.get("feature_names"),
+        )
+        engine.header = header
+        return engine
+
+    # Mesmos atributos do sklearn, para schema.check_model_features
+    @property
+    def feature_names_in_(self):
+        return self.feature_names
+
+    @property
+    def n_features_in_(self):
+        return self.n_features
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _leaves(self, X):
+        # O sklearn compara as features em float32; mantém o mesmo arredondamento
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def decision_function(self, X):
+        """Log-odds da classe positiva para cada linha de X"""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Esperadas {self.n_features} features, recebidas {X.shape[1]}")
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            out[start:start + len(chunk)] = self.value[self._leaves(chunk)].sum(axis=1)
+        return out + self.baseline
+
+    def predict_proba(self, X):
+        """Mesma saída de GradientBoostingClassifier.predict_proba: shape (n, 2)"""
+        p1 = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict_proba_one(self, row):
+        """Probabilidade da classe positiva para uma única linha"""
+        return float(self.predict_proba(row)[0, 1])
+
+
+def check_parity(model, X, atol=1e-9):
+    """Maior diferença absoluta entre o motor compilado e o sklearn em X"""
+    engine = CompiledGradientBoosting.from_sklearn(model)
+    diff = np.abs(engine.predict_proba(np.asarray(X)) - model.predict_proba(X))
+    max_diff = float(diff.max()) if diff.size else 0.0
+    if max_diff > atol:
+        raise AssertionError(f"Divergência entre motor compilado e sklearn: {max_diff:.3e}")
+    return max_diff
+
+
+def export(model_path: str, artifact_path: str) -> dict:
+    """Converte o .pkl do sklearn no artefato mmap; retorna o cabeçalho gravado"""
+    import joblib
+
+    model = joblib.load(model_path)
+    engine = CompiledGradientBoosting.from_sklearn(model)
+    engine.save(artifact_path, fonte=os.path.basename(model_path), fonte_sha256=file_sha256(model_path))
+    return CompiledGradientBoosting.read_header(artifact_path)
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    args = sys.argv[1:]
+    if not args or args[0] != "export" or len(args) > 3:
+        print("Uso: python gb_engine.py export [modelo.pkl] [modelo.gbm]", file=sys.stderr)
+        sys.exit(2)
+    model_path = args[1] if len(args) > 1 else os.path.join(root, "modelo_gradient_boosting.pkl")
+    artifact_path = args[2] if len(args) > 2 else os.path.splitext(model_path)[0] + ".gbm"
+    header = export(model_path, artifact_path)
+    n_trees = header["arrays"]["roots"]["shape"][0]
+    print(f"{artifact_path}: {n_trees} árvores, {os.path.getsize(artifact_path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
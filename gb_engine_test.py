@@ -0,0 +1,70 @@
+# Paridade do motor compilado com o predict_proba do sklearn
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from gb_engine import CompiledGradientBoosting, check_parity
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "modelo_gradient_boosting.pkl")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(MODEL_PATH)
+
+
+def amostras(model, n=2000, seed=0):
+    """Pacientes sintéticos no formato de FEATURE_NAMES"""
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 2, size=(n, model.n_features_in_)).astype(np.float64)
+    X[:, 0] = rng.uniform(0, 110, n).round(1)
+    X[:, 1] = rng.integers(1, 3, n)
+    return pd.DataFrame(X, columns=model.feature_names_in_)
+
+
+def test_paridade_lote(model):
+    assert check_parity(model, amostras(model)) <= 1e-9
+
+
+def test_paridade_linha_unica(model):
+    engine = CompiledGradientBoosting.from_sklearn(model)
+    X = amostras(model, n=50, seed=1)
+    esperado = model.predict_proba(X)[:, 1]
+    for i in range(len(X)):
+        assert engine.predict_proba_one(X.to_numpy()[i]) == pytest.approx(esperado[i], abs=1e-9)
+
+
+def test_limiares_exatos(model):
+    # Valores exatamente no limiar de cada split devem seguir para a esquerda como no sklearn
+    engine = CompiledGradientBoosting.from_sklearn(model)
+    X = amostras(model, n=len(engine.threshold), seed=2).to_numpy()
+    internos = np.isfinite(engine.threshold)
+    X[internos, engine.feature[internos]] = engine.threshold[internos]
+    df = pd.DataFrame(X, columns=model.feature_names_in_)
+    assert np.allclose(engine.predict_proba(X), model.predict_proba(df), atol=1e-9)
+
+
+def test_numero_de_features_invalido(model):
+    engine = CompiledGradientBoosting.from_sklearn(model)
+    with pytest.raises(ValueError):
+        engine.predict_proba(np.zeros((1, model.n_features_in_ - 1)))
+
+
+def test_artefato_mmap(model, tmp_path):
+    path = str(tmp_path / "modelo.gbm")
+    CompiledGradientBoosting.from_sklearn(model).save(path, fonte_sha256="abc")
+    engine = CompiledGradientBoosting.load(path)
+    assert engine.header["fonte_sha256"] == "abc"
+    assert not engine.threshold.flags.writeable  # aponta para o mmap, não é cópia
+    X = amostras(model, seed=3)
+    assert np.allclose(engine.predict_proba(X.to_numpy()), model.predict_proba(X), atol=1e-9)
+
+
+def test_artefato_invalido(tmp_path):
+    path = tmp_path / "modelo.gbm"
+    path.write_bytes(b"nao e um artefato")
+    with pytest.raises(ValueError):
+        CompiledGradientBoosting.load(str(path))
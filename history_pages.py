@@ -0,0 +1,120 @@
+# Páginas do histórico de consultas no front (GET /consultas do backend)
+#
+# O backend pagina por cursor (search.py): cada página traz "proximo", o
+# cursor da seguinte. Aqui cada página buscada fica num cache LRU com TTL,
+# chaveado por (filtros, cursor, limite), e compartilhado entre as sessões do
+# Streamlit (front.py guarda uma instância com st.cache_resource). Enquanto o
+# usuário lê uma página, a seguinte é buscada numa thread em segundo plano;
+# se ele avançar antes de a busca terminar, espera a mesma busca em vez de
+# abrir outra. Só as páginas visitadas (e a próxima) saem do backend.
+# clear() (depois de gravar uma consulta) avança a geração do cache: uma busca
+# que começou antes dele devolve a página a quem pediu, mas não a guarda.
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TTL = 60
+MAX_ENTRIES = 256
+PREFETCH_WORKERS = 2
+
+
+class HistoryError(ValueError):
+    """Filtro recusado pelo backend (HTTP 400), com a mensagem dele"""
+
+
+class HistoryPages:
+    def __init__(self, backend, ttl: float = DEFAULT_TTL, max_entries: int = MAX_ENTRIES,
+                 workers: int = PREFETCH_WORKERS):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()  # chave -> (expira_em, página)
+        self._inflight = {}  # chave -> Future da busca em andamento
+        self._generation = 0  # incrementada por clear()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="historico-prefetch")
+
+    @staticmethod
+    def key(filtros: dict, cursor, limite: int) -> tuple:
+        # Filtros vazios não mudam a busca: ficam fora da chave
+        return tuple(sorted((k, str(v)) for k, v in filtros.items() if v not in (None, ""))), cursor, limite
+
+    def _fetch(self, chave, geracao: int) -> dict:
+        filtros, cursor, limite = chave
+        params = dict(filtros, limite=limite)
+        if cursor:
+            params["cursor"] = cursor
+        r = self.backend.get("/consultas", params=params)
+        if r.status_code == 400:
+            raise HistoryError(r.json().get("error", "filtro inválido"))
+        r.raise_for_status()
+        pagina = r.json()
+        with self._lock:
+            if geracao != self._generation:
+                # clear() durante a busca: a página pode ser anterior à mudança
+                return pagina
+            self._pages[chave] = (time.monotonic() + self.ttl, pagina)
+            self._pages.move_to_end(chave)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return pagina
+
+    def _cached(self, chave):
+        """Página em cache e dentro do TTL, ou None (chamar com o lock)"""
+        item = self._pages.get(chave)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._pages[chave]
+            return None
+        self._pages.move_to_end(chave)
+        return item[1]
+
+    def _done(self, chave, future):
+        with self._lock:
+            if self._inflight.get(chave) is future:
+                del self._inflight[chave]
+
+    def page(self, filtros: dict, cursor=None, limite: int = 50) -> dict:
+        """Página {"consultas", "proximo", "limite"} do cache ou do backend"""
+        chave = self.key(filtros, cursor, limite)
+        with self._lock:
+            pagina = self._cached(chave)
+            if pagina is not None:
+                self.hits += 1
+                return pagina
+            self.misses += 1
+            future = self._inflight.get(chave)
+            geracao = self._generation
+        if future is not None:
+            return future.result()
+        return self._fetch(chave, geracao)
+
+    def prefetch(self, filtros: dict, cursor, limite: int = 50):
+        """Busca a página em segundo plano se ela não está em cache"""
+        if not cursor:
+            return
+        chave = self.key(filtros, cursor, limite)
+        with self._lock:
+            if self._cached(chave) is not None or chave in self._inflight:
+                return
+            future = self._executor.submit(self._fetch, chave, self._generation)
+            self._inflight[chave] = future
+        # Fora do lock: se a busca já terminou o callback roda nesta thread e
+        # _done precisa do lock
+        future.add_done_callback(lambda f: self._done(chave, f))
+
+    def clear(self):
+        """Esvazia o cache; buscas em andamento não gravam nele nem são reaproveitadas"""
+        with self._lock:
+            self._generation += 1
+            self._pages.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"paginas": len(self._pages), "hits": self.hits, "misses": self.misses,
+                    "em_andamento": len(self._inflight), "ttl_s": self.ttl}
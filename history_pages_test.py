@@ -0,0 +1,98 @@
+# Cache de páginas do histórico (history_pages.py) com um backend falso
+import threading
+
+import pytest
+
+from history_pages import HistoryError, HistoryPages
+
+
+class Resposta:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class BackendFalso:
+    """GET /consultas que responde a versão atual dos dados e pode ser segurado"""
+
+    def __init__(self):
+        self.versao = 1
+        self.chamadas = []
+        self.liberar = threading.Event()
+        self.liberar.set()
+        self.chegou = threading.Event()
+
+    def get(self, path, params=None):
+        self.chamadas.append(dict(params))
+        versao = self.versao
+        self.chegou.set()
+        self.liberar.wait(10)
+        if params.get("nome") == "invalido":
+            return Resposta(400, {"error": "filtro ruim"})
+        return Resposta(200, {"consultas": [versao], "proximo": None, "limite": params["limite"]})
+
+
+@pytest.fixture()
+def backend():
+    return BackendFalso()
+
+
+def test_pagina_em_cache(backend):
+    pages = HistoryPages(backend)
+    assert pages.page({"nome": "ana", "sexo": ""}) == pages.page({"nome": "ana"})
+    assert len(backend.chamadas) == 1
+    assert pages.stats()["hits"] == 1 and pages.stats()["misses"] == 1
+
+
+def test_filtro_recusado(backend):
+    with pytest.raises(HistoryError, match="filtro ruim"):
+        HistoryPages(backend).page({"nome": "invalido"})
+
+
+def test_prefetch_reaproveitado_pela_pagina(backend):
+    pages = HistoryPages(backend)
+    backend.liberar.clear()
+    pages.prefetch({}, "c2")
+    assert backend.chegou.wait(5)
+    backend.liberar.set()
+    assert pages.page({}, "c2")["consultas"] == [1]
+    assert len(backend.chamadas) == 1
+
+
+def test_clear_descarta_prefetch_em_andamento(backend):
+    pages = HistoryPages(backend)
+    backend.liberar.clear()
+    pages.prefetch({}, "c2")
+    assert backend.chegou.wait(5)
+    # Nova consulta gravada enquanto a busca antiga está no backend
+    backend.versao = 2
+    pages.clear()
+    assert pages.stats()["em_andamento"] == 0
+    backend.liberar.set()
+    pages._executor.shutdown(wait=True)
+
+    assert pages.stats()["paginas"] == 0
+    assert pages.page({}, "c2")["consultas"] == [2]
+    assert len(backend.chamadas) == 2
+
+
+def test_clear_durante_busca_sincrona(backend):
+    pages = HistoryPages(backend)
+    backend.liberar.clear()
+    resultado = []
+    t = threading.Thread(target=lambda: resultado.append(pages.page({})))
+    t.start()
+    assert backend.chegou.wait(5)
+    pages.clear()
+    backend.liberar.set()
+    t.join(5)
+    # Quem pediu recebe a página, mas ela não fica no cache
+    assert resultado[0]["consultas"] == [1]
+    assert pages.stats()["paginas"] == 0
@@ -0,0 +1,158 @@
+# Métricas no formato de exposição do Prometheus (GET /metrics)
+#
+# Implementação mínima e sem dependências: contadores, histogramas e gauges
+# calculados na hora da coleta, todos com labels. Um observe() custa um lock e
+# uma busca binária nos limites dos buckets (~1 µs), então a instrumentação
+# fica sempre ligada. Os valores são do processo: com vários workers
+# (serve.py) cada um responde GET /metrics com os próprios números.
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+# Limites em segundos: de 100 µs (inferência em cache) a 10 s (PDF com fila cheia)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pares = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def collect(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        linhas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        linhas += [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+        return linhas
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por labels: [contagem por bucket (não cumulativa, +Inf no fim), soma]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(labels)
+            if serie is None:
+                serie = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += value
+
+    def count(self, *labels) -> int:
+        serie = self._series.get(labels)
+        return sum(serie[0]) if serie else 0
+
+    def collect(self) -> list:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        linhas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (contagens, soma) in items:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += n
+                linhas.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', _number(limite)))} "
+                              f"{acumulado}")
+            linhas.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(soma)}")
+            linhas.append(f"{self.name}_count{_labels(self.labelnames, labels)} {acumulado}")
+        return linhas
+
+
+class Gauge:
+    """Valor lido na coleta: fn() devolve um número ou {(labels...): número}
+
+    kind="counter" expõe como contador um total mantido em outro objeto
+    (ex.: os hits do PredictionCache).
+    """
+
+    def __init__(self, name: str, help: str, fn, labelnames=(), kind: str = "gauge"):
+        self.name, self.help, self.fn, self.labelnames = name, help, fn, tuple(labelnames)
+        self.kind = kind
+
+    def collect(self) -> list:
+        valor = self.fn()
+        items = sorted(valor.items()) if isinstance(valor, dict) else [((), valor)]
+        linhas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        linhas += [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+        return linhas
+
+
+class _Stage:
+    __slots__ = ("_timer", "_stage", "_inicio")
+
+    def __init__(self, timer, stage):
+        self._timer = timer
+        self._stage = stage
+
+    def __enter__(self):
+        self._inicio = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._timer.seconds.observe(perf_counter() - self._inicio, self._stage)
+        if exc_type is not None:
+            self._timer.errors.inc(self._stage)
+        return False
+
+
+class StageTimer:
+    """Histograma de duração e contador de erros por etapa
+
+    with timer("inference"): ... registra a duração em <prefixo>_seconds e,
+    se a etapa levantar exceção, soma 1 em <prefixo>_errors_total.
+    """
+
+    def __init__(self, registry, prefix: str, help: str, label: str = "stage", buckets=DEFAULT_BUCKETS):
+        self.seconds = registry.register(Histogram(f"{prefix}_seconds", f"Duração de {help} (s)",
+                                                   (label,), buckets))
+        self.errors = registry.register(Counter(f"{prefix}_errors_total", f"Erros de {help}", (label,)))
+
+    def __call__(self, stage: str) -> _Stage:
+        return _Stage(self, stage)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        linhas = []
+        for metric in self._metrics:
+            linhas += metric.collect()
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,56 @@
+# Formato de exposição do Prometheus (metrics.py)
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Registry, StageTimer
+
+
+def linhas_de(texto, prefixo):
+    return [l for l in texto.splitlines() if l.startswith(prefixo)]
+
+
+def test_histograma_cumulativo_com_sum_e_count():
+    registry = Registry()
+    h = registry.register(Histogram("lat_seconds", "Latência", ("stage",), buckets=(0.1, 1.0, 0.5)))
+    for valor in (0.05, 0.1, 0.3, 0.7, 2.0, 3.0):
+        h.observe(valor, "db")
+    h.observe(0.2, "pdf")
+    texto = registry.render()
+
+    assert texto.endswith("\n")
+    assert linhas_de(texto, "# ") == ["# HELP lat_seconds Latência", "# TYPE lat_seconds histogram"]
+    assert linhas_de(texto, 'lat_seconds_bucket{stage="db"') == [
+        'lat_seconds_bucket{stage="db",le="0.1"} 2',  # o limite é inclusivo
+        'lat_seconds_bucket{stage="db",le="0.5"} 3',
+        'lat_seconds_bucket{stage="db",le="1.0"} 4',
+        'lat_seconds_bucket{stage="db",le="+Inf"} 6',
+    ]
+    assert float(linhas_de(texto, 'lat_seconds_sum{stage="db"}')[0].split()[1]) == pytest.approx(6.15)
+    assert linhas_de(texto, 'lat_seconds_count{stage="db"}') == ['lat_seconds_count{stage="db"} 6']
+    assert 'lat_seconds_bucket{stage="pdf",le="+Inf"} 1' in texto
+    assert h.count("db") == 6 and h.count("outra") == 0
+
+
+def test_contador_gauge_e_escape():
+    registry = Registry()
+    c = registry.register(Counter("erros_total", "Erros", ("rota",)))
+    c.inc('/a"b')
+    c.inc('/a"b', amount=2)
+    registry.register(Gauge("fila", "Fila", lambda: 3))
+    registry.register(Gauge("hits_total", "Acertos", lambda: {("x",): 1.5}, ("cache",), kind="counter"))
+    texto = registry.render()
+    assert 'erros_total{rota="/a\\"b"} 3' in texto
+    assert "fila 3" in texto.splitlines()
+    assert "# TYPE hits_total counter" in texto and 'hits_total{cache="x"} 1.5' in texto
+
+
+def test_stage_timer_conta_erros():
+    registry = Registry()
+    timer = StageTimer(registry, "etapa", "cada etapa")
+    with timer("ok"):
+        pass
+    with pytest.raises(RuntimeError):
+        with timer("falha"):
+            raise RuntimeError("x")
+    assert timer.seconds.count("ok") == 1 and timer.seconds.count("falha") == 1
+    assert timer.errors.value("falha") == 1 and timer.errors.value("ok") == 0
+    assert 'etapa_errors_total{stage="falha"} 1' in registry.render()
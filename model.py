@@ -5,22 +5,8 @@ from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.model_selection import train_test_split
 import joblib
 
-# Feature names do seu código
-FEATURE_NAMES = [
-    "patient_age","patient_sex","SAH","acute myocardium infarct","adrenal hypoplasia","albinism",
-    "alzheimer","anemia","aneurysm","ankylosing spondylitis","arrhythmia","arthrosis","asthma",
-    "behcet","brain tumor","breast cancer","cardiac insufficiency","cardiopathy","catheterism",
-    "cerebral palsy","chron disease","chronic kidney disease","cirrhosis","cone dystrophy","devic",
-    "dialysis","down syndrome","dyslipidemia","fibromyalgia","hashimoto disease","hepatic cancer",
-    "hepatic transplant","hepatitis c","herpetic encephalitis","hipocolesterolemia",
-    "human immunodeficiency virus","hydrocephalus","hypercholesterolemia","hypertriglyceridemia",
-    "hypophysis adenoma","intestinal cancer","intracranial hypertension","kidney transplant","leucemia",
-    "lung cancer","lymphoma","mccune albright","meningioma","migraine","muscular dystrophy",
-    "neurofibromatosis","obesity","osteoporosis","policitemia vera","prolactinoma","prostatic hyperplasia",
-    "psoriasis","pulmonary embolism","sarcoidosis","sickle cell anemia","sjogren","tabagism",
-    "valvulopathy","vasculitis","vitiligo","AVC","doenca_chagas","trombose_venosa_profunda",
-    "cloroquina","hipotireoidismo","hipertireoidismo","esclerose_multipla","artrite"
-]
+# Feature names compartilhadas com o backend e o front
+from schema import FEATURE_NAMES, SCHEMA_VERSION
 
 def criar_dados_treinamento(n_amostras=1000):
     """Cria dados sintéticos para treinar o modelo"""
@@ -82,6 +68,7 @@ model.fit(X, y)
 print(f"✅ Modelo treinado com sucesso!")
 print(f"📈 Acurácia no treinamento: {model.score(X, y):.3f}")
 print(f"🔧 Número de features: {model.n_features_in_}")
+print(f"🧬 Schema de features: {SCHEMA_VERSION}")
 
 # Salva o modelo
 print("💾 Salvando modelo...")
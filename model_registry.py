@@ -0,0 +1,223 @@
+# Registro do modelo em uso, com troca a quente
+#
+# Cada versão (ModelVersion) é identificada pelo sha256 do .pkl e guarda o
+# modelo sklearn e/ou o motor compilado. reload() monta a nova versão fora do
+# caminho dos requests (carrega, valida contra FEATURE_NAMES e faz uma
+# predição de aquecimento) e só então troca a referência atual numa única
+# atribuição. Cada request lê registry.current uma vez e usa essa versão do
+# começo ao fim: nada em andamento é interrompido nem mistura versões.
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from gb_engine import CompiledGradientBoosting, file_sha256
+from schema import FEATURE_NAMES, N_FEATURES, check_model_features
+
+logger = logging.getLogger(__name__)
+
+# Versões carregadas guardadas para GET /admin/modelo
+HISTORY_SIZE = 10
+
+
+def version_of(model_path: str) -> str:
+    """Identificador da versão: início do sha256 do arquivo do modelo"""
+    return file_sha256(model_path)[:12]
+
+
+class ModelVersion:
+    """Uma versão carregada do modelo; imutável depois de criada"""
+
+    def __init__(self, version: str, model, engine, source: str, load_s: float):
+        self.version = version
+        self.model = model
+        self.engine = engine
+        self.source = source
+        self.load_s = load_s
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Probabilidade da classe positiva para cada linha de X"""
+        if self.engine is not None:
+            return self.engine.predict_proba(X)[:, 1]
+        import pandas as pd
+        df = pd.DataFrame(X, columns=FEATURE_NAMES, copy=False)
+        if hasattr(self.model, "predict_proba"):
+            return self.model.predict_proba(df)[:, 1]
+        return np.asarray(self.model.predict(df), dtype=np.float64)
+
+    def predict_proba_one(self, row) -> float:
+        if self.engine is not None:
+            return self.engine.predict_proba_one(row)
+        return float(self.predict_proba(np.asarray(row)[np.newaxis, :])[0])
+
+    def describe(self) -> dict:
+        return {
+            "versao": self.version,
+            "fonte": self.source,
+            "motor": "compiled" if self.engine is not None else "sklearn",
+            "carregado_em": self.loaded_at,
+            "carga_s": self.load_s,
+        }
+
+
+class ModelRegistry:
+    """Versão atual do modelo, recarga em segundo plano e observação do arquivo"""
+
+    def __init__(self, model_path: str, artifact_path: str = None, compiled: bool = True):
+        self.model_path = model_path
+        self.artifact_path = artifact_path
+        self.compiled = compiled
+        self.current = None
+        self.reloads = self.failures = 0
+        self.last_error = None
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._reload_lock = threading.Lock()
+        self._file_signature = None
+        self._watcher_pid = None
+
+    @property
+    def version(self):
+        current = self.current
+        return current.version if current is not None else None
+
+    def _signature(self):
+        """Identifica o arquivo do modelo no disco (mtime e tamanho)"""
+        try:
+            st = os.stat(self.model_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    # --- Carga
+
+    def _compile(self, model):
+        """Compila o modelo; None para usar o predict_proba do sklearn"""
+        if not self.compiled:
+            return None
+        try:
+            return CompiledGradientBoosting.from_sklearn(model)
+        except (ValueError, AttributeError) as e:
+            logger.warning("Motor compilado indisponível, usando sklearn: %s", e)
+            return None
+
+    def _load_artifact(self, model_sha256: str):
+        """Motor do artefato mmap, ou None se ausente, desatualizado ou inválido"""
+        if not self.compiled or not self.artifact_path or not os.path.exists(self.artifact_path):
+            return None
+        try:
+            if CompiledGradientBoosting.read_header(self.artifact_path).get("fonte_sha256") != model_sha256:
+                logger.info("Artefato %s não corresponde ao modelo atual", self.artifact_path)
+                return None
+            return CompiledGradientBoosting.load(self.artifact_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Artefato de modelo inválido, usando o .pkl: %s", e)
+            return None
+
+    def _save_artifact(self, engine, model_sha256: str):
+        if engine is None or not self.artifact_path:
+            return
+        try:
+            engine.save(self.artifact_path, fonte=os.path.basename(self.model_path), fonte_sha256=model_sha256)
+            logger.info("Artefato do modelo gravado em %s", self.artifact_path)
+        except OSError as e:
+            logger.warning("Não foi possível gravar o artefato do modelo: %s", e)
+
+    def load(self) -> ModelVersion:
+        """Carrega, valida e aquece a versão do arquivo, sem trocar a atual"""
+        inicio = time.perf_counter()
+        model_sha256 = file_sha256(self.model_path)
+        model, engine = None, self._load_artifact(model_sha256)
+        if engine is not None:
+            check_model_features(engine)
+            source = "artefato"
+        else:
+            import joblib
+            model = joblib.load(self.model_path)
+            check_model_features(model)
+            engine = self._compile(model)
+            self._save_artifact(engine, model_sha256)
+            source = "pkl"
+
+        mv = ModelVersion(model_sha256[:12], model, engine, source, 0.0)
+        # Aquecimento: a primeira predição paga alocações fora de um request
+        probs = mv.predict_proba(np.zeros((2, N_FEATURES)))
+        if not np.all(np.isfinite(probs)) or np.any((probs < 0) | (probs > 1)):
+            raise RuntimeError("Modelo produziu probabilidades inválidas no aquecimento")
+        mv.load_s = round(time.perf_counter() - inicio, 3)
+        return mv
+
+    def reload(self) -> ModelVersion:
+        """Carrega a versão do arquivo e a coloca em uso; em erro mantém a atual"""
+        with self._reload_lock:
+            signature = self._signature()
+            try:
+                mv = self.load()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                # Só tenta de novo quando o arquivo mudar outra vez
+                self._file_signature = signature
+                raise
+            self._file_signature = signature
+            self.last_error = None
+            anterior = self.current
+            if anterior is not None and anterior.version == mv.version:
+                return anterior
+            self.current = mv  # troca atômica: requests em andamento seguem com a versão que já pegaram
+            self.reloads += 1
+            self._history.appendleft(mv.describe())
+            logger.info("Modelo %s em uso (%s, %.2fs); anterior: %s", mv.version, mv.source, mv.load_s,
+                        anterior.version if anterior is not None else None)
+            return mv
+
+    def reload_async(self) -> bool:
+        """reload() numa thread própria; False se já há uma recarga em andamento"""
+        if self._reload_lock.locked():
+            return False
+
+        def run():
+            try:
+                self.reload()
+            except Exception as e:
+                logger.exception("Falha ao recarregar o modelo: %s", e)
+
+        threading.Thread(target=run, name="model-reload", daemon=True).start()
+        return True
+
+    # --- Observação do arquivo
+
+    def start_watcher(self, interval: float):
+        """Recarrega quando o arquivo do modelo muda; uma thread por processo (sobrevive a fork)"""
+        if interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(interval)
+                signature = self._signature()
+                if signature is None or signature == self._file_signature:
+                    continue
+                logger.info("Arquivo do modelo mudou, recarregando")
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.exception("Falha ao recarregar o modelo: %s", e)
+
+        threading.Thread(target=run, name="model-watcher", daemon=True).start()
+
+    def status(self) -> dict:
+        current = self.current
+        return {
+            "atual": current.describe() if current is not None else None,
+            "carregando": self._reload_lock.locked(),
+            "recargas": self.reloads,
+            "falhas": self.failures,
+            "ultimo_erro": self.last_error,
+            "historico": list(self._history),
+        }
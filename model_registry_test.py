@@ -0,0 +1,123 @@
+# Troca a quente do modelo (model_registry.py): nova versão, arquivo corrompido e artefato
+import os
+import shutil
+import threading
+import time
+
+import joblib
+import pytest
+
+from gb_engine import CompiledGradientBoosting, file_sha256
+from model_registry import ModelRegistry, version_of
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "modelo_gradient_boosting.pkl")
+
+
+@pytest.fixture(scope="module")
+def modelo():
+    return joblib.load(MODEL_PATH)
+
+
+@pytest.fixture()
+def arquivos(tmp_path):
+    pkl = tmp_path / "modelo.pkl"
+    shutil.copyfile(MODEL_PATH, pkl)
+    return str(pkl), str(tmp_path / "modelo.gbm")
+
+
+def nova_versao(modelo, pkl, compress=3):
+    """Grava o mesmo modelo com outros bytes (outro sha256, outra versão)"""
+    antes = os.stat(pkl).st_mtime_ns
+    joblib.dump(modelo, pkl, compress=compress)
+    os.utime(pkl, ns=(antes + 10**9, antes + 10**9))  # mtime muda mesmo em sistemas de arquivos grosseiros
+    return version_of(pkl)
+
+
+def esperar(condicao, timeout=20):
+    fim = time.monotonic() + timeout
+    while time.monotonic() < fim:
+        if condicao():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_troca_de_versao(modelo, arquivos):
+    pkl, gbm = arquivos
+    registry = ModelRegistry(pkl, gbm)
+    v1 = registry.reload().version
+    assert v1 == version_of(pkl) == registry.version
+
+    v2 = nova_versao(modelo, pkl)
+    mv = registry.reload()
+    assert v2 != v1 and mv.version == v2 == registry.version
+    status = registry.status()
+    assert status["recargas"] == 2 and status["atual"]["versao"] == v2
+    assert [h["versao"] for h in status["historico"]] == [v2, v1]
+    # Recarregar o mesmo arquivo não cria versão nova
+    assert registry.reload() is mv and registry.status()["recargas"] == 2
+
+
+def test_arquivo_corrompido_mantem_versao_anterior(arquivos):
+    pkl, gbm = arquivos
+    registry = ModelRegistry(pkl, gbm)
+    v1 = registry.reload().version
+    with open(pkl, "wb") as f:
+        f.write(b"isto nao e um pickle")
+    with pytest.raises(Exception):
+        registry.reload()
+    assert registry.version == v1
+    status = registry.status()
+    assert status["falhas"] == 1 and status["ultimo_erro"] and not status["carregando"]
+    assert status["atual"]["versao"] == v1
+
+    shutil.copyfile(MODEL_PATH, pkl)
+    registry.reload()
+    assert registry.status()["ultimo_erro"] is None
+
+
+def test_artefato_desatualizado_e_regravado(modelo, arquivos):
+    pkl, gbm = arquivos
+    assert ModelRegistry(pkl, gbm).reload().source == "pkl"
+    assert CompiledGradientBoosting.read_header(gbm)["fonte_sha256"] == file_sha256(pkl)
+    assert ModelRegistry(pkl, gbm).reload().source == "artefato"
+
+    # .pkl novo ao lado do .gbm antigo: carrega do .pkl e regrava o artefato
+    nova_versao(modelo, pkl)
+    assert ModelRegistry(pkl, gbm).reload().source == "pkl"
+    assert CompiledGradientBoosting.read_header(gbm)["fonte_sha256"] == file_sha256(pkl)
+    assert ModelRegistry(pkl, gbm).reload().source == "artefato"
+
+
+def test_recarga_assincrona(modelo, arquivos):
+    pkl, gbm = arquivos
+    registry = ModelRegistry(pkl, gbm)
+    registry.reload()
+    v2 = nova_versao(modelo, pkl)
+    assert registry.reload_async()
+    assert esperar(lambda: registry.version == v2)
+
+    # Com uma recarga em andamento a segunda é recusada
+    with registry._reload_lock:
+        assert not registry.reload_async()
+        assert registry.status()["carregando"]
+
+
+def test_watcher_recarrega_quando_o_arquivo_muda(modelo, arquivos):
+    pkl, gbm = arquivos
+    registry = ModelRegistry(pkl, gbm)
+    v1 = registry.reload().version
+    registry.start_watcher(0.05)
+    nomes = [t.name for t in threading.enumerate()].count("model-watcher")
+    registry.start_watcher(0.05)  # uma thread por processo
+    assert [t.name for t in threading.enumerate()].count("model-watcher") == nomes
+
+    v2 = nova_versao(modelo, pkl)
+    assert esperar(lambda: registry.version == v2)
+    # Arquivo corrompido: o watcher falha uma vez e mantém a versão em uso
+    with open(pkl, "wb") as f:
+        f.write(b"corrompido")
+    os.utime(pkl, ns=(time.time_ns() + 5 * 10**9,) * 2)
+    assert esperar(lambda: registry.failures == 1)
+    time.sleep(0.2)
+    assert registry.failures == 1 and registry.version == v2 != v1
@@ -0,0 +1,206 @@
+# Cache em disco de PDFs renderizados sob demanda
+#
+# LRU limitado por bytes: quando o total passa de max_bytes os arquivos menos
+# usados recentemente são apagados. Os PDFs podem ser refeitos a partir da
+# linha de consultas, então apagar é sempre seguro. Os nomes são caminhos
+# relativos e podem ter subdiretórios (layout de pdf_store.py).
+#
+# O índice (nome, bytes, último uso) e o total de bytes ficam num SQLite
+# dentro do próprio diretório, não na memória do processo: com vários workers
+# (serve.py) todos veem os PDFs que qualquer um renderizou e o orçamento vale
+# para o diretório inteiro. O total é mantido por trigger, então conferir o
+# orçamento a cada put() não percorre o índice nem o diretório.
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.db"
+# Arquivos removidos por rodada de despejo
+EVICT_BATCH = 32
+
+
+class PdfDiskCache:
+    """Diretório de PDFs com orçamento de bytes e despejo LRU, compartilhado entre processos"""
+
+    def __init__(self, directory: str, max_bytes: int, busy_timeout_ms: int = 5000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.busy_timeout_ms = busy_timeout_ms
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._local = threading.local()
+        # Contadores deste processo
+        self.hits = self.misses = self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._init_index()
+
+    # --- Índice
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexão por thread e por processo (não atravessa o fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_index(self):
+        conn = self._open()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            novo = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entradas'"
+            ).fetchone() is None
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS entradas (
+                nome TEXT PRIMARY KEY,
+                bytes INTEGER NOT NULL,
+                usado_em REAL NOT NULL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_usado_em ON entradas(usado_em)")
+            conn.execute("CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                         "arquivos INTEGER NOT NULL, bytes INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO total (id, arquivos, bytes) VALUES (0, 0, 0)")
+            conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_entradas_insert AFTER INSERT ON entradas
+            BEGIN
+                UPDATE total SET arquivos = arquivos + 1, bytes = bytes + NEW.bytes WHERE id = 0;
+            END
+            ''')
+            conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_entradas_delete AFTER DELETE ON entradas
+            BEGIN
+                UPDATE total SET arquivos = arquivos - 1, bytes = bytes - OLD.bytes WHERE id = 0;
+            END
+            ''')
+            conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_entradas_update AFTER UPDATE OF bytes ON entradas
+            BEGIN
+                UPDATE total SET bytes = bytes + NEW.bytes - OLD.bytes WHERE id = 0;
+            END
+            ''')
+            if novo:
+                # Migração: arquivos já em disco, com o último acesso de cada um
+                entradas = list(self._scan())
+                conn.executemany("INSERT INTO entradas (nome, bytes, usado_em) VALUES (?, ?, ?)", entradas)
+                if entradas:
+                    logger.info("Cache de PDFs: %d arquivos indexados", len(entradas))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self._evict()
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".pdf"):
+                    path = os.path.join(dirpath, filename)
+                    st = os.stat(path)
+                    name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                    yield name, st.st_size, st.st_atime
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _evict(self, keep: str = None):
+        """Apaga os menos usados até o total caber no orçamento (mantém pelo menos um)"""
+        conn = self._conn()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                arquivos, total = conn.execute("SELECT arquivos, bytes FROM total WHERE id = 0").fetchone()
+                if total <= self.max_bytes or arquivos <= 1:
+                    conn.execute("COMMIT")
+                    return
+                candidatos = conn.execute(
+                    "SELECT nome, bytes FROM entradas WHERE nome IS NOT ? ORDER BY usado_em LIMIT ?",
+                    (keep, EVICT_BATCH)).fetchall()
+                if not candidatos:
+                    conn.execute("COMMIT")
+                    return
+                # Remove só o necessário, na ordem LRU
+                removidos = []
+                for nome, tamanho in candidatos:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM entradas WHERE nome = ?", (nome,))
+                    total -= tamanho
+                    removidos.append(nome)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            # Arquivos saem depois do commit: um get() concorrente que ainda
+            # achar a linha só encontra o arquivo ausente e conta como miss
+            for nome in removidos:
+                self.evictions += 1
+                try:
+                    os.remove(self._path(nome))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    logger.warning("Não foi possível remover %s do cache de PDFs", nome)
+
+    # --- API
+
+    def get(self, name: str):
+        """Caminho do PDF em cache, ou None"""
+        conn = self._conn()
+        if conn.execute("UPDATE entradas SET usado_em = ? WHERE nome = ?", (time.time(), name)).rowcount:
+            path = self._path(name)
+            if os.path.isfile(path):
+                self.hits += 1
+                return path
+            # Linha sem arquivo (removido por fora): some do índice
+            conn.execute("DELETE FROM entradas WHERE nome = ?", (name,))
+        self.misses += 1
+        return None
+
+    def put(self, name: str, render) -> str:
+        """Chama render(caminho_temporário) e publica o arquivo de forma atômica"""
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            render(tmp)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._conn().execute(
+            "INSERT INTO entradas (nome, bytes, usado_em) VALUES (?, ?, ?) "
+            "ON CONFLICT(nome) DO UPDATE SET bytes = excluded.bytes, usado_em = excluded.usado_em",
+            (name, size, time.time()))
+        self._evict(keep=name)
+        return path
+
+    def stats(self) -> dict:
+        arquivos, total = self._conn().execute("SELECT arquivos, bytes FROM total WHERE id = 0").fetchone()
+        return {
+            "files": arquivos,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,87 @@
+# Cache de PDFs em disco (pdf_cache.py): LRU por bytes compartilhado entre processos
+import multiprocessing
+import os
+
+from pdf_cache import INDEX_NAME, PdfDiskCache
+
+
+def escrever(tamanho):
+    def render(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * tamanho)
+    return render
+
+
+def bytes_em_disco(directory):
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames if f.endswith(".pdf"))
+    return total
+
+
+def test_despejo_lru(tmp_path):
+    cache = PdfDiskCache(str(tmp_path), max_bytes=3000)
+    for nome in ("a.pdf", "b.pdf", "c.pdf"):
+        cache.put(nome, escrever(1000))
+    assert cache.get("a.pdf") is not None  # a passa a ser o mais recente
+    cache.put("000/001/d.pdf", escrever(1000))
+    assert cache.get("b.pdf") is None
+    assert cache.get("a.pdf") and cache.get("c.pdf") and cache.get("000/001/d.pdf")
+    assert cache.stats()["bytes"] == bytes_em_disco(tmp_path) == 3000
+
+
+def test_regravar_desconta_tamanho_anterior(tmp_path):
+    cache = PdfDiskCache(str(tmp_path), max_bytes=10_000)
+    cache.put("a.pdf", escrever(1000))
+    cache.put("a.pdf", escrever(400))
+    assert cache.stats()["files"] == 1 and cache.stats()["bytes"] == 400
+
+
+def test_instancias_compartilham_indice(tmp_path):
+    # Dois workers: o PDF renderizado por um é hit no outro e o orçamento é um só
+    w1 = PdfDiskCache(str(tmp_path), max_bytes=2500)
+    w2 = PdfDiskCache(str(tmp_path), max_bytes=2500)
+    w1.put("a.pdf", escrever(1000))
+    assert w2.get("a.pdf") is not None
+    w2.put("b.pdf", escrever(1000))
+    w1.put("c.pdf", escrever(1000))
+    assert w1.get("a.pdf") is None and w2.get("a.pdf") is None
+    assert not os.path.exists(tmp_path / "a.pdf")
+    assert w1.stats()["bytes"] == bytes_em_disco(tmp_path) == 2000
+
+
+def test_arquivo_removido_por_fora_vira_miss(tmp_path):
+    cache = PdfDiskCache(str(tmp_path), max_bytes=10_000)
+    path = cache.put("a.pdf", escrever(100))
+    os.remove(path)
+    assert cache.get("a.pdf") is None
+    assert cache.stats()["files"] == 0
+
+
+def test_indexa_arquivos_existentes(tmp_path):
+    (tmp_path / "000").mkdir()
+    for nome in ("a.pdf", "000/b.pdf", "000/c.pdf"):
+        (tmp_path / nome).write_bytes(b"x" * 1000)
+    cache = PdfDiskCache(str(tmp_path), max_bytes=2000)
+    assert cache.stats()["files"] == 2
+    assert bytes_em_disco(tmp_path) == 2000
+    assert os.path.exists(tmp_path / INDEX_NAME)
+
+
+def _worker(directory, prefixo):
+    cache = PdfDiskCache(directory, max_bytes=20_000)
+    for i in range(40):
+        cache.put(f"{prefixo}/{i:03d}.pdf", escrever(1000))
+        cache.get(f"{prefixo}/{max(0, i - 1):03d}.pdf")
+
+
+def test_orcamento_vale_entre_processos(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_worker, args=(str(tmp_path), f"w{i}")) for i in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    stats = PdfDiskCache(str(tmp_path), max_bytes=20_000).stats()
+    assert stats["bytes"] == bytes_em_disco(tmp_path) <= 20_000
@@ -0,0 +1,106 @@
+# Entrega dos PDFs por HTTP com validadores de cache
+#
+# PDFs gravados em disco saem com ETag forte (sha256 do conteúdo),
+# Last-Modified e Cache-Control; o werkzeug responde 304 a If-None-Match /
+# If-Modified-Since e atende Range (206, ou 416 fora do arquivo), então um PDF
+# reaberto não é baixado de novo e leitores de PDF podem pedir só um trecho.
+# O hash de cada arquivo é calculado uma vez e reaproveitado enquanto o mtime
+# e o tamanho não mudam.
+#
+# Sem persistência (DATACARE_PDF_MODE=memory) o relatório é renderizado num
+# buffer e enviado direto. Cada renderização traz a data de geração, então os
+# bytes mudam: o ETag é fraco, derivado da linha de consultas, e basta para o
+# 304 (que nem chega a renderizar), mas não para Range.
+#
+# Cache-Control é private por padrão: o relatório tem dados do paciente e não
+# deve ficar num proxy compartilhado, então só o navegador guarda o PDF. Com
+# public=True (DATACARE_PDF_CACHE_SCOPE=public) proxies e CDN também podem.
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request, send_file
+
+PDF_MIMETYPE = "application/pdf"
+CHUNK = 1024 * 1024
+
+
+def _cache_control(response, max_age: int, public: bool = False):
+    response.cache_control.no_cache = None
+    if public:
+        response.cache_control.private = None
+        response.cache_control.public = True
+    else:
+        response.cache_control.public = None
+        response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response
+
+
+class ETagCache:
+    """sha256 dos arquivos por (caminho, mtime, tamanho), com limite de entradas"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # caminho -> (mtime_ns, tamanho, etag)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, path: str, st: os.stat_result) -> str:
+        with self._lock:
+            item = self._entries.get(path)
+            if item is not None and item[:2] == (st.st_mtime_ns, st.st_size):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                h.update(chunk)
+        etag = h.hexdigest()
+        with self._lock:
+            self._entries[path] = (st.st_mtime_ns, st.st_size, etag)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entradas": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def send_pdf_file(path: str, etags: ETagCache, max_age: int, public: bool = False):
+    """PDF em disco com ETag forte, 304 e Range"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    response = send_file(path, mimetype=PDF_MIMETYPE, etag=etags.get(path, st),
+                         conditional=True, max_age=max_age, last_modified=st.st_mtime)
+    response.accept_ranges = "bytes"
+    return _cache_control(response, max_age, public)
+
+
+def row_etag(consulta: dict) -> str:
+    """Validador de um PDF renderizado a partir de uma linha de consultas"""
+    campos = (consulta["id"], consulta["created_at"], consulta["probabilidade"],
+              consulta["comorbidades_json"], consulta.get("model_version"))
+    return hashlib.sha256(repr(campos).encode("utf-8")).hexdigest()[:32]
+
+
+def send_pdf_rendered(render, etag: str, max_age: int, public: bool = False):
+    """Renderiza render(buffer) em memória e envia, ou 304 se o navegador já tem o PDF"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        buf = io.BytesIO()
+        render(buf)
+        buf.seek(0)
+        response = send_file(buf, mimetype=PDF_MIMETYPE, conditional=False)
+    response.set_etag(etag, weak=True)
+    response.accept_ranges = "none"
+    return _cache_control(response, max_age, public)
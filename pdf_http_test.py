@@ -0,0 +1,103 @@
+# Entrega dos PDFs com ETag, 304, Range e Cache-Control (pdf_http.py)
+import hashlib
+
+import pytest
+from flask import Flask
+
+from pdf_http import ETagCache, row_etag, send_pdf_file, send_pdf_rendered
+
+CONTEUDO = b"%PDF-1.4\n" + bytes(range(256)) * 40 + b"\n%%EOF\n"
+CONSULTA = {"id": 7, "created_at": "2024-01-10T10:00:00", "probabilidade": 0.42,
+            "comorbidades_json": '["SAH"]', "model_version": "v1"}
+
+
+@pytest.fixture()
+def client(tmp_path):
+    path = tmp_path / "consulta_7.pdf"
+    path.write_bytes(CONTEUDO)
+    etags = ETagCache()
+    app = Flask(__name__)
+    app.renders = 0
+
+    @app.route("/arquivo")
+    def arquivo():
+        return send_pdf_file(str(path), etags, 3600)
+
+    @app.route("/publico")
+    def publico():
+        return send_pdf_file(str(path), etags, 60, public=True)
+
+    @app.route("/memoria")
+    def memoria():
+        def render(buf):
+            app.renders += 1
+            buf.write(CONTEUDO)
+        return send_pdf_rendered(render, row_etag(CONSULTA), 3600)
+
+    client = app.test_client()
+    client.flask_app, client.etags = app, etags
+    return client
+
+
+def test_etag_forte_do_arquivo(client):
+    r = client.get("/arquivo")
+    assert r.status_code == 200 and r.data == CONTEUDO
+    etag, fraco = r.get_etag()
+    assert etag == hashlib.sha256(CONTEUDO).hexdigest() and not fraco
+    assert r.headers["Accept-Ranges"] == "bytes"
+    assert r.last_modified is not None
+    assert r.cache_control.private and r.cache_control.max_age == 3600 and not r.cache_control.public
+
+
+def test_hash_calculado_uma_vez(client):
+    client.get("/arquivo")
+    client.get("/arquivo")
+    assert client.etags.stats() == {"entradas": 1, "hits": 1, "misses": 1}
+
+
+def test_if_none_match_responde_304(client):
+    etag = client.get("/arquivo").get_etag()[0]
+    r = client.get("/arquivo", headers={"If-None-Match": f'"{etag}"'})
+    assert r.status_code == 304 and r.data == b""
+    assert client.get("/arquivo", headers={"If-None-Match": '"outro"'}).status_code == 200
+
+
+def test_range_responde_206(client):
+    r = client.get("/arquivo", headers={"Range": "bytes=100-199"})
+    assert r.status_code == 206 and r.data == CONTEUDO[100:200]
+    assert r.headers["Content-Range"] == f"bytes 100-199/{len(CONTEUDO)}"
+    r = client.get("/arquivo", headers={"Range": "bytes=-10"})
+    assert r.status_code == 206 and r.data == CONTEUDO[-10:]
+    assert r.headers["Content-Range"] == f"bytes {len(CONTEUDO) - 10}-{len(CONTEUDO) - 1}/{len(CONTEUDO)}"
+
+
+def test_range_fora_do_arquivo_responde_416(client):
+    r = client.get("/arquivo", headers={"Range": f"bytes={len(CONTEUDO) + 10}-"})
+    assert r.status_code == 416
+    assert r.headers["Content-Range"] == f"bytes */{len(CONTEUDO)}"
+
+
+def test_cache_control_publico_configuravel(client):
+    r = client.get("/publico")
+    assert r.cache_control.public and not r.cache_control.private and r.cache_control.max_age == 60
+
+
+def test_memoria_etag_fraco_sem_range(client):
+    r = client.get("/memoria", headers={"Range": "bytes=0-9"})
+    assert r.status_code == 200 and r.data == CONTEUDO  # Range ignorado
+    etag, fraco = r.get_etag()
+    assert fraco and etag == row_etag(CONSULTA)
+    assert r.headers["Accept-Ranges"] == "none"
+    assert r.cache_control.private
+
+
+def test_memoria_304_nao_renderiza(client):
+    client.get("/memoria")
+    r = client.get("/memoria", headers={"If-None-Match": f'W/"{row_etag(CONSULTA)}"'})
+    assert r.status_code == 304 and r.data == b""
+    assert client.flask_app.renders == 1
+
+
+def test_etag_da_linha_muda_com_a_predicao():
+    assert row_etag(CONSULTA) != row_etag({**CONSULTA, "probabilidade": 0.5})
+    assert row_etag(CONSULTA) != row_etag({**CONSULTA, "model_version": "v2"})
@@ -0,0 +1,102 @@
+# Geração de PDFs em segundo plano
+#
+# Pool de threads com fila limitada. Cada job é o id de uma linha de consultas;
+# a função render recebe esse id, gera o PDF e grava o status no banco. A
+# mesma fila roda as importações de arquivos (app.py, name="import-worker").
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PdfJobQueue:
+    """Fila limitada de jobs de PDF consumida por N threads daemon"""
+
+    def __init__(self, render, workers: int = 2, maxsize: int = 256, name: str = "pdf-worker"):
+        self.render = render
+        self.name = name
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._started = False
+
+    def _check_fork(self):
+        # Depois de um fork (workers do serve.py) as threads do pai não existem
+        # no filho e a fila/lock podem ter sido copiados num estado travado:
+        # recria tudo e, se o pai já tinha iniciado, inicia de novo
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._lock = threading.Lock()
+        self._threads = []
+        if self._started:
+            self.start()
+
+    def start(self):
+        self._check_fork()
+        with self._lock:
+            self._started = True
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                if job_id is None:
+                    return
+                self.render(job_id)
+            except Exception:
+                logger.exception("Erro no job de PDF %s", job_id)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, job_id) -> bool:
+        """Enfileira sem bloquear; False quando a fila está cheia"""
+        self._check_fork()
+        try:
+            self._queue.put_nowait(job_id)
+            return True
+        except queue.Full:
+            return False
+
+    def resume(self, job_ids):
+        """Reenfileira jobs pendentes numa thread própria (put bloqueante)"""
+        self._check_fork()
+        job_ids = list(job_ids)
+        if not job_ids:
+            return None
+        logger.info("Retomando %d jobs de PDF pendentes", len(job_ids))
+        t = threading.Thread(
+            target=lambda: [self._queue.put(j) for j in job_ids],
+            name="pdf-resume", daemon=True,
+        )
+        t.start()
+        return t
+
+    def pending(self) -> int:
+        self._check_fork()
+        return self._queue.qsize()
+
+    def join(self):
+        """Aguarda até a fila esvaziar (útil em testes e no desligamento)"""
+        self._queue.join()
+
+    def stop(self):
+        with self._lock:
+            self._started = False
+            for _ in self._threads:
+                self._queue.put(None)
+            for t in self._threads:
+                t.join()
+            self._threads = []
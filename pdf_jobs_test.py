@@ -0,0 +1,110 @@
+# Fila de jobs de PDF (pdf_jobs.py): execução, fila cheia, retomada e fork
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from pdf_jobs import PdfJobQueue
+
+
+class Render:
+    """render que registra os ids e pode ficar bloqueado até o teste liberar"""
+
+    def __init__(self, falhar=()):
+        self.ids = []
+        self.falhar = set(falhar)
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+    def __call__(self, job_id):
+        self.liberar.wait(10)
+        if job_id in self.falhar:
+            raise RuntimeError(f"falha no job {job_id}")
+        self.ids.append(job_id)
+
+
+def test_executa_os_jobs_e_sobrevive_a_erros():
+    render = Render(falhar={2})
+    fila = PdfJobQueue(render, workers=2)
+    fila.start()
+    try:
+        assert all(fila.submit(i) for i in range(5))
+        fila.join()
+        assert sorted(render.ids) == [0, 1, 3, 4]
+        # Os workers continuam vivos depois do erro
+        assert fila.submit(9)
+        fila.join()
+        assert 9 in render.ids
+    finally:
+        fila.stop()
+
+
+def test_fila_cheia_recusa_sem_bloquear():
+    fila = PdfJobQueue(Render(), workers=1, maxsize=2)
+    assert fila.submit(1) and fila.submit(2)
+    assert not fila.submit(3)
+    assert fila.pending() == 2
+
+
+def test_resume_enfileira_alem_do_limite():
+    render = Render()
+    render.liberar.clear()
+    fila = PdfJobQueue(render, workers=1, maxsize=2)
+    fila.start()
+    try:
+        t = fila.resume(range(6))
+        assert fila.resume([]) is None
+        render.liberar.set()
+        t.join(10)
+        fila.join()
+        assert render.ids == list(range(6))
+    finally:
+        fila.stop()
+
+
+def test_nome_das_threads():
+    fila = PdfJobQueue(Render(), workers=2, name="import-worker")
+    fila.start()
+    try:
+        nomes = {t.name for t in threading.enumerate()}
+        assert {"import-worker-0", "import-worker-1"} <= nomes
+    finally:
+        fila.stop()
+
+
+def _no_filho(fila, saida):
+    # As threads do pai não existem aqui: submit precisa recriar fila e workers
+    fila.submit(os.getpid())
+    fila.join()
+    saida.put((fila.render.ids, [t.name for t in threading.enumerate() if t.name.startswith("pdf-worker")]))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="sem os.fork")
+def test_reinicia_depois_do_fork():
+    fila = PdfJobQueue(Render(), workers=2)
+    fila.start()
+    try:
+        ctx = multiprocessing.get_context("fork")
+        saida = ctx.Queue()
+        p = ctx.Process(target=_no_filho, args=(fila, saida))
+        p.start()
+        ids, threads = saida.get(timeout=20)
+        p.join(10)
+        assert p.exitcode == 0
+        assert ids == [p.pid]
+        assert sorted(threads) == ["pdf-worker-0", "pdf-worker-1"]
+        # O pai segue com a fila e os workers dele
+        assert fila.render.ids == [] and fila.submit(1)
+        fila.join()
+        assert fila.render.ids == [1]
+    finally:
+        fila.stop()
+
+
+def test_fork_sem_start_nao_inicia_threads():
+    fila = PdfJobQueue(Render(), workers=1, maxsize=1)
+    fila.submit(1)
+    fila._pid = -1  # como se estivesse num processo filho
+    assert fila.pending() == 0  # fila recriada vazia
+    assert fila._threads == []
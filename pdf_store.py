@@ -0,0 +1,201 @@
+# Armazenamento dos PDFs das consultas em diretórios fragmentados
+#
+# O nome do PDF vem do id da consulta (único), não do horário: duas predições
+# no mesmo segundo não sobrescrevem uma à outra. Os arquivos ficam em dois
+# níveis de subdiretórios derivados do id, com no máximo 1000 PDFs por
+# diretório:
+#
+#   consultas/000/012/consulta_12345.pdf       (id 12345)
+#   consultas/001/234/consulta_1234567.pdf     (id 1234567)
+#
+# então download_pdf resolve o caminho direto do nome, sem listar diretórios.
+# O pdf_path de cada linha é preenchido por trigger no INSERT (mesma fórmula
+# de relative_path) e a gravação é atômica: arquivo temporário no mesmo
+# diretório + os.replace, então um download nunca vê um PDF pela metade.
+# PDFs de /predict/batch sem salvar_db não têm id: ficam em avulsos/AAAAMMDD/.
+#
+# Migração dos PDFs antigos (consulta_AAAAMMDD_HHMMSS.pdf, todos em consultas/):
+#   python pdf_store.py migrar [--db consultas.db] [--dir consultas]
+import argparse
+import logging
+import os
+import re
+import tempfile
+import uuid
+from datetime import datetime
+
+from werkzeug.utils import safe_join
+
+logger = logging.getLogger(__name__)
+
+SHARD_SIZE = 1000
+NAME_RE = re.compile(r"^(\d{3})/(\d{3})/consulta_(\d+)\.pdf$")
+ADHOC_RE = re.compile(r"^avulsos/\d{8}/[0-9a-f]{32}\.pdf$")
+MIGRATION_CHUNK = 500
+
+# pdf_path das linhas gravadas com PDF (pdf_status preenchido) e sem caminho
+TRIGGER_SQL = f'''
+CREATE TRIGGER IF NOT EXISTS trg_consultas_pdf_path AFTER INSERT ON consultas
+WHEN NEW.pdf_status IS NOT NULL AND NEW.pdf_path IS NULL
+BEGIN
+    UPDATE consultas
+    SET pdf_path = printf('%03d/%03d/consulta_%d.pdf',
+                          NEW.id / {SHARD_SIZE * SHARD_SIZE}, (NEW.id / {SHARD_SIZE}) % {SHARD_SIZE}, NEW.id)
+    WHERE id = NEW.id;
+END
+'''
+
+
+def relative_path(consulta_id: int) -> str:
+    """Caminho do PDF da consulta relativo ao diretório de PDFs"""
+    return (f"{consulta_id // (SHARD_SIZE * SHARD_SIZE):03d}/"
+            f"{consulta_id // SHARD_SIZE % SHARD_SIZE:03d}/consulta_{consulta_id}.pdf")
+
+
+def consulta_id_of(relative: str):
+    """Id da consulta de um caminho no formato de relative_path, ou None"""
+    m = NAME_RE.match(relative)
+    if m is None:
+        return None
+    consulta_id = int(m.group(3))
+    return consulta_id if relative_path(consulta_id) == relative else None
+
+
+def is_pdf_name(relative: str) -> bool:
+    """True para os nomes que este módulo gera (consulta por id ou avulso)
+
+    Só esses saem direto do disco em GET /consultas/<arquivo>; temporários de
+    write() e qualquer outro arquivo do diretório nunca são servidos.
+    """
+    return consulta_id_of(relative) is not None or ADHOC_RE.match(relative) is not None
+
+
+def adhoc_path() -> str:
+    """Caminho único para um PDF sem consulta gravada"""
+    return f"avulsos/{datetime.now().strftime('%Y%m%d')}/{uuid.uuid4().hex}.pdf"
+
+
+def init_tables(c):
+    """Trigger do pdf_path e tabela dos nomes antigos (chamado por db.init_db)"""
+    c.execute(TRIGGER_SQL)
+    # Nome antigo -> consulta, para os links gravados antes da migração
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS pdf_legado (
+        pdf_path TEXT PRIMARY KEY,
+        consulta_id INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+
+class PdfStore:
+    """Diretório de PDFs com caminhos fragmentados e gravação atômica"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, relative: str):
+        """Caminho absoluto, ou None se relative sair do diretório"""
+        return safe_join(self.root, relative)
+
+    def write(self, relative: str, render) -> str:
+        """Chama render(caminho_temporário) e publica o arquivo com os.replace"""
+        path = self.path(relative)
+        if path is None:
+            raise ValueError(f"caminho de PDF inválido: {relative}")
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            render(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return path
+
+
+def _link_or_copy(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        import shutil
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+
+def migrate(db, store: PdfStore) -> dict:
+    """Move os PDFs com nome antigo para relative_path(id) e atualiza consultas
+
+    Pode rodar com o backend no ar: o arquivo novo é criado (hard link) antes
+    de a linha mudar e o antigo só é apagado depois do commit. Quando dois PDFs
+    colidiram no mesmo nome o arquivo é da consulta mais recente; as demais, e
+    as consultas cujo arquivo sumiu, voltam para 'pending' (ou 'lazy') e o PDF
+    é refeito a partir da linha.
+    """
+    rows = db.query(
+        "SELECT id, pdf_path, pdf_status FROM consultas "
+        "WHERE pdf_path IS NOT NULL AND pdf_path NOT GLOB '[0-9][0-9][0-9]/[0-9][0-9][0-9]/*' "
+        "ORDER BY pdf_path, id DESC"
+    )
+    resumo = {"consultas": len(rows), "movidos": 0, "sem_arquivo": 0, "colisoes": 0}
+    dono = {}  # nome antigo -> consulta mais recente com esse nome
+    for row in rows:
+        dono.setdefault(row["pdf_path"], row["id"])
+
+    for start in range(0, len(rows), MIGRATION_CHUNK):
+        chunk = rows[start:start + MIGRATION_CHUNK]
+        updates, legado, antigos = [], [], []
+        for row in chunk:
+            consulta_id, antigo, status = row["id"], row["pdf_path"], row["pdf_status"]
+            novo = relative_path(consulta_id)
+            origem = store.path(antigo)
+            if dono[antigo] == consulta_id and origem is not None and os.path.isfile(origem):
+                _link_or_copy(origem, store.path(novo))
+                antigos.append(origem)
+                resumo["movidos"] += 1
+            else:
+                resumo["colisoes" if dono[antigo] != consulta_id else "sem_arquivo"] += 1
+                status = "lazy" if status == "lazy" else "pending"
+            updates.append((novo, status, consulta_id))
+            if dono[antigo] == consulta_id:
+                legado.append((antigo, consulta_id))
+        db.executemany("UPDATE consultas SET pdf_path = ?, pdf_status = ? WHERE id = ?", updates).result()
+        db.executemany("INSERT OR REPLACE INTO pdf_legado (pdf_path, consulta_id) VALUES (?, ?)", legado).result()
+        for origem in antigos:
+            os.remove(origem)
+        logger.info("Migração de PDFs: %d/%d consultas", start + len(chunk), len(rows))
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDFs das consultas em diretórios fragmentados")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    migrar = sub.add_parser("migrar", help="move os PDFs com nome antigo para o layout por id")
+    app_root = os.path.dirname(os.path.abspath(__file__))
+    migrar.add_argument("--db", default=os.getenv("DATACARE_DB_PATH", os.path.join(app_root, "consultas.db")))
+    migrar.add_argument("--dir", default=os.getenv("DATACARE_PDF_DIR", os.path.join(app_root, "consultas")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from db import Database
+    from schema import FEATURE_NAMES, SCHEMA_VERSION
+
+    db = Database(args.db)
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    try:
+        print(migrate(db, PdfStore(args.dir)))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Caminhos fragmentados por id e migração dos nomes antigos (pdf_store.py)
+import os
+
+import pytest
+
+from db import INSERT_CONSULTA_SQL, Database
+from pdf_store import PdfStore, adhoc_path, consulta_id_of, migrate, relative_path
+from schema import FEATURE_NAMES, SCHEMA_VERSION
+
+
+@pytest.mark.parametrize("consulta_id,esperado", [
+    (1, "000/000/consulta_1.pdf"),
+    (999, "000/000/consulta_999.pdf"),
+    (12345, "000/012/consulta_12345.pdf"),
+    (1234567, "001/234/consulta_1234567.pdf"),
+    (1234567890, "1234/567/consulta_1234567890.pdf"),
+])
+def test_caminho_por_id(consulta_id, esperado):
+    assert relative_path(consulta_id) == esperado
+
+
+def test_id_do_caminho():
+    assert consulta_id_of("000/012/consulta_12345.pdf") == 12345
+    assert consulta_id_of("000/013/consulta_12345.pdf") is None  # diretório errado
+    assert consulta_id_of("consulta_20240101_120000.pdf") is None
+    assert consulta_id_of("../000/000/consulta_1.pdf") is None
+    assert adhoc_path().startswith("avulsos/") and adhoc_path() != adhoc_path()
+
+
+def test_gravacao_atomica(tmp_path):
+    store = PdfStore(str(tmp_path))
+    path = store.write("000/000/consulta_1.pdf", lambda tmp: open(tmp, "wb").write(b"%PDF"))
+    assert open(path, "rb").read() == b"%PDF"
+
+    def falha(tmp):
+        open(tmp, "wb").write(b"pela metade")
+        raise RuntimeError("render")
+
+    with pytest.raises(RuntimeError):
+        store.write("000/000/consulta_1.pdf", falha)
+    assert open(path, "rb").read() == b"%PDF"
+    assert os.listdir(tmp_path / "000" / "000") == ["consulta_1.pdf"]
+    with pytest.raises(ValueError):
+        store.write("../fora.pdf", falha)
+
+
+def linha(pdf_path=None, pdf_status=None):
+    return ("p", "2024-01-01", 50.0, 1, 1.7, 70.0, 24.2, "[]", 0.5,
+            pdf_path, pdf_status, "2024-01-01T00:00:00", None)
+
+
+@pytest.fixture()
+def db(tmp_path):
+    db = Database(str(tmp_path / "consultas.db"))
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    yield db
+    db.close()
+
+
+def test_trigger_preenche_pdf_path(db):
+    ids = db.insert_many(INSERT_CONSULTA_SQL, [linha(pdf_status="pending"), linha(), linha("x.pdf", "done")]).result(5)
+    paths = dict(db.query("SELECT id, pdf_path FROM consultas"))
+    assert paths == {ids[0]: relative_path(ids[0]), ids[1]: None, ids[2]: "x.pdf"}
+
+
+def test_migracao_com_colisoes(tmp_path, db):
+    store = PdfStore(str(tmp_path / "consultas"))
+    for nome, conteudo in (("consulta_20240101_120000.pdf", b"dono"), ("consulta_20240102_090000.pdf", b"unico")):
+        with open(store.path(nome), "wb") as f:
+            f.write(conteudo)
+    ids = db.insert_many(INSERT_CONSULTA_SQL, [
+        linha("consulta_20240101_120000.pdf", "done"),   # colidiu com a seguinte
+        linha("consulta_20240101_120000.pdf", "lazy"),   # colidiu com a seguinte
+        linha("consulta_20240101_120000.pdf", "done"),   # mais recente: fica com o arquivo
+        linha("consulta_20240102_090000.pdf", "done"),
+        linha("consulta_20240103_000000.pdf", "done"),   # arquivo sumiu
+    ]).result(5)
+
+    resumo = migrate(db, store)
+    assert resumo == {"consultas": 5, "movidos": 2, "sem_arquivo": 1, "colisoes": 2}
+
+    linhas = {r["id"]: (r["pdf_path"], r["pdf_status"]) for r in db.query("SELECT * FROM consultas")}
+    assert linhas == {
+        ids[0]: (relative_path(ids[0]), "pending"),
+        ids[1]: (relative_path(ids[1]), "lazy"),
+        ids[2]: (relative_path(ids[2]), "done"),
+        ids[3]: (relative_path(ids[3]), "done"),
+        ids[4]: (relative_path(ids[4]), "pending"),  # refeito pela fila de PDFs
+    }
+    assert open(store.path(relative_path(ids[2])), "rb").read() == b"dono"
+    assert open(store.path(relative_path(ids[3])), "rb").read() == b"unico"
+    assert not os.path.exists(store.path("consulta_20240101_120000.pdf"))
+    assert not os.path.exists(store.path(relative_path(ids[0])))
+    # Links antigos continuam achando a consulta dona do arquivo
+    assert dict(db.query("SELECT pdf_path, consulta_id FROM pdf_legado")) == {
+        "consulta_20240101_120000.pdf": ids[2],
+        "consulta_20240102_090000.pdf": ids[3],
+        "consulta_20240103_000000.pdf": ids[4],
+    }
+    # Rodar de novo não encontra mais nada
+    assert migrate(db, store)["consultas"] == 0
@@ -0,0 +1,174 @@
+# Profiling amostrado de requests (cProfile)
+#
+# Uma fração dos requests (ou os que pedem pelo header) roda com o cProfile
+# ligado. O resultado fica num buffer circular com os últimos N perfis e pode
+# ser baixado em três formatos:
+#   pstats     arquivo binário do pstats (python -m pstats, snakeviz)
+#   texto      tabela do pstats ordenada por cumulative, tottime ou calls
+#   collapsed  pilhas "a;b;c microssegundos" para flamegraph.pl / speedscope
+#
+# O cProfile só guarda arestas chamador -> chamado, não pilhas completas: no
+# formato collapsed o tempo de uma função chamada de vários lugares é dividido
+# entre as pilhas na proporção do tempo gasto a partir de cada chamador.
+#
+# A partir do Python 3.12 o cProfile usa sys.monitoring, que vale para o
+# processo inteiro: enquanto um request é perfilado, as funções que as outras
+# threads do worker gthread executam (requests concorrentes, fila de PDFs,
+# watcher do modelo) também entram no perfil. Para perfis só do request, rode
+# o serve.py com DATACARE_THREADS=1 enquanto investiga.
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+from collections import deque, defaultdict
+from datetime import datetime
+
+FORMATS = ("pstats", "texto", "collapsed")
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+# Limites da reconstrução das pilhas (recursão profunda e ramos desprezíveis)
+MAX_DEPTH = 64
+MIN_US = 1
+
+
+class ProfileError(ValueError):
+    """Formato ou ordenação inválidos (vira HTTP 400)"""
+
+
+class _Snapshot:
+    """Dicionário de stats do cProfile no formato que pstats.Stats aceita"""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == "~":  # funções nativas: ('~', 0, "<built-in method ...>")
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats: dict) -> str:
+    """Pilhas no formato collapsed a partir dos stats do cProfile (valores em µs)"""
+    filhos = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, caller_stats in callers.items():
+            filhos[caller].append((func, caller_stats[3]))
+    totais = defaultdict(float)
+
+    def visitar(func, pilha, caminho, fracao):
+        _, _, tt, ct, _ = stats[func]
+        pilha = pilha + (_label(func),)
+        if tt * fracao * 1e6 >= MIN_US:
+            totais[";".join(pilha)] += tt * fracao
+        if len(pilha) >= MAX_DEPTH:
+            return
+        for filho, ct_do_chamador in filhos.get(func, ()):
+            ct_filho = stats[filho][3]
+            if filho in caminho or ct_filho <= 0:
+                continue
+            # Parte do tempo total do filho que veio desta pilha
+            fracao_filho = fracao * ct_do_chamador / ct_filho
+            if ct_filho * fracao_filho * 1e6 >= MIN_US:
+                visitar(filho, pilha, caminho | {filho}, fracao_filho)
+
+    for func, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            visitar(func, (), frozenset((func,)), 1.0)
+    return "".join(f"{pilha} {round(t * 1e6)}\n" for pilha, t in sorted(totais.items()))
+
+
+class RequestProfiler:
+    """Decide quais requests perfilar e guarda os últimos perfis"""
+
+    def __init__(self, sample_rate: float = 0.0, keep: int = 20):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.skipped = 0
+        self._profiles = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Um perfil ativo por vez: a partir do Python 3.12 o cProfile não pode
+        # ser ligado em duas threads ao mesmo tempo (e registra todas elas)
+        self._active = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """cProfile ligado na thread atual, ou None se outro request já está sendo perfilado"""
+        if not self._active.acquire(blocking=False):
+            self.skipped += 1
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # outra ferramenta de profiling já ativa
+            self._active.release()
+            self.skipped += 1
+            return None
+        return prof
+
+    def stop(self, prof, **info) -> int:
+        """Desliga o perfil, guarda no buffer e devolve o id"""
+        prof.disable()
+        self._active.release()
+        prof.create_stats()
+        perfil = {
+            "id": next(self._ids),
+            "pid": os.getpid(),
+            "criado_em": datetime.now().isoformat(timespec="milliseconds"),
+            **info,
+            "stats": prof.stats,
+        }
+        with self._lock:
+            self._profiles.append(perfil)
+        return perfil["id"]
+
+    def list(self) -> list:
+        with self._lock:
+            perfis = list(self._profiles)
+        return [{k: v for k, v in p.items() if k != "stats"} for p in reversed(perfis)]
+
+    def get(self, profile_id: int):
+        with self._lock:
+            return next((p for p in self._profiles if p["id"] == profile_id), None)
+
+    def merged(self, endpoint: str = None):
+        """Stats somados de todos os perfis guardados (ou só de um endpoint)"""
+        with self._lock:
+            perfis = [p for p in self._profiles if endpoint is None or p.get("endpoint") == endpoint]
+        if not perfis:
+            return None
+        # Cópia: Stats.add altera o dicionário do primeiro perfil
+        total = pstats.Stats(_Snapshot(dict(perfis[0]["stats"])))
+        for p in perfis[1:]:
+            total.add(_Snapshot(p["stats"]))
+        return total.stats
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+def render(stats: dict, formato: str, ordem: str = "cumulative", limite: int = 50):
+    """(conteúdo, mimetype) do perfil no formato pedido"""
+    if formato not in FORMATS:
+        raise ProfileError(f"'formato' deve ser um de: {', '.join(FORMATS)}")
+    if formato == "pstats":
+        return marshal.dumps(stats), "application/octet-stream"
+    if formato == "collapsed":
+        return collapsed_stacks(stats), "text/plain; charset=utf-8"
+    if ordem not in SORT_KEYS:
+        raise ProfileError(f"'ordem' deve ser um de: {', '.join(SORT_KEYS)}")
+    buf = io.StringIO()
+    pstats.Stats(_Snapshot(stats), stream=buf).sort_stats(ordem).print_stats(max(1, limite))
+    return buf.getvalue(), "text/plain; charset=utf-8"
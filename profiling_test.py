@@ -0,0 +1,98 @@
+# Perfis de requests (profiling.py): buffer, um perfil por vez e formato collapsed
+import marshal
+import threading
+
+import pytest
+
+from profiling import ProfileError, RequestProfiler, collapsed_stacks, render
+
+MAIN = ("app.py", 10, "main")
+A = ("app.py", 20, "a")
+B = ("/lib/b.py", 30, "b")
+LEN = ("~", 0, "<built-in method builtins.len>")
+
+# main (1 s próprio) chama a e b; a (2 s) chama b; b (4 s no total) vem 3/4 de a
+STATS = {
+    MAIN: (1, 1, 1.0, 8.0, {}),
+    A: (1, 1, 2.0, 5.0, {MAIN: (1, 1, 2.0, 5.0)}),
+    B: (2, 2, 4.0, 4.0, {MAIN: (1, 1, 1.0, 1.0), A: (1, 1, 3.0, 3.0)}),
+    LEN: (1, 1, 0.0000001, 0.0000001, {A: (1, 1, 0.0000001, 0.0000001)}),
+}
+
+
+def test_collapsed_reparte_o_tempo_pelos_chamadores():
+    linhas = dict(l.rsplit(" ", 1) for l in collapsed_stacks(STATS).splitlines())
+    assert linhas == {
+        "main (app.py:10)": "1000000",
+        "main (app.py:10);a (app.py:20)": "2000000",
+        "main (app.py:10);a (app.py:20);b (b.py:30)": "3000000",
+        "main (app.py:10);b (b.py:30)": "1000000",
+    }  # len ficou abaixo de MIN_US
+
+
+def test_collapsed_com_recursao():
+    f = ("m.py", 1, "f")
+    stats = {
+        MAIN: (1, 1, 0.5, 2.5, {}),
+        f: (3, 1, 2.0, 2.0, {MAIN: (1, 1, 2.0, 2.0), f: (2, 2, 1.0, 1.0)}),
+    }
+    assert collapsed_stacks(stats) == "main (app.py:10) 500000\nmain (app.py:10);f (m.py:1) 2000000\n"
+
+
+def trabalho():
+    return sum(len(str(i)) for i in range(2000))
+
+
+def perfilar(profiler, **info):
+    prof = profiler.start()
+    assert prof is not None
+    trabalho()
+    return profiler.stop(prof, **info)
+
+
+def test_buffer_guarda_os_ultimos():
+    profiler = RequestProfiler(keep=2)
+    ids = [perfilar(profiler, endpoint=e) for e in ("predict", "health", "predict")]
+    assert ids == [1, 2, 3]
+    assert [p["id"] for p in profiler.list()] == [3, 2]
+    assert profiler.get(1) is None and "stats" not in profiler.list()[0]
+    nomes = {func[2] for func in profiler.get(3)["stats"]}
+    assert "trabalho" in nomes
+
+    um = profiler.get(3)["stats"]
+    chave = next(f for f in um if f[2] == "trabalho")
+    assert profiler.merged("predict")[chave][1] == um[chave][1]
+    assert profiler.merged()[chave][1] == 2 * um[chave][1]
+    assert profiler.merged("inexistente") is None
+    # merged não altera os perfis guardados
+    assert profiler.get(3)["stats"][chave] == um[chave]
+
+
+def test_um_perfil_por_vez():
+    profiler = RequestProfiler()
+    prof = profiler.start()
+    try:
+        resultado = []
+        t = threading.Thread(target=lambda: resultado.append(profiler.start()))
+        t.start()
+        t.join(5)
+        assert resultado == [None] and profiler.skipped == 1
+    finally:
+        profiler.stop(prof)
+    perfilar(profiler)  # liberado depois do stop
+
+
+def test_amostragem():
+    assert not RequestProfiler(0).should_sample()
+    assert RequestProfiler(1.0).should_sample()
+
+
+def test_formatos():
+    assert marshal.loads(render(STATS, "pstats")[0]) == STATS
+    texto, mimetype = render(STATS, "texto", "tottime", 2)
+    assert mimetype.startswith("text/plain") and "b.py:30(b)" in texto
+    assert render(STATS, "collapsed")[0] == collapsed_stacks(STATS)
+    with pytest.raises(ProfileError):
+        render(STATS, "svg")
+    with pytest.raises(ProfileError):
+        render(STATS, "texto", "nome")
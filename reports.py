@@ -0,0 +1,148 @@
+# Relatórios PDF de consulta (ReportLab)
+#
+# As partes fixas do relatório (título e cabeçalhos de seção) são desenhadas
+# uma única vez por documento como Form XObjects e reaproveitadas em cada
+# página, o que torna barato gerar vários relatórios num só PDF (render_batch).
+from datetime import datetime
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from schema import EN_TO_PT
+
+# Os streams continuam comprimidos com zlib; a codificação ASCII85 (em Python
+# puro quando o rl_accel não está instalado) só aumentava o arquivo e o tempo
+rl_config.useA85 = 0
+
+
+class ReportTemplate:
+    """Layout do relatório; criado uma vez e compartilhado entre chamadas"""
+
+    FORM_PAGE = "datacare_pagina"
+    FORM_CONTINUATION = "datacare_continuacao"
+
+    def __init__(self, pagesize=A4, margin=40):
+        self.pagesize = pagesize
+        self.width, self.height = pagesize
+        self.margin = margin
+        self.col2 = self.width / 2
+
+        # Posições fixas da primeira página (mesma sequência de y do layout original)
+        top = self.height - margin
+        self.y_title = top
+        self.y_patient_header = top - 30
+        self.y_patient_rows = [top - 50, top - 65, top - 80, top - 95]
+        self.y_result_header = top - 120
+        self.y_result = top - 140
+        self.y_comorb_header = top - 165
+        self.y_comorb_start = top - 185
+        self.y_continuation_start = top - 20
+        self.y_page_break = margin + 50
+        self.y_footer = margin + 30
+
+    def _ensure_forms(self, c):
+        # Form XObjects pertencem ao documento: define uma vez por canvas
+        if getattr(c, "_datacare_forms", False):
+            return
+        m = self.margin
+
+        c.beginForm(self.FORM_PAGE)
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(m, self.y_title, "Relatório de Consulta - Avaliação de Risco de Diabetes")
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(m, self.y_patient_header, "Dados do Paciente:")
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(m, self.y_result_header, "Resultado da Avaliação:")
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(m, self.y_comorb_header, "Comorbidades Identificadas:")
+        c.endForm()
+
+        c.beginForm(self.FORM_CONTINUATION)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(m, self.height - m, "Comorbidades Identificadas (continuação):")
+        c.endForm()
+
+        c._datacare_forms = True
+
+    def draw(self, c, consulta_info: dict, selected_names_pt: list, prob: float, gerado_em: str):
+        """Desenha um relatório a partir da página atual do canvas"""
+        self._ensure_forms(c)
+        m, col2 = self.margin, self.col2
+        c.doForm(self.FORM_PAGE)
+
+        # Informações do paciente
+        c.setFont("Helvetica", 10)
+        y1, y2, y3, y4 = self.y_patient_rows
+        c.drawString(m, y1, f"Nome: {consulta_info.get('nome', '-')}")
+        c.drawString(col2, y1, f"Data da Consulta: {consulta_info.get('data_consulta', '-')}")
+        c.drawString(m, y2, f"Idade: {consulta_info.get('patient_age', '-')} anos")
+        c.drawString(col2, y2, f"Sexo: {'Masculino' if consulta_info.get('patient_sex', 1) == 1 else 'Feminino'}")
+
+        # Converter altura para cm para exibição
+        altura_m = consulta_info.get('altura', 0)
+        altura_cm = altura_m * 100 if altura_m else 0
+        c.drawString(m, y3, f"Altura: {altura_cm:.0f} cm ({altura_m:.2f} m)")
+        c.drawString(col2, y3, f"Peso: {consulta_info.get('peso', '-')} kg")
+        c.drawString(m, y4, f"IMC: {consulta_info.get('imc', '-')}")
+
+        # Resultado da predição
+        c.setFont("Helvetica", 12)
+        c.drawString(m, self.y_result, f"Probabilidade de Diabetes Tipo 2: {prob:.2f}%")
+
+        # Comorbidades
+        c.setFont("Helvetica", 10)
+        y = self.y_comorb_start
+        if selected_names_pt:
+            for name in selected_names_pt:
+                if y < self.y_page_break:  # Verifica se precisa de nova página
+                    c.showPage()
+                    c.doForm(self.FORM_CONTINUATION)
+                    y = self.y_continuation_start
+                    c.setFont("Helvetica", 10)
+
+                # Usa o nome em português do mapeamento
+                nome_pt = EN_TO_PT.get(name, name)
+                c.drawString(m + 10, y, f"• {nome_pt}")
+                y -= 14
+        else:
+            c.drawString(m + 10, y, "Nenhuma comorbidade identificada")
+
+        # Rodapé
+        c.setFont("Helvetica-Oblique", 8)
+        c.drawString(m, self.y_footer, f"Documento gerado em: {gerado_em}")
+
+
+DEFAULT_TEMPLATE = ReportTemplate()
+
+
+def _gerado_em():
+    return datetime.now().strftime('%d/%m/%Y às %H:%M')
+
+
+def render_report(consulta_info: dict, selected_names_pt: list, prob: float, filename,
+                  template: ReportTemplate = DEFAULT_TEMPLATE):
+    """Um relatório por arquivo; filename pode ser um caminho ou um arquivo binário"""
+    c = canvas.Canvas(filename, pagesize=template.pagesize)
+    template.draw(c, consulta_info, selected_names_pt, prob, _gerado_em())
+    c.save()
+
+
+def render_batch(consultas, filename, template: ReportTemplate = DEFAULT_TEMPLATE) -> int:
+    """Vários relatórios num único PDF multipágina, numa só passada
+
+    consultas é um iterável de (consulta_info, selected_names_pt, prob).
+    Retorna o número de relatórios escritos.
+    """
+    c = canvas.Canvas(filename, pagesize=template.pagesize)
+    gerado_em = _gerado_em()
+    n = 0
+    for consulta_info, selected_names_pt, prob in consultas:
+        if n:
+            c.showPage()
+        template.draw(c, consulta_info, selected_names_pt, prob, gerado_em)
+        n += 1
+    if n == 0:
+        c.drawString(template.margin, template.y_title, "Nenhuma consulta selecionada")
+    c.save()
+    return n
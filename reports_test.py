@@ -0,0 +1,93 @@
+# Relatórios PDF (reports.py): um template compartilhado entre documentos e páginas
+import io
+import re
+import zlib
+
+from reports import DEFAULT_TEMPLATE, ReportTemplate, render_batch, render_report
+
+ANA = ({"nome": "Ana Souza", "data_consulta": "2024-01-10", "patient_age": 50.0, "patient_sex": 2,
+        "altura": 1.6, "peso": 60.0, "imc": 23.4}, ["SAH", "obesity"], 12.5)
+BRUNO = ({"nome": "Bruno Lima", "data_consulta": "2024-02-20", "patient_age": 71.0, "patient_sex": 1,
+          "altura": 1.8, "peso": 95.0, "imc": 29.3}, [], 81.25)
+
+
+def objetos(pdf: bytes) -> dict:
+    return {int(n): corpo for n, corpo in re.findall(rb"(\d+) 0 obj(.*?)endobj", pdf, re.S)}
+
+
+def conteudo(corpo: bytes) -> bytes:
+    stream = re.search(rb"stream\r?\n(.*)endstream", corpo, re.S).group(1)
+    return zlib.decompressobj().decompress(stream)
+
+
+def paginas(pdf: bytes) -> list:
+    """[(texto da página, {nome do Form XObject: texto do form})] na ordem do documento"""
+    assert pdf.startswith(b"%PDF-") and pdf.rstrip().endswith(b"%%EOF")
+    objs = objetos(pdf)
+    raiz = next(c for c in objs.values() if b"/Type /Pages" in c)
+    kids = [int(n) for n in re.findall(rb"(\d+) 0 R", re.search(rb"/Kids \[(.*?)\]", raiz).group(1))]
+    resultado = []
+    for kid in kids:
+        pagina = objs[kid]
+        texto = conteudo(objs[int(re.search(rb"/Contents (\d+) 0 R", pagina).group(1))])
+        forms = {nome.decode(): conteudo(objs[int(n)])
+                 for nome, n in re.findall(rb"/(FormXob\.\w+) (\d+) 0 R", pagina)}
+        resultado.append((texto, forms))
+    return resultado
+
+
+def render(template, *relatorio) -> bytes:
+    buf = io.BytesIO()
+    render_report(*relatorio, buf, template=template)
+    return buf.getvalue()
+
+
+def confere(texto: bytes, forms: dict, proprio, outro):
+    # Os dados do paciente ficam na página; o layout fixo no Form XObject
+    assert f"Nome: {proprio[0]['nome']}".encode() in texto
+    assert f"{proprio[2]:.2f}%".encode() in texto
+    assert outro[0]["nome"].encode() not in texto
+    assert b"/FormXob.datacare_pagina Do" in texto
+    assert b"Dados do Paciente:" in forms["FormXob.datacare_pagina"]
+    assert b"Dados do Paciente:" not in texto
+
+
+def test_dois_documentos_com_o_mesmo_template():
+    template = ReportTemplate()
+    for t in (template, DEFAULT_TEMPLATE):
+        # O segundo documento precisa definir os forms de novo (não herda do primeiro canvas)
+        [(texto_ana, forms_ana)] = paginas(render(t, *ANA))
+        [(texto_bruno, forms_bruno)] = paginas(render(t, *BRUNO))
+        confere(texto_ana, forms_ana, ANA, BRUNO)
+        confere(texto_bruno, forms_bruno, BRUNO, ANA)
+        assert b"Hipertens" in texto_ana and b"Nenhuma comorbidade" in texto_bruno
+
+
+def test_lote_reaproveita_os_forms():
+    buf = io.BytesIO()
+    assert render_batch([ANA, BRUNO], buf) == 2
+    pdf = buf.getvalue()
+    (texto_ana, forms_ana), (texto_bruno, forms_bruno) = paginas(pdf)
+    confere(texto_ana, forms_ana, ANA, BRUNO)
+    confere(texto_bruno, forms_bruno, BRUNO, ANA)
+    # Um objeto por form no documento, referenciado pelas duas páginas
+    assert sum(1 for c in objetos(pdf).values() if b"/FormType 1" in c) == 2
+    assert re.findall(rb"/FormXob.datacare_pagina (\d+) 0 R", pdf)[0] == \
+        re.findall(rb"/FormXob.datacare_pagina (\d+) 0 R", pdf)[-1]
+
+
+def test_continuacao_das_comorbidades():
+    muitas = [f"comorbidade {i}" for i in range(60)]
+    buf = io.BytesIO()
+    render_batch([(ANA[0], muitas, 10.0), BRUNO], buf)
+    textos = [texto for texto, _ in paginas(buf.getvalue())]
+    assert len(textos) == 3
+    assert b"FormXob.datacare_continuacao Do" in textos[1] and b"comorbidade 59" in textos[1]
+    assert b"Bruno Lima" in textos[2]
+
+
+def test_lote_vazio():
+    buf = io.BytesIO()
+    assert render_batch([], buf) == 0
+    [(texto, _)] = paginas(buf.getvalue())
+    assert b"Nenhuma consulta selecionada" in texto
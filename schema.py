@@ -0,0 +1,322 @@
+# Schema de features compartilhado por app.py, model.py e front.py
+#
+# Fonte única dos nomes de features, rótulos EN->PT e categorias do front.
+# As comorbidades são codificadas como bitmask inteiro (bit i = COMORBIDITY_NAMES[i])
+# e SCHEMA_VERSION permite detectar na inicialização um modelo, banco ou front
+# gerados com outra lista de features.
+import hashlib
+import json
+
+import numpy as np
+
+# Feature names confirmadas (ordem das colunas do modelo)
+FEATURE_NAMES = [
+    "patient_age","patient_sex","SAH","acute myocardium infarct","adrenal hypoplasia","albinism",
+    "alzheimer","anemia","aneurysm","ankylosing spondylitis","arrhythmia","arthrosis","asthma",
+    "behcet","brain tumor","breast cancer","cardiac insufficiency","cardiopathy","catheterism",
+    "cerebral palsy","chron disease","chronic kidney disease","cirrhosis","cone dystrophy","devic",
+    "dialysis","down syndrome","dyslipidemia","fibromyalgia","hashimoto disease","hepatic cancer",
+    "hepatic transplant","hepatitis c","herpetic encephalitis","hipocolesterolemia",
+    "human immunodeficiency virus","hydrocephalus","hypercholesterolemia","hypertriglyceridemia",
+    "hypophysis adenoma","intestinal cancer","intracranial hypertension","kidney transplant","leucemia",
+    "lung cancer","lymphoma","mccune albright","meningioma","migraine","muscular dystrophy",
+    "neurofibromatosis","obesity","osteoporosis","policitemia vera","prolactinoma","prostatic hyperplasia",
+    "psoriasis","pulmonary embolism","sarcoidosis","sickle cell anemia","sjogren","tabagism",
+    "valvulopathy","vasculitis","vitiligo","AVC","doenca_chagas","trombose_venosa_profunda",
+    "cloroquina","hipotireoidismo","hipertireoidismo","esclerose_multipla","artrite"
+]
+
+# EN->PT para labels PDF
+EN_TO_PT = {
+    "patient_age": "Idade",
+    "patient_sex": "Sexo",
+    "SAH": "Hipertensão Arterial Sistêmica (HAS)",
+    "acute myocardium infarct": "Infarto Agudo do Miocárdio",
+    "adrenal hypoplasia": "Hipoplasia Adrenal",
+    "albinism": "Albinismo",
+    "alzheimer": "Alzheimer",
+    "anemia": "Anemia",
+    "aneurysm": "Aneurisma",
+    "ankylosing spondylitis": "Espondilite Anquilosante",
+    "arrhythmia": "Arritmia",
+    "arthrosis": "Artrose",
+    "asthma": "Asma",
+    "behcet": "Doença de Behçet",
+    "brain tumor": "Tumor Cerebral",
+    "breast cancer": "Câncer de Mama",
+    "cardiac insufficiency": "Insuficiência Cardíaca",
+    "cardiopathy": "Cardiopatia",
+    "catheterism": "Cateterismo",
+    "cerebral palsy": "Paralisia Cerebral",
+    "chron disease": "Doença de Crohn",
+    "chronic kidney disease": "Doença Renal Crônica",
+    "cirrhosis": "Cirrose",
+    "cone dystrophy": "Distrofia de Cones",
+    "devic": "Síndrome de Devic",
+    "dialysis": "Diálise",
+    "down syndrome": "Síndrome de Down",
+    "dyslipidemia": "Dislipidemia",
+    "fibromyalgia": "Fibromialgia",
+    "hashimoto disease": "Doença de Hashimoto",
+    "hepatic cancer": "Câncer Hepático",
+    "hepatic transplant": "Transplante Hepático",
+    "hepatitis c": "Hepatite C",
+    "herpetic encephalitis": "Encefalite Herpética",
+    "hipocolesterolemia": "Hipocolesterolemia",
+    "human immunodeficiency virus": "HIV",
+    "hydrocephalus": "Hidrocefalia",
+    "hypercholesterolemia": "Hipercolesterolemia",
+    "hypertriglyceridemia": "Hipertrigliceridemia",
+    "hypophysis adenoma": "Adenoma de Hipófise",
+    "intestinal cancer": "Câncer Intestinal",
+    "intracranial hypertension": "Hipertensão Intracraniana",
+    "kidney transplant": "Transplante Renal",
+    "leucemia": "Leucemia",
+    "lung cancer": "Câncer de Pulmão",
+    "lymphoma": "Linfoma",
+    "mccune albright": "Síndrome de McCune-Albright",
+    "meningioma": "Meningioma",
+    "migraine": "Enxaqueca",
+    "muscular dystrophy": "Distrofia Muscular",
+    "neurofibromatosis": "Neurofibromatose",
+    "obesity": "Obesidade",
+    "osteoporosis": "Osteoporose",
+    "policitemia vera": "Policitemia Vera",
+    "prolactinoma": "Prolactinoma",
+    "prostatic hyperplasia": "Hiperplasia Prostática",
+    "psoriasis": "Psoríase",
+    "pulmonary embolism": "Embolia Pulmonar",
+    "sarcoidosis": "Sarcoidose",
+    "sickle cell anemia": "Anemia Falciforme",
+    "sjogren": "Síndrome de Sjögren",
+    "tabagism": "Tabagismo",
+    "valvulopathy": "Valvulopatia",
+    "vasculitis": "Vasculite",
+    "vitiligo": "Vitiligo",
+    "AVC": "Acidente Vascular Cerebral (AVC)",
+    "doenca_chagas": "Doença de Chagas",
+    "trombose_venosa_profunda": "Trombose Venosa Profunda",
+    "cloroquina": "Uso de Cloroquina",
+    "hipotireoidismo": "Hipotireoidismo",
+    "hipertireoidismo": "Hipertireoidismo",
+    "esclerose_multipla": "Esclerose Múltipla",
+    "artrite": "Artrite"
+}
+
+# Categorias de comorbidades exibidas no front (rótulos PT da interface)
+CATEGORIES = {
+    "Cardiovasculares": {
+        "SAH": "Hipertensão arterial sistêmica (HAS)",
+        "acute myocardium infarct": "Infarto agudo do miocárdio",
+        "cardiac insufficiency": "Insuficiência cardíaca",
+        "cardiopathy": "Cardiopatia",
+        "arrhythmia": "Arritmia",
+        "pulmonary embolism": "Embolia pulmonar",
+        "valvulopathy": "Valvulopatia",
+        "aneurysm": "Aneurisma",
+        "catheterism": "Cateterismo"
+    },
+    "Neurológicas": {
+        "AVC": "Acidente cerebrovascular (AVC)",
+        "brain tumor": "Tumor cerebral",
+        "migraine": "Enxaqueca",
+        "intracranial hypertension": "Hipertensão intracraniana",
+        "meningioma": "Meningioma",
+        "hydrocephalus": "Hidrocefalia",
+        "devic": "Síndrome de Devic",
+        "cerebral palsy": "Paralisia cerebral",
+        "esclerose_multipla": "Esclerose múltipla"
+    },
+    "Respiratórias / Pulmonares": {
+        "asthma": "Asma"
+    },
+    "Endócrinas / Metabólicas": {
+        "hipotireoidismo": "Hipotireoidismo",
+        "hipertireoidismo": "Hipertireoidismo",
+        "hypercholesterolemia": "Hipercolesterolemia",
+        "hypertriglyceridemia": "Hipertrigliceridemia",
+        "hipocolesterolemia": "Hipocolesterolemia",
+        "hypophysis adenoma": "Adenoma da hipófise",
+        "obesity": "Obesidade"
+    },
+    "Renais / Hepáticas": {
+        "chronic kidney disease": "Doença renal crônica",
+        "kidney transplant": "Transplante renal",
+        "dialysis": "Diálise",
+        "cirrhosis": "Cirrose",
+        "hepatic transplant": "Transplante hepático",
+        "hepatic cancer": "Câncer hepático"
+    },
+    "Hematológicas / Imunológicas": {
+        "anemia": "Anemia",
+        "sickle cell anemia": "Anemia falciforme",
+        "leucemia": "Leucemia",
+        "lymphoma": "Linfoma",
+        "sjogren": "Síndrome de Sjögren",
+        "sarcoidosis": "Sarcoidose",
+        "dyslipidemia": "Dislipidemia"
+    },
+    "Autoimunes / Inflamatórias": {
+        "behcet": "Doença de Behçet",
+        "fibromyalgia": "Fibromialgia",
+        "psoriasis": "Psoríase",
+        "vasculitis": "Vasculite",
+        "artrite": "Artrite",
+        "arthrosis": "Artrose"
+    },
+    "Oncológicas": {
+        "breast cancer": "Câncer de mama",
+        "lung cancer": "Câncer de pulmão",
+        "intestinal cancer": "Câncer intestinal"
+    },
+    "Genéticas / Congênitas": {
+        "down syndrome": "Síndrome de Down",
+        "albinism": "Albinismo",
+        "mccune albright": "Síndrome de McCune-Albright",
+        "neurofibromatosis": "Neurofibromatose",
+        "policitemia vera": "Policitemia vera"
+    },
+    "Outras": {
+        "osteoporosis": "Osteoporose",
+        "prolactinoma": "Prolactinoma",
+        "prostatic hyperplasia": "Hiperplasia prostática",
+        "vitiligo": "Vitiligo",
+        "tabagism": "Tabagismo",
+        "human immunodeficiency virus": "Vírus da imunodeficiência humana (HIV)",
+        "hepatitis c": "Hepatite C",
+        "trombose_venosa_profunda": "Trombose venosa profunda",
+        "doenca_chagas": "Doença de Chagas",
+        "cloroquina": "Cloroquina"
+    }
+}
+
+# Colunas 0 e 1 são idade e sexo; as demais são comorbidades binárias
+COMORBIDITY_OFFSET = 2
+COMORBIDITY_NAMES = FEATURE_NAMES[COMORBIDITY_OFFSET:]
+N_FEATURES = len(FEATURE_NAMES)
+
+# Sexo: patient_sex = 2 para feminino, 1 para o resto. Valores (texto já em
+# minúsculas e sem espaços) lidos como feminino no payload e na importação
+FEMALE_VALUES = ("f", "feminino", "female", "2", "2.0")
+
+
+def parse_sex(value) -> int:
+    """patient_sex (1 ou 2) de um valor de sexo do payload ou de um arquivo"""
+    return 2 if str(value).strip().lower() in FEMALE_VALUES else 1
+
+
+# Índices pré-computados (nome -> coluna / nome -> bit)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+COMORBIDITY_INDEX = {name: i for i, name in enumerate(COMORBIDITY_NAMES)}
+
+# Rótulo PT da interface para cada comorbidade das categorias
+CATEGORY_LABELS = {en: label for itens in CATEGORIES.values() for en, label in itens.items()}
+
+# Hash da lista ordenada de features; muda sempre que a ordem ou os nomes mudam
+SCHEMA_VERSION = hashlib.sha256(
+    json.dumps(FEATURE_NAMES, ensure_ascii=False).encode("utf-8")
+).hexdigest()[:12]
+
+
+def encode_comorbidities(names) -> int:
+    """Bitmask das comorbidades conhecidas em names (as desconhecidas são ignoradas)"""
+    mask = 0
+    for name in names:
+        if isinstance(name, str):
+            bit = COMORBIDITY_INDEX.get(name)
+            if bit is not None:
+                mask |= 1 << bit
+    return mask
+
+
+def decode_comorbidities(mask: int) -> list:
+    """Nomes EN das comorbidades do bitmask, na ordem do schema"""
+    return [name for i, name in enumerate(COMORBIDITY_NAMES) if mask >> i & 1]
+
+
+def comorbidities_pt(mask: int) -> list:
+    """Rótulos PT (EN_TO_PT) das comorbidades do bitmask"""
+    return [EN_TO_PT.get(name, name) for name in decode_comorbidities(mask)]
+
+
+def mask_to_array(mask: int) -> np.ndarray:
+    """Vetor int8 (0/1) com uma posição por comorbidade"""
+    raw = mask.to_bytes((len(COMORBIDITY_NAMES) + 7) // 8, "little")
+    bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder="little")
+    return bits[:len(COMORBIDITY_NAMES)].astype(np.int8)
+
+
+def array_to_mask(values) -> int:
+    """Inverso de mask_to_array; aceita a parte de comorbidades de uma linha de X"""
+    bits = np.packbits(np.asarray(values) != 0, bitorder="little")
+    return int.from_bytes(bits.tobytes(), "little")
+
+
+def check_model_features(model):
+    """Levanta RuntimeError se o modelo foi treinado com outra lista de features"""
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        if list(names) != FEATURE_NAMES:
+            raise RuntimeError(
+                f"Modelo incompatível com o schema {SCHEMA_VERSION}: features diferentes de FEATURE_NAMES"
+            )
+    elif getattr(model, "n_features_in_", N_FEATURES) != N_FEATURES:
+        raise RuntimeError(
+            f"Modelo espera {model.n_features_in_} features, o schema {SCHEMA_VERSION} tem {N_FEATURES}"
+        )
+
+
+# Interpreta um payload de /predict (idade, sexo, comorbidades e medidas)
+def parse_payload(payload: dict):
+    selected_en, selected_pt = [], []
+    age = float(payload.get('idade') or 0)
+    sex_val = parse_sex(payload.get('sexo','M'))
+
+    raw_comorb = payload.get('comorbidades') or []
+    if isinstance(raw_comorb, str):
+        try: 
+            raw_comorb = json.loads(raw_comorb)
+        except: 
+            raw_comorb = []
+
+    vistos = set()
+    for it in raw_comorb:
+        if isinstance(it, str) and it in COMORBIDITY_INDEX and it not in vistos:
+            vistos.add(it)
+            selected_en.append(it)
+            # Agora usa o mapeamento completo para português
+            selected_pt.append(EN_TO_PT.get(it, it))
+
+    altura = float(payload.get('altura') or 0)
+    peso = float(payload.get('peso') or 0)
+    imc_val = round(peso/(altura*altura), 1) if altura > 0 else None
+
+    meta = {
+        'nome': payload.get('nome',''), 
+        'data_consulta': payload.get('data',''), 
+        'altura': altura, 
+        'peso': peso, 
+        'imc': imc_val
+    }
+    return age, sex_val, meta, selected_en, selected_pt
+
+
+# Constrói X de N payloads numa única matriz NumPy
+def build_X_batch(payloads: list):
+    """Retorna (X, itens, erros); itens[i] é None quando o payload i é inválido"""
+    X = np.zeros((len(payloads), N_FEATURES), dtype=np.float64)
+    itens, erros = [], {}
+    for i, payload in enumerate(payloads):
+        try:
+            if not isinstance(payload, dict):
+                raise ValueError("payload deve ser um objeto JSON")
+            age, sex_val, meta, selected_en, selected_pt = parse_payload(payload)
+        except Exception as e:
+            itens.append(None)
+            erros[i] = str(e)
+            continue
+        X[i, 0] = age
+        X[i, 1] = sex_val
+        X[i, [FEATURE_INDEX[it] for it in selected_en]] = 1
+        itens.append((meta, selected_en, selected_pt))
+    return X, itens, erros
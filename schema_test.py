@@ -0,0 +1,74 @@
+# Bitmask de comorbidades e conferência do SCHEMA_VERSION (schema.py)
+import hashlib
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from db import Database
+from schema import (
+    COMORBIDITY_NAMES, FEATURE_NAMES, N_FEATURES, SCHEMA_VERSION, array_to_mask, check_model_features,
+    comorbidities_pt, decode_comorbidities, encode_comorbidities, mask_to_array, parse_payload,
+)
+
+
+@pytest.mark.parametrize("indices", [[], [0], [0, 1], [7, 31, 32, 63], list(range(len(COMORBIDITY_NAMES)))])
+def test_mascara_ida_e_volta(indices):
+    nomes = [COMORBIDITY_NAMES[i] for i in indices]
+    mask = encode_comorbidities(reversed(nomes))
+    assert decode_comorbidities(mask) == nomes  # sempre na ordem do schema
+    arr = mask_to_array(mask)
+    assert arr.shape == (len(COMORBIDITY_NAMES),) and arr.dtype == np.int8
+    assert list(np.flatnonzero(arr)) == indices
+    assert array_to_mask(arr) == mask
+
+
+def test_mascara_ignora_desconhecidas():
+    mask = encode_comorbidities(["SAH", "inexistente", 3, None, "SAH"])
+    assert decode_comorbidities(mask) == ["SAH"]
+    assert comorbidities_pt(mask) == ["Hipertensão Arterial Sistêmica (HAS)"]
+
+
+def test_array_to_mask_aceita_linha_de_X():
+    row = np.zeros(N_FEATURES)
+    row[0], row[1] = 40, 2
+    row[2 + 5] = row[2 + 40] = 1.0
+    assert decode_comorbidities(array_to_mask(row[2:])) == [COMORBIDITY_NAMES[5], COMORBIDITY_NAMES[40]]
+
+
+def test_schema_version_e_hash_da_lista_ordenada():
+    esperado = hashlib.sha256(json.dumps(FEATURE_NAMES, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+    assert SCHEMA_VERSION == esperado
+    trocada = FEATURE_NAMES[:2] + FEATURE_NAMES[3:4] + FEATURE_NAMES[2:3] + FEATURE_NAMES[4:]
+    assert hashlib.sha256(json.dumps(trocada).encode()).hexdigest()[:12] != SCHEMA_VERSION
+
+
+def test_modelo_com_outras_features():
+    check_model_features(SimpleNamespace(feature_names_in_=np.array(FEATURE_NAMES)))
+    check_model_features(SimpleNamespace(n_features_in_=N_FEATURES))
+    with pytest.raises(RuntimeError, match=SCHEMA_VERSION):
+        check_model_features(SimpleNamespace(feature_names_in_=np.array(FEATURE_NAMES[::-1])))
+    with pytest.raises(RuntimeError, match="features"):
+        check_model_features(SimpleNamespace(n_features_in_=N_FEATURES - 1))
+
+
+def test_banco_de_outro_schema(tmp_path):
+    path = str(tmp_path / "consultas.db")
+    db = Database(path)
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)  # mesma versão: reabre sem erro
+    db.close()
+    db = Database(path)
+    try:
+        with pytest.raises(RuntimeError, match=SCHEMA_VERSION):
+            db.init_db("outro", FEATURE_NAMES)
+    finally:
+        db.close()
+
+
+def test_payload_sem_repetidas_na_ordem_de_chegada():
+    _, _, _, en, pt = parse_payload({"comorbidades": ["obesity", "SAH", "obesity", "x", ["SAH"], "SAH"]})
+    assert en == ["obesity", "SAH"]
+    assert pt == ["Obesidade", "Hipertensão Arterial Sistêmica (HAS)"]
+    assert parse_payload({"comorbidades": '["SAH", "SAH"]'})[3] == ["SAH"]
@@ -0,0 +1,145 @@
+# Pontuação offline de arquivos JSONL no formato do payload de /predict
+#
+# O processo principal lê o arquivo em blocos de linhas e distribui os blocos
+# entre um pool de processos; cada worker carrega o modelo uma única vez,
+# monta X com build_X_batch (a mesma interpretação de /predict) e pontua o
+# bloco numa chamada. Os resultados são escritos na ordem da entrada e só
+# alguns blocos ficam em voo por vez, então a memória não cresce com o arquivo.
+#
+# Uso: python score_jsonl.py consultas.jsonl [-o resultado.jsonl] [--processos 8] [--bloco 2000]
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+DEFAULT_CHUNK = 2000
+
+# Preenchidos em cada worker por _init_worker
+_predict = None
+_version = None
+
+
+def _init_worker(model_path: str):
+    global _predict, _version
+    from bulk_import import load_predictor
+    from model_registry import version_of
+
+    _predict = load_predictor(model_path)
+    _version = version_of(model_path)
+
+
+def score_chunk(chunk):
+    """(primeira linha, [linhas JSON]) -> (linhas JSONL de resultado na mesma ordem, nº de erros)"""
+    from schema import build_X_batch
+
+    inicio, lines = chunk
+    payloads, erros = [], {}
+    for i, line in enumerate(lines):
+        try:
+            payloads.append(json.loads(line))
+        except ValueError as e:
+            payloads.append(None)
+            erros[i] = f"JSON inválido: {e}"
+
+    X, itens, erros_payload = build_X_batch(payloads)
+    validos = [i for i, item in enumerate(itens) if item is not None]
+    probs = _predict(X[validos]) if validos else []
+    prob_de = dict(zip(validos, probs))
+
+    out = []
+    for i, item in enumerate(itens):
+        resultado = {"indice": inicio + i}
+        if item is None:
+            resultado["error"] = erros.get(i) or erros_payload[i]
+        else:
+            resultado["nome"] = item[0]["nome"]
+            resultado["probabilidade"] = round(float(prob_de[i]) * 100, 4)
+            resultado["modelo_versao"] = _version
+        out.append(json.dumps(resultado, ensure_ascii=False))
+    return out, len(lines) - len(validos)
+
+
+def read_chunks(f, chunk_size: int):
+    """Blocos (índice da primeira linha, linhas) ignorando linhas em branco"""
+    lines, inicio, indice = [], 0, 0
+    for line in f:
+        if not line.strip():
+            continue
+        if not lines:
+            inicio = indice
+        lines.append(line)
+        indice += 1
+        if len(lines) == chunk_size:
+            yield inicio, lines
+            lines = []
+    if lines:
+        yield inicio, lines
+
+
+def score_file(entrada, saida, model_path: str, processos: int = None, chunk_size: int = DEFAULT_CHUNK,
+               progresso=None) -> dict:
+    """Pontua o JSONL entrada (arquivo de texto) e escreve o resultado em saida"""
+    from model_registry import version_of
+
+    processos = processos or os.cpu_count() or 1
+    em_voo = deque()
+    linhas = erros = 0
+    inicio = time.perf_counter()
+
+    def escrever(pronto):
+        nonlocal linhas, erros
+        resultados, n_erros = pronto
+        saida.writelines(r + "\n" for r in resultados)
+        linhas += len(resultados)
+        erros += n_erros
+        if progresso is not None:
+            progresso(linhas, time.perf_counter() - inicio)
+
+    with multiprocessing.Pool(processos, initializer=_init_worker, initargs=(model_path,)) as pool:
+        for chunk in read_chunks(entrada, chunk_size):
+            # Limita os blocos pendentes; escreve sempre o mais antigo (ordem da entrada)
+            if len(em_voo) >= 2 * processos:
+                escrever(em_voo.popleft().get())
+            em_voo.append(pool.apply_async(score_chunk, (chunk,)))
+        while em_voo:
+            escrever(em_voo.popleft().get())
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "linhas": linhas,
+        "erros": erros,
+        "processos": processos,
+        "modelo_versao": version_of(model_path),
+        "segundos": round(segundos, 3),
+        "linhas_por_s": round(linhas / segundos, 1) if segundos > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pontua um JSONL de payloads de /predict")
+    parser.add_argument("entrada", help="arquivo .jsonl (um payload por linha)")
+    parser.add_argument("-o", "--saida", help="arquivo de saída (padrão: stdout)")
+    parser.add_argument("--processos", type=int, default=None, help="padrão: número de CPUs")
+    parser.add_argument("--bloco", type=int, default=DEFAULT_CHUNK, help="linhas por tarefa")
+    parser.add_argument("--modelo", default=os.path.join(os.path.dirname(__file__), "modelo_gradient_boosting.pkl"))
+    args = parser.parse_args()
+
+    def progresso(linhas, segundos):
+        print(f"\r{linhas} linhas, {linhas / segundos:.0f} linhas/s", end="", file=sys.stderr)
+
+    with open(args.entrada, encoding="utf-8") as entrada:
+        saida = open(args.saida, "w", encoding="utf-8") if args.saida else sys.stdout
+        try:
+            resumo = score_file(entrada, saida, args.modelo, args.processos, max(1, args.bloco), progresso)
+        finally:
+            if saida is not sys.stdout:
+                saida.close()
+    print(file=sys.stderr)
+    print(json.dumps(resumo, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Pontuação de JSONL em paralelo (score_jsonl.py): ordem da entrada e erros por linha
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+
+import score_jsonl
+from bulk_import import load_predictor
+from schema import build_X_batch
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "modelo_gradient_boosting.pkl")
+
+
+def payload(i):
+    return {"nome": f"p{i}", "idade": 20 + i, "sexo": "F" if i % 2 else "M",
+            "comorbidades": ["SAH", "obesity"][: i % 3]}
+
+
+def test_bloco_com_linhas_invalidas(monkeypatch):
+    monkeypatch.setattr(score_jsonl, "_predict", lambda X: X[:, 0] / 100)
+    monkeypatch.setattr(score_jsonl, "_version", "v1")
+    linhas = [json.dumps(payload(1)), "{nao e json", json.dumps({"idade": "abc"}), json.dumps(payload(2))]
+    out, erros = score_jsonl.score_chunk((10, linhas))
+    resultados = [json.loads(l) for l in out]
+    assert erros == 2
+    assert [r["indice"] for r in resultados] == [10, 11, 12, 13]
+    assert resultados[0] == {"indice": 10, "nome": "p1", "probabilidade": 21.0, "modelo_versao": "v1"}
+    assert resultados[1]["error"].startswith("JSON inválido")
+    assert "error" in resultados[2] and "probabilidade" not in resultados[2]
+    assert resultados[3]["probabilidade"] == 22.0
+
+
+def test_bloco_so_com_erros(monkeypatch):
+    monkeypatch.setattr(score_jsonl, "_predict", lambda X: pytest.fail("não deveria pontuar"))
+    out, erros = score_jsonl.score_chunk((0, ["[", "1"]))
+    assert erros == 2 and all("error" in json.loads(l) for l in out)
+
+
+def test_blocos_ignoram_linhas_em_branco():
+    blocos = list(score_jsonl.read_chunks(io.StringIO("a\n\nb\nc\n  \nd\n"), 2))
+    assert blocos == [(0, ["a\n", "b\n"]), (2, ["c\n", "d\n"])]
+
+
+def test_ordem_da_entrada_com_varios_processos():
+    n = 41
+    linhas = []
+    for i in range(n):
+        # Uma linha quebrada a cada 7: o resto do arquivo continua sendo pontuado
+        linhas.append("{quebrada" if i % 7 == 3 else json.dumps(payload(i)))
+    entrada = io.StringIO("\n".join(linhas) + "\n")
+    saida = io.StringIO()
+    progresso = []
+    resumo = score_jsonl.score_file(entrada, saida, MODEL_PATH, processos=3, chunk_size=4,
+                                    progresso=lambda l, s: progresso.append(l))
+
+    resultados = [json.loads(l) for l in saida.getvalue().splitlines()]
+    assert [r["indice"] for r in resultados] == list(range(n))
+    quebradas = [i for i in range(n) if i % 7 == 3]
+    assert [r["indice"] for r in resultados if "error" in r] == quebradas
+    assert resumo["linhas"] == n and resumo["erros"] == len(quebradas) and resumo["processos"] == 3
+    assert progresso[-1] == n and progresso == sorted(progresso)
+
+    # Mesmas probabilidades que uma pontuação direta, na mesma ordem
+    validos = [payload(i) for i in range(n) if i not in quebradas]
+    X, _, _ = build_X_batch(validos)
+    esperado = np.round(load_predictor(MODEL_PATH)(X) * 100, 4)
+    obtido = [r["probabilidade"] for r in resultados if "error" not in r]
+    np.testing.assert_allclose(obtido, esperado, atol=1e-4)
+    assert [r["nome"] for r in resultados if "error" not in r] == [p["nome"] for p in validos]
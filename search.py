@@ -0,0 +1,193 @@
+# Busca de consultas com filtros e paginação por keyset
+#
+# Em vez de OFFSET (que percorre e descarta todas as linhas anteriores), cada
+# página devolve um cursor com a chave de ordenação da última linha; a próxima
+# página começa depois de (coluna, id) do cursor, resolvido direto pelo índice.
+# Nome, data e probabilidade podem ser NULL (ex.: "nome": null em /predict) e
+# "(NULL, id) > cursor" nunca é verdadeiro: a ordenação e o cursor usam
+# COALESCE com um valor padrão, com índices de expressão em db.init_db.
+import base64
+import json
+
+from schema import COMORBIDITY_INDEX, FEATURE_INDEX, FEMALE_VALUES
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# ordem -> (coluna, valor no lugar de NULL); id é o rowid e nunca é NULL
+ORDER_KEYS = {
+    "id": ("id", None),
+    "nome": ("nome", ""),
+    "data": ("data_consulta", ""),
+    "probabilidade": ("probabilidade", -1.0),
+}
+
+# ordem -> expressão SQL (cada uma tem índice em db.init_db, com a mesma expressão)
+ORDER_COLUMNS = {
+    "id": "id",
+    "nome": "COALESCE(nome, '') COLLATE NOCASE",
+    "data": "COALESCE(data_consulta, '')",
+    "probabilidade": "COALESCE(probabilidade, -1.0)",
+}
+
+# Maior code point: "prefixo" <= nome < "prefixo" + MAX_CHAR cobre todo nome com o prefixo
+MAX_CHAR = "\U0010ffff"
+
+
+class SearchError(ValueError):
+    """Parâmetro de busca inválido (vira HTTP 400)"""
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise SearchError("cursor inválido")
+    if not isinstance(values, list):
+        raise SearchError("cursor inválido")
+    return values
+
+
+def _float(args, name):
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise SearchError(f"'{name}' deve ser numérico")
+
+
+def parse_comorbidades(value) -> list:
+    """Índices de feature de 'comorbidades' (nomes EN separados por vírgula)"""
+    indices = []
+    for name in (value or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in COMORBIDITY_INDEX:
+            raise SearchError(f"comorbidade desconhecida: {name}")
+        indices.append(FEATURE_INDEX[name])
+    return indices
+
+
+def build_filters(args) -> tuple:
+    """(cláusulas WHERE, params) dos filtros da URL sobre a tabela consultas"""
+    where, params = [], []
+
+    nome = (args.get("nome") or "").strip()
+    if nome:
+        # Intervalo de prefixo sem LIKE: usa o índice NOCASE de nome (o prefixo
+        # não é vazio, então o COALESCE não muda o resultado)
+        where.append(f"{ORDER_COLUMNS['nome']} >= ? AND {ORDER_COLUMNS['nome']} < ?")
+        params += [nome, nome + MAX_CHAR]
+
+    if args.get("data_inicio"):
+        where.append("data_consulta >= ?")
+        params.append(args["data_inicio"])
+    if args.get("data_fim"):
+        where.append("data_consulta <= ?")
+        params.append(args["data_fim"])
+
+    # Probabilidade na API é em %, no banco entre 0 e 1
+    prob_min, prob_max = _float(args, "prob_min"), _float(args, "prob_max")
+    if prob_min is not None:
+        where.append("probabilidade >= ?")
+        params.append(prob_min / 100)
+    if prob_max is not None:
+        where.append("probabilidade <= ?")
+        params.append(prob_max / 100)
+
+    sexo = (args.get("sexo") or "").strip().lower()
+    if sexo:
+        if sexo in ("m", "masculino", "male", "1"):
+            where.append("patient_sex = 1")
+        elif sexo in FEMALE_VALUES:
+            where.append("patient_sex = 2")
+        else:
+            raise SearchError("'sexo' deve ser M ou F")
+
+    # Todas as comorbidades pedidas (E); cada uma é uma busca na chave primária
+    for idx in parse_comorbidades(args.get("comorbidades")):
+        where.append("id IN (SELECT consulta_id FROM consulta_comorbidades WHERE feature_idx = ?)")
+        params.append(idx)
+
+    return where, params
+
+
+def build_query(args) -> tuple:
+    """(sql, params, limite, ordem) a partir dos parâmetros da URL"""
+    where, params = build_filters(args)
+
+    ordem = args.get("ordem") or "id"
+    if ordem not in ORDER_COLUMNS:
+        raise SearchError(f"'ordem' deve ser um de: {', '.join(ORDER_COLUMNS)}")
+    direcao = (args.get("direcao") or ("desc" if ordem == "id" else "asc")).lower()
+    if direcao not in ("asc", "desc"):
+        raise SearchError("'direcao' deve ser asc ou desc")
+    op = ">" if direcao == "asc" else "<"
+    col = ORDER_COLUMNS[ordem]
+
+    cursor = args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        # [id] ou [chave, id], com valores escalares; qualquer outra coisa é 400
+        esperado = 1 if ordem == "id" else 2
+        if (len(values) != esperado or not _is_id(values[-1])
+                or not all(isinstance(v, (str, int, float)) for v in values)):
+            raise SearchError("cursor inválido")
+        if ordem == "id":
+            where.append(f"id {op} ?")
+            params += values
+        else:
+            # Equivale a "(col, id) > (?, ?)", mas com a coluna sozinha no
+            # primeiro termo o SQLite usa o índice de expressão como intervalo
+            where.append(f"{col} {op}= ? AND ({col} {op} ? OR id {op} ?)")
+            params += [values[0], values[0], values[1]]
+
+    try:
+        limite = int(args.get("limite") or DEFAULT_LIMIT)
+    except ValueError:
+        raise SearchError("'limite' deve ser inteiro")
+    limite = max(1, min(limite, MAX_LIMIT))
+
+    order_by = "id" if ordem == "id" else f"{col} {direcao.upper()}, id"
+    sql = "SELECT * FROM consultas"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order_by} {direcao.upper()} LIMIT ?"
+    # Busca uma linha a mais para saber se existe próxima página
+    params.append(limite + 1)
+    return sql, params, limite, ordem
+
+
+def _is_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def next_cursor(last_row, ordem: str) -> str:
+    if ordem == "id":
+        return encode_cursor([last_row["id"]])
+    key, default = ORDER_KEYS[ordem]
+    value = last_row[key]
+    return encode_cursor([default if value is None else value, last_row["id"]])
+
+
+def build_counts_query(args) -> tuple:
+    """Contagem de consultas por comorbidade, com os mesmos filtros da busca"""
+    where, params = build_filters(args)
+    if not where:
+        # Sem filtros percorre só a tabela normalizada, já ordenada por feature_idx
+        return "SELECT feature_idx, COUNT(*) FROM consulta_comorbidades GROUP BY feature_idx", params
+    sql = (
+        "SELECT cc.feature_idx, COUNT(*) FROM consulta_comorbidades cc"
+        " WHERE cc.consulta_id IN (SELECT id FROM consultas WHERE " + " AND ".join(where) + ")"
+        " GROUP BY cc.feature_idx"
+    )
+    return sql, params
@@ -0,0 +1,120 @@
+# Filtros e paginação por cursor de GET /consultas (search.py) sobre um banco real
+import pytest
+
+from db import Database, INSERT_CONSULTA_SQL
+from schema import COMORBIDITY_NAMES, FEATURE_NAMES, SCHEMA_VERSION
+from search import SearchError, build_counts_query, build_query, encode_cursor, next_cursor
+
+DIABETES, HAS = COMORBIDITY_NAMES[0], COMORBIDITY_NAMES[1]
+
+# (nome, data, sexo, probabilidade, comorbidades); None vira NULL no banco
+LINHAS = [
+    ("Ana", "2024-01-10", 2, 0.10, [DIABETES]),
+    (None, None, 1, 0.50, []),
+    ("bruno", "2024-02-01", 1, 0.50, [DIABETES, HAS]),
+    ("Carla", "2024-01-10", 2, None, [HAS]),
+    (None, "2024-03-05", 2, 0.90, []),
+    ("ana paula", None, 1, 0.30, [DIABETES]),
+    ("Bruna", "2023-12-31", 2, 0.75, [HAS]),
+]
+
+
+@pytest.fixture()
+def db(tmp_path):
+    db = Database(str(tmp_path / "consultas.db"))
+    db.init_db(SCHEMA_VERSION, FEATURE_NAMES)
+    for nome, data, sexo, prob, comorbidades in LINHAS:
+        db.write(INSERT_CONSULTA_SQL, (nome, data, 50.0, sexo, 1.7, 70.0, 24.2,
+                                       "[" + ",".join(f'"{c}"' for c in comorbidades) + "]",
+                                       prob, None, None, "2024-01-01T00:00:00", None))
+    yield db
+    db.close()
+
+
+def buscar_tudo(db, **args):
+    """Ids de todas as páginas, seguindo 'proximo' até o fim"""
+    ids, cursor = [], None
+    for _ in range(100):
+        pagina_args = dict(args)
+        if cursor:
+            pagina_args["cursor"] = cursor
+        sql, params, limite, ordem = build_query(pagina_args)
+        rows = db.query(sql, params)
+        mais = len(rows) > limite
+        rows = rows[:limite]
+        ids += [r["id"] for r in rows]
+        if not mais:
+            return ids
+        cursor = next_cursor(rows[-1], ordem)
+    raise AssertionError("paginação não terminou")
+
+
+def ordenado(db, expr, direcao="asc"):
+    sql = f"SELECT id FROM consultas ORDER BY {expr} {direcao}, id {direcao}"
+    return [r[0] for r in db.query(sql)]
+
+
+@pytest.mark.parametrize("ordem,expr", [
+    ("nome", "COALESCE(nome, '') COLLATE NOCASE"),
+    ("data", "COALESCE(data_consulta, '')"),
+    ("probabilidade", "COALESCE(probabilidade, -1.0)"),
+])
+@pytest.mark.parametrize("direcao", ["asc", "desc"])
+@pytest.mark.parametrize("limite", ["1", "2", "3"])
+def test_paginas_cobrem_todas_as_linhas_com_null(db, ordem, expr, direcao, limite):
+    ids = buscar_tudo(db, ordem=ordem, direcao=direcao, limite=limite)
+    assert ids == ordenado(db, expr, direcao)
+    assert len(ids) == len(LINHAS)
+
+
+@pytest.mark.parametrize("limite", ["1", "2", "50"])
+def test_paginas_por_id(db, limite):
+    assert buscar_tudo(db, limite=limite) == list(range(len(LINHAS), 0, -1))
+    assert buscar_tudo(db, ordem="id", direcao="asc", limite=limite) == list(range(1, len(LINHAS) + 1))
+
+
+def test_filtros(db):
+    assert sorted(buscar_tudo(db, nome="an", limite="1")) == [1, 6]
+    assert sorted(buscar_tudo(db, data_inicio="2024-01-01", data_fim="2024-01-31")) == [1, 4]
+    assert sorted(buscar_tudo(db, prob_min="50")) == [2, 3, 5, 7]
+    assert sorted(buscar_tudo(db, prob_min="20", prob_max="60")) == [2, 3, 6]
+    assert sorted(buscar_tudo(db, sexo="F")) == [1, 4, 5, 7]
+    assert sorted(buscar_tudo(db, sexo="masculino", ordem="nome", limite="1")) == [2, 3, 6]
+    assert sorted(buscar_tudo(db, comorbidades=DIABETES)) == [1, 3, 6]
+    assert sorted(buscar_tudo(db, comorbidades=f"{DIABETES},{HAS}")) == [3]
+    assert sorted(buscar_tudo(db, comorbidades=HAS, sexo="F", ordem="data", limite="1")) == [4, 7]
+
+
+def test_contagem_por_comorbidade_com_filtros(db):
+    contagem = dict(db.query(*build_counts_query({})))
+    filtrada = dict(db.query(*build_counts_query({"sexo": "F"})))
+    indice = FEATURE_NAMES.index
+    assert contagem == {indice(DIABETES): 3, indice(HAS): 3}
+    assert filtrada == {indice(DIABETES): 1, indice(HAS): 2}
+
+
+@pytest.mark.parametrize("args", [
+    {"ordem": "idade"},
+    {"direcao": "cima"},
+    {"limite": "dez"},
+    {"sexo": "x"},
+    {"prob_min": "alto"},
+    {"comorbidades": "inexistente"},
+    {"cursor": "!!!"},
+    {"cursor": encode_cursor({"a": 1})},
+    {"cursor": encode_cursor([1, 2])},
+    {"cursor": encode_cursor(["x"])},
+    {"ordem": "nome", "cursor": encode_cursor([1])},
+    {"ordem": "nome", "cursor": encode_cursor([{"a": 1}, 2])},
+    {"ordem": "nome", "cursor": encode_cursor(["Ana", "2"])},
+    {"ordem": "data", "cursor": encode_cursor([["2024"], 2])},
+    {"ordem": "probabilidade", "cursor": encode_cursor([None, 2])},
+])
+def test_parametros_invalidos(args):
+    with pytest.raises(SearchError):
+        build_query(args)
+
+
+def test_limite_respeita_maximo():
+    _, params, limite, _ = build_query({"limite": "100000"})
+    assert limite == 500 and params[-1] == 501
@@ -0,0 +1,98 @@
+# Servidor de produção: mestre pre-fork (gunicorn) com o modelo compartilhado
+#
+# O mestre importa app.py uma única vez (modelo, motor compilado, schema e
+# banco) e só então cria os workers com fork: as páginas do modelo ficam
+# compartilhadas copy-on-write entre todos eles em vez de uma cópia por
+# processo. gc.freeze() antes do fork tira esses objetos das coletas do GC,
+# que de outra forma tocariam cada objeto e forçariam a cópia das páginas.
+#
+# Uso: python serve.py  (configuração pelas variáveis DATACARE_* abaixo)
+#
+# Sinais no mestre:
+#   HUP   reinicia os workers com elegância (termina os requests em andamento)
+#   TERM  desligamento gracioso (espera até DATACARE_GRACEFUL_TIMEOUT s)
+#   TTIN / TTOU  adiciona / remove um worker
+import gc
+import logging
+import os
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger(__name__)
+
+BIND = os.getenv("DATACARE_BIND", "0.0.0.0:5000")
+WORKERS = int(os.getenv("DATACARE_WORKERS", str(os.cpu_count() or 1)))
+THREADS = int(os.getenv("DATACARE_THREADS", "4"))
+TIMEOUT = int(os.getenv("DATACARE_TIMEOUT", "60"))
+GRACEFUL_TIMEOUT = int(os.getenv("DATACARE_GRACEFUL_TIMEOUT", "30"))
+# Recicla cada worker depois de N requests (0 = nunca), com jitter para não
+# reiniciar todos ao mesmo tempo
+MAX_REQUESTS = int(os.getenv("DATACARE_MAX_REQUESTS", "0"))
+
+
+def post_fork(server, worker):
+    # O GC volta a rodar só no worker; o mestre continua com os objetos congelados
+    gc.enable()
+    # O mestre não cria threads (app.PRELOAD): cada worker inicia as suas e
+    # retoma os PDFs pendentes sem dono vivo (app.claim_pdf_jobs): um worker
+    # novo, reciclado ou que substitui um que caiu assume só os órfãos
+    import app as backend
+    backend.start_background()
+
+
+class DataCareServer(BaseApplication):
+    """gunicorn embutido: app.py carregado no mestre (preload) antes do fork"""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        if self.application is None:
+            # Evita coletas durante o carregamento e congela o que foi criado
+            gc.disable()
+            os.environ["DATACARE_PRELOAD"] = "1"
+            import app as backend
+
+            # Inicialização na thread principal do mestre: nenhuma thread
+            # existe quando o gunicorn faz o fork dos workers
+            backend.startup()
+            backend.wait_ready(0)
+            # Donos (pids) da execução anterior não valem mais
+            backend.release_pdf_jobs()
+            gc.freeze()
+            logger.info("Modelo carregado no mestre (pid %d); %d objetos congelados", os.getpid(),
+                        gc.get_freeze_count())
+            self.application = backend.app
+        return self.application
+
+
+def options() -> dict:
+    return {
+        "bind": BIND,
+        "workers": max(1, WORKERS),
+        "worker_class": "gthread",
+        "threads": max(1, THREADS),
+        "timeout": TIMEOUT,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS // 10,
+        "preload_app": True,
+        "post_fork": post_fork,
+        "accesslog": "-",
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    DataCareServer(options()).run()
+
+
+if __name__ == "__main__":
+    main()